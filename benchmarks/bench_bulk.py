@@ -0,0 +1,68 @@
+"""Compare normalizing a corpus one normalize_tokenwise call per document with the offline bulk mode.
+
+    python3 benchmarks/bench_bulk.py [--corpus FILE] [--repeat 10] [--processes 1 4] [--output results.json]
+
+The corpus paragraphs, repeated --repeat times, are normalized one call per paragraph, as a client
+of the server would send them, and then with tts_frontend_bulk.BulkNormalizer, with and without its
+sentence cache and on each number of --processes. Reports sentences per second and exits with status
+1 if any bulk result differs from the per-paragraph one.
+"""
+import argparse
+import sys
+
+import common
+from normalizer_loader import load_normalizer
+from segmentation import SentenceSplitter
+from tts_frontend_bulk import BulkNormalizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=common.DEFAULT_CORPUS)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--domain', default='', help="normalizer domain, '' or 'sport'")
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--compiled-rules', action='store_true')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    paragraphs = common.load_corpus(args.corpus) * args.repeat
+    splitter = SentenceSplitter()
+    sentences = [sentence for paragraph in paragraphs for sentence in splitter.split(paragraph)]
+    normalizer = load_normalizer(compiled_rules=args.compiled_rules)
+
+    def per_paragraph():
+        return [normalizer.normalize_tokenwise(paragraph, args.domain) for paragraph in paragraphs]
+    expected, seconds = common.timed(per_paragraph)
+    results = {'paragraphs': len(paragraphs), 'sentences': len(sentences),
+               'per_paragraph': {'seconds': seconds, 'sentences_per_second': len(sentences) / seconds}}
+
+    mismatches = 0
+    records = [(number, None, paragraph, args.domain) for number, paragraph in enumerate(paragraphs, 1)]
+    for processes in args.processes:
+        for cache_bytes in (0, 256 * 1024 * 1024):
+            bulk = BulkNormalizer(processes, cache_bytes=cache_bytes, compiled_rules=args.compiled_rules)
+            try:
+                # the first batch starts the processes, which is not what is measured
+                list(bulk.normalize(records[:1]))
+                output, seconds = common.timed(lambda: list(bulk.normalize(records)))
+            finally:
+                bulk.shutdown()
+            differing = sum(1 for (_, result), paragraph_result in zip(output, expected)
+                            if [list(map(tuple, sentence)) for sentence in result] !=
+                            [list(map(tuple, sentence)) for sentence in paragraph_result])
+            if differing:
+                mismatches += 1
+                print('bulk output with {} processes differs for {} paragraphs'.format(processes, differing),
+                      file=sys.stderr)
+            name = 'bulk_{}_processes{}'.format(processes, '_cached' if cache_bytes else '')
+            results[name] = {'seconds': seconds, 'sentences_per_second': len(sentences) / seconds,
+                             'speedup': results['per_paragraph']['seconds'] / seconds, 'counts': dict(bulk.counts)}
+    results['mismatches'] = mismatches
+    common.write_results('bulk', results, args.output)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
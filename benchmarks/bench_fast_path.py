@@ -0,0 +1,56 @@
+"""Check that the fast path gives the same tokenwise output as the full normalizer and measure its effect.
+
+    python3 benchmarks/bench_fast_path.py [--corpus FILE] [--rounds 3] [--output results.json]
+
+Exits with status 1 if the outputs differ for any paragraph.
+"""
+import argparse
+import sys
+
+import common
+from fast_path import FastPathNormalizer
+from normalizer_loader import load_normalizer
+from segmentation import SentenceSplitter
+
+
+def run(normalizer, paragraphs, rounds):
+    outputs = []
+    elapsed = 0.0
+    for _ in range(rounds):
+        outputs = []
+        for paragraph in paragraphs:
+            normalized, seconds = common.timed(normalizer.normalize_tokenwise, paragraph, '')
+            outputs.append([list(sentence) for sentence in normalized])
+            elapsed += seconds
+    return outputs, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=common.DEFAULT_CORPUS)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    paragraphs = common.load_corpus(args.corpus)
+    normalizer = load_normalizer()
+    fast_path = FastPathNormalizer(normalizer, SentenceSplitter())
+    expected, full_seconds = run(normalizer, paragraphs, args.rounds)
+    actual, fast_seconds = run(fast_path, paragraphs, args.rounds)
+    mismatches = [paragraph for paragraph, a, b in zip(paragraphs, expected, actual) if a != b]
+    stats = fast_path.stats()
+    results = {
+        'paragraphs': len(paragraphs),
+        'rounds': args.rounds,
+        'full_seconds': full_seconds,
+        'fast_path_seconds': fast_seconds,
+        'fast_path_share': stats['fast_sentences'] / stats['sentences'] if stats['sentences'] else 0.0,
+        'mismatches': len(mismatches),
+        'mismatched_paragraphs': mismatches,
+    }
+    common.write_results('fast_path', results, args.output)
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
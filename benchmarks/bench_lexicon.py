@@ -0,0 +1,120 @@
+"""Compare a dict, the sorted TSV lexicon and the binary lexicon for loading time, memory and lookups.
+
+    python3 benchmarks/bench_lexicon.py [--tsv lexicon.tsv] [--entries 300000] [--output results.json]
+
+Without --tsv a synthetic lexicon of random Icelandic-looking words is generated. Lookups are of
+words in the lexicon and of as many words that are not; all three must give the same results, the
+script exits with status 1 if they don't.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+
+import common
+from lexicon import BinaryLexicon, TsvLexicon, build_lexicon, read_tsv
+
+LETTERS = 'aábdðeéfghiíjklmnoóprstuúvxyýþæö'
+PHONES = ['a', 'au', 'E', 'ei', 'i', 'I', 'O', 'ou', 'Y', '9', 'u', 'p', 't', 'k', 'f', 'v', 's', 'T', 'D',
+          'j', 'h', 'm', 'n', 'l', 'r', 'x', 'G', 'p_h', 't_h', 'k_h']
+
+
+def synthetic_entries(count, seed=1):
+    rng = random.Random(seed)
+    entries = {}
+    while len(entries) < count:
+        word = ''.join(rng.choice(LETTERS) for _ in range(rng.randint(2, 14)))
+        entries[word] = ' '.join(rng.choice(PHONES) for _ in range(len(word)))
+    return entries
+
+
+def write_sorted_tsv(entries, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for word in sorted(entries, key=lambda word: word.encode('utf-8')):
+            f.write('{}\t{}\n'.format(word, entries[word]))
+
+
+def load_dict(path):
+    return dict(read_tsv(path))
+
+
+def measure_load(function, path):
+    """Return (lexicon, seconds, bytes allocated while loading)."""
+    tracemalloc.start()
+    try:
+        lexicon, seconds = common.timed(function, path)
+        allocated = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return lexicon, seconds, allocated
+
+
+def measure_lookups(lexicon, words, rounds):
+    get = lexicon.get
+    results = []
+    seconds = 0.0
+    for _ in range(rounds):
+        results, elapsed = common.timed(lambda: [get(word) for word in words])
+        seconds += elapsed
+    return results, len(words) * rounds / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tsv', help='word<TAB>transcription lines, in any order')
+    parser.add_argument('--entries', type=int, default=300000, help='size of the synthetic lexicon')
+    parser.add_argument('--lookups', type=int, default=100000, help='lookups of each of hits and misses')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    entries = {}
+    if args.tsv:
+        for word, transcription in read_tsv(args.tsv):
+            entries.setdefault(word, transcription)
+    else:
+        entries = synthetic_entries(args.entries)
+    rng = random.Random(2)
+    words = list(entries)
+    hits = [rng.choice(words) for _ in range(args.lookups)]
+    misses = [word + 'q' for word in hits if word + 'q' not in entries]
+
+    with tempfile.TemporaryDirectory() as directory:
+        tsv_path = os.path.join(directory, 'lexicon.tsv')
+        bin_path = os.path.join(directory, 'lexicon.bin')
+        write_sorted_tsv(entries, tsv_path)
+        _, build_seconds = common.timed(build_lexicon, entries.items(), bin_path)
+        results = {
+            'entries': len(entries),
+            'tsv_bytes': os.path.getsize(tsv_path),
+            'binary_bytes': os.path.getsize(bin_path),
+            'build_seconds': build_seconds,
+        }
+        lexicons = {}
+        for name, load in (('dict', load_dict), ('tsv', TsvLexicon), ('binary', BinaryLexicon)):
+            lexicons[name], seconds, allocated = measure_load(load, tsv_path if name != 'binary' else bin_path)
+            results[name] = {'load_seconds': seconds, 'allocated_bytes': allocated}
+
+        expected = None
+        mismatches = 0
+        for name, lexicon in lexicons.items():
+            hit_results, results[name]['hits_per_second'] = measure_lookups(lexicon, hits, args.rounds)
+            miss_results, results[name]['misses_per_second'] = measure_lookups(lexicon, misses, args.rounds)
+            if expected is None:
+                expected = (hit_results, miss_results)
+            elif (hit_results, miss_results) != expected:
+                mismatches += 1
+                print('{} lookups differ from the dict'.format(name), file=sys.stderr)
+        for lexicon in lexicons.values():
+            if hasattr(lexicon, 'close'):
+                lexicon.close()
+    results['mismatches'] = mismatches
+    common.write_results('lexicon', results, args.output)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Report RSS and PSS per worker process of a multi-process server, with and without --preload.
+
+    python3 benchmarks/bench_memory.py [--workers 1 4 16] [--port 50151] [--output results.json]
+
+Starts tts_frontend_server.py once per configuration, waits until it serves, sends some requests
+so that every worker has touched its normalizer, and reads the workers' memory from /proc (Linux only).
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import common
+import grpc
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+from generated.messages import tts_frontend_message_pb2
+from generated.services import tts_frontend_service_pb2_grpc
+
+SERVER = os.path.join(common.SRC_DIR, 'tts_frontend_server.py')
+
+
+def memory_kb(pid):
+    """Return (rss, pss) of a process in kB."""
+    values = {}
+    with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                values[parts[0][:-1]] = int(parts[1])
+    return values['Rss'], values['Pss']
+
+
+def children(pid):
+    with open('/proc/{}/task/{}/children'.format(pid, pid)) as f:
+        return [int(child) for child in f.read().split()]
+
+
+def wait_until_serving(port, timeout=600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        # new channels are new connections, which the kernel spreads over the workers
+        with grpc.insecure_channel('localhost:{}'.format(port)) as channel:
+            try:
+                response = health_pb2_grpc.HealthStub(channel).Check(health_pb2.HealthCheckRequest(), timeout=1)
+                if response.status == health_pb2.HealthCheckResponse.SERVING:
+                    return
+            except grpc.RpcError:
+                pass
+        time.sleep(0.5)
+    raise RuntimeError('server did not start within {} seconds'.format(timeout))
+
+
+def exercise(port, workers, paragraphs):
+    for _ in range(4 * workers):
+        with grpc.insecure_channel('localhost:{}'.format(port)) as channel:
+            stub = tts_frontend_service_pb2_grpc.TTSFrontendStub(channel)
+            for paragraph in paragraphs:
+                stub.NormalizeTokenwise(tts_frontend_message_pb2.NormalizeRequest(content=paragraph))
+
+
+def measure(workers, preload, port, paragraphs):
+    command = [sys.executable, SERVER, '--port', str(port), '--workers', str(workers), '--cache-bytes', '0']
+    if preload:
+        command.append('--preload')
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_serving(port)
+        exercise(port, workers, paragraphs[:5])
+        # a single worker runs in the server process itself
+        pids = children(server.pid) if workers > 1 else [server.pid]
+        usage = [memory_kb(pid) for pid in pids]
+        return {
+            'workers': workers,
+            'preload': preload,
+            'rss_kb_per_worker': sum(rss for rss, _ in usage) / len(usage),
+            'pss_kb_per_worker': sum(pss for _, pss in usage) / len(usage),
+            'pss_kb_total': sum(pss for _, pss in usage) + (memory_kb(server.pid)[1] if workers > 1 else 0),
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--port', type=int, default=50151)
+    parser.add_argument('--corpus', default=common.DEFAULT_CORPUS)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    paragraphs = common.load_corpus(args.corpus)
+    results = []
+    for workers in args.workers:
+        for preload in ((False,) if workers == 1 else (False, True)):
+            results.append(measure(workers, preload, args.port, paragraphs))
+    common.write_results('memory', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Throughput and latency of concurrent normalization with and without micro-batching.
+
+    python3 benchmarks/bench_microbatch.py [--concurrency 1 4 16 64] [--windows-ms 2 5] [--output results.json]
+
+Each concurrency level runs that many threads calling normalize_tokenwise in-process, like gRPC
+handler threads do, and reports requests/second and latency percentiles per micro-batching window.
+"""
+import argparse
+import threading
+import time
+
+import common
+from micro_batcher import MicroBatchingNormalizer
+from normalizer_loader import load_normalizer
+from segmentation import SentenceSplitter
+
+
+def run(normalizer, paragraphs, concurrency, requests_per_thread):
+    latencies = []
+    lock = threading.Lock()
+
+    def client(offset):
+        own = []
+        for i in range(requests_per_thread):
+            paragraph = paragraphs[(offset + i) % len(paragraphs)]
+            _, seconds = common.timed(normalizer.normalize_tokenwise, paragraph, '')
+            own.append(seconds)
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    summary = common.latency_summary(latencies)
+    summary['requests_per_second'] = len(latencies) / elapsed
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=common.DEFAULT_CORPUS)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--windows-ms', type=float, nargs='+', default=[2, 5])
+    parser.add_argument('--max-batch-sentences', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=20, help='requests per thread')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    paragraphs = common.load_corpus(args.corpus)
+    normalizer = load_normalizer()
+    splitter = SentenceSplitter()
+    batchers = {window: MicroBatchingNormalizer(normalizer, splitter, window / 1000, args.max_batch_sentences)
+                for window in args.windows_ms}
+    results = []
+    for concurrency in args.concurrency:
+        result = {'concurrency': concurrency, 'unbatched': run(normalizer, paragraphs, concurrency, args.requests)}
+        for window, batcher in batchers.items():
+            result['window_{}ms'.format(window)] = run(batcher, paragraphs, concurrency, args.requests)
+        results.append(result)
+    common.write_results('microbatch', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
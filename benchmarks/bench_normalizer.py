@@ -0,0 +1,63 @@
+"""In-process microbenchmarks of the normalizer and of building responses from its output.
+
+    python3 benchmarks/bench_normalizer.py [--corpus FILE] [--rounds 3] [--output results.json]
+
+Times Normalizer.normalize and normalize_tokenwise per paragraph of the corpus, and then building
+the Normalize and NormalizeTokenwise responses from their results, both as protobuf messages and
+encoded directly to wire bytes.
+"""
+import argparse
+
+import common
+from normalizer_loader import load_normalizer
+from response_encoding import encode_normalize_response, encode_tokenbased_response
+from tts_frontend_server import TTSFrontendServicer
+
+
+def measure(function, inputs, rounds):
+    latencies = []
+    outputs = []
+    for _ in range(rounds):
+        outputs = []
+        for item in inputs:
+            output, seconds = common.timed(function, *item)
+            outputs.append(output)
+            latencies.append(seconds)
+    summary = common.latency_summary(latencies)
+    summary['per_second'] = len(latencies) / sum(latencies) if latencies else 0.0
+    return summary, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=common.DEFAULT_CORPUS)
+    parser.add_argument('--domain', default='', help="normalizer domain, '' or 'sport'")
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    paragraphs = common.load_corpus(args.corpus)
+    normalizer, load_seconds = common.timed(load_normalizer)
+    servicer = TTSFrontendServicer(normalizer, batch_processes=1)
+    inputs = [(paragraph, args.domain) for paragraph in paragraphs]
+    results = {
+        'paragraphs': len(paragraphs),
+        'tokens': sum(len(paragraph.split()) for paragraph in paragraphs),
+        'load_seconds': load_seconds,
+    }
+    results['normalize'], normalized = measure(normalizer.normalize, inputs, args.rounds)
+    results['normalize_tokenwise'], tokenwise = measure(normalizer.normalize_tokenwise, inputs, args.rounds)
+    results['init_response'], _ = measure(
+        lambda arr: servicer.init_response(arr).SerializeToString(), [(arr,) for arr in normalized], args.rounds)
+    results['encode_normalize_response'], _ = measure(
+        encode_normalize_response, [(arr,) for arr in normalized], args.rounds)
+    results['init_tokenbased_response'], _ = measure(
+        lambda arr: servicer.init_tokenbased_response(arr).SerializeToString(), [(arr,) for arr in tokenwise],
+        args.rounds)
+    results['encode_tokenbased_response'], _ = measure(
+        encode_tokenbased_response, [(arr,) for arr in tokenwise], args.rounds)
+    common.write_results('normalizer', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
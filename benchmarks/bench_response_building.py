@@ -0,0 +1,91 @@
+"""Time building TokenBasedNormalizedResponse messages for sentences of 10 to 10,000 tokens.
+
+    python3 benchmarks/bench_response_building.py [--tokens 10 100 1000 10000] [--output results.json]
+
+Compares the former per-token construction with init_tokenbased_response and with encoding the
+serialized response directly, including serialization. No normalizer is needed, the tokens are words
+of the corpus. Exits with status 1 if the serialized responses differ.
+"""
+import argparse
+import itertools
+import sys
+import time
+
+import common
+from generated.messages import tts_frontend_message_pb2
+from response_encoding import encode_tokenbased_response
+from tts_frontend_server import TTSFrontendServicer
+
+
+def per_token_response(normalized_arr):
+    """The response construction init_tokenbased_response used to do."""
+    response = tts_frontend_message_pb2.TokenBasedNormalizedResponse()
+    for sentence in normalized_arr:
+        sentence_response = tts_frontend_message_pb2.TokenBasedNormalizedSentence()
+        norm_sent = ''
+        for ind, pair in enumerate(sentence):
+            info = tts_frontend_message_pb2.RawNormalizedTokenInfo()
+            info.original_token = pair[0]
+            info.normalized_token = pair[1]
+            info.original_index = ind
+            if info.original_token != info.normalized_token:
+                info.has_changed = True
+            sentence_response.token_info.append(info)
+            norm_sent += info.normalized_token + ' '
+        sentence_response.normalized_sentence = norm_sent.strip()
+        response.sentence.append(sentence_response)
+    return response
+
+
+def make_sentence(words, length):
+    # tokens that aren't plain words stand in for ones the normalizer expands
+    return [(word, word if word.isalpha() else 'tala') for word in itertools.islice(itertools.cycle(words), length)]
+
+
+def measure(build, normalized_arr, min_seconds):
+    rounds = 0
+    start = time.perf_counter()
+    while True:
+        build(normalized_arr)
+        rounds += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return 1000 * elapsed / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=common.DEFAULT_CORPUS)
+    parser.add_argument('--tokens', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--min-seconds', type=float, default=0.5, help='minimum time to run each variant')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    words = ' '.join(common.load_corpus(args.corpus)).split()
+    servicer = TTSFrontendServicer(normalizer=object(), batch_processes=1)
+    variants = {
+        'per_token': lambda arr: per_token_response(arr).SerializeToString(),
+        'batched': lambda arr: servicer.init_tokenbased_response(arr).SerializeToString(),
+        'wire': encode_tokenbased_response,
+    }
+    results = []
+    mismatches = 0
+    for length in args.tokens:
+        normalized_arr = [make_sentence(words, length)]
+        expected = variants['per_token'](normalized_arr)
+        result = {'tokens': length}
+        for name, build in variants.items():
+            if build(normalized_arr) != expected:
+                print('{} response differs for {} tokens'.format(name, length), file=sys.stderr)
+                mismatches += 1
+            result[name + '_ms'] = measure(build, normalized_arr, args.min_seconds)
+        result['batched_speedup'] = result['per_token_ms'] / result['batched_ms']
+        result['wire_speedup'] = result['per_token_ms'] / result['wire_ms']
+        results.append(result)
+    common.write_results('response_building', results, args.output)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
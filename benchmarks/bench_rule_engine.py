@@ -0,0 +1,82 @@
+"""Compare the normalizer's own rule passes with the compiled rule engine, for speed and identical output.
+
+    python3 benchmarks/bench_rule_engine.py [--corpus FILE] [--rounds 3] [--rules-only] [--output results.json]
+
+Runs the abbreviation stage (regina_normalizer.abbr_functions.replace_abbreviations) over every
+sentence of the corpus in every domain, and then Normalizer.normalize and normalize_tokenwise over
+every paragraph, first as they are and then with rule_engine installed. Reports tokens per second of
+both and exits with status 1 if any output differs. --rules-only skips the normalizer, which needs
+the POS tagger, and only runs the abbreviation stage.
+"""
+import argparse
+import sys
+
+import common
+import rule_engine
+from segmentation import SentenceSplitter
+
+DOMAINS = ('', 'sport', 'other')
+
+
+def measure(function, inputs, rounds):
+    """Return (outputs of the last round, tokens per second)."""
+    tokens = sum(len(text.split()) for text, _ in inputs)
+    seconds = 0.0
+    outputs = []
+    for _ in range(rounds):
+        outputs, elapsed = common.timed(lambda: [function(text, domain) for text, domain in inputs])
+        seconds += elapsed
+    return outputs, tokens * rounds / seconds
+
+
+def compare(name, function, inputs, rounds, results):
+    """Measure function without and with the rule engine, returns the number of differing outputs."""
+    rule_engine.uninstall()
+    expected, original_rate = measure(function, inputs, rounds)
+    rule_engine.install()
+    actual, compiled_rate = measure(function, inputs, rounds)
+    mismatches = [text for (text, domain), a, b in zip(inputs, expected, actual) if a != b]
+    for text in mismatches[:5]:
+        print('{} differs for {!r}'.format(name, text), file=sys.stderr)
+    results[name] = {
+        'original_tokens_per_second': original_rate,
+        'compiled_tokens_per_second': compiled_rate,
+        'speedup': compiled_rate / original_rate,
+        'mismatches': len(mismatches),
+    }
+    return len(mismatches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=common.DEFAULT_CORPUS)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--rules-only', action='store_true', help="don't load the normalizer")
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    paragraphs = common.load_corpus(args.corpus)
+    normalizer = None
+    if not args.rules_only:
+        from normalizer_loader import load_normalizer
+        normalizer = load_normalizer()
+    from regina_normalizer import abbr_functions
+
+    splitter = SentenceSplitter()
+    sentences = [sentence for paragraph in paragraphs for sentence in splitter.split(paragraph)]
+    results = {'paragraphs': len(paragraphs), 'sentences': len(sentences)}
+    # install once, so that every table is compiled before anything is timed
+    results['replaced'] = rule_engine.install()
+    mismatches = compare('replace_abbreviations', abbr_functions.replace_abbreviations,
+                         [(sentence, domain) for domain in DOMAINS for sentence in sentences], args.rounds, results)
+    if normalizer is not None:
+        inputs = [(paragraph, domain) for domain in DOMAINS for paragraph in paragraphs]
+        mismatches += compare('normalize', normalizer.normalize, inputs, args.rounds, results)
+        mismatches += compare('normalize_tokenwise', normalizer.normalize_tokenwise, inputs, args.rounds, results)
+    common.write_results('rule_engine', results, args.output)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Compare normalization with and without the sentence-level memo and check that both agree.
+
+    python3 benchmarks/bench_sentence_memo.py [--corpus FILE] [--rounds 3] [--output results.json]
+
+Exits with status 1 if the memoized output differs from the plain normalizer output for any paragraph.
+"""
+import argparse
+import sys
+
+import common
+from regina_normalizer.main import Normalizer
+from result_cache import ResultCache
+from segmentation import SentenceSplitter
+from sentence_memo import SentenceMemoNormalizer, estimate_size
+
+
+def run(normalizer, method, paragraphs, rounds):
+    normalize = getattr(normalizer, method)
+    outputs = []
+    elapsed = 0.0
+    for _ in range(rounds):
+        outputs = []
+        for paragraph in paragraphs:
+            normalized, seconds = common.timed(normalize, paragraph, '')
+            outputs.append([list(sentence) for sentence in normalized])
+            elapsed += seconds
+    return outputs, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=common.DEFAULT_CORPUS)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--cache-bytes', type=int, default=32 * 1024 * 1024)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    paragraphs = common.load_corpus(args.corpus)
+    normalizer = Normalizer()
+    results = {}
+    mismatches = 0
+    for method in ('normalize', 'normalize_tokenwise'):
+        cache = ResultCache(args.cache_bytes, sizeof=estimate_size)
+        memo = SentenceMemoNormalizer(normalizer, SentenceSplitter(), cache)
+        expected, plain_seconds = run(normalizer, method, paragraphs, args.rounds)
+        actual, memo_seconds = run(memo, method, paragraphs, args.rounds)
+        method_mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+        mismatches += method_mismatches
+        results[method] = {
+            'paragraphs': len(paragraphs),
+            'rounds': args.rounds,
+            'plain_seconds': plain_seconds,
+            'memo_seconds': memo_seconds,
+            'speedup': plain_seconds / memo_seconds if memo_seconds else None,
+            'cache': cache.stats(),
+            'mismatches': method_mismatches,
+        }
+    common.write_results('sentence_memo', results, args.output)
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Measure sharded bulk normalization by number of processes and corpus size.
+
+    python3 benchmarks/bench_shards.py [--corpus FILE] [--megabytes 16 64] [--processes 1 4] [--output results.json]
+
+Writes a corpus of each of --megabytes from the corpus lines and normalizes it with
+tts_frontend_bulk.normalize_sharded on each number of --processes. Reports documents per second,
+the speedup over one process and the largest RSS of a shard process, which should not grow with the
+corpus, and exits with status 1 if the shards of any run differ from those of the first.
+"""
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import tempfile
+
+import common
+from tts_frontend_bulk import normalize_sharded
+
+
+def write_corpus(path, lines, megabytes):
+    size = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while size < megabytes * 1024 * 1024:
+            for line in lines:
+                f.write(line + '\n')
+                size += len(line.encode('utf-8')) + 1
+
+
+def shards_digest(directory):
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(directory, 'shard-*.jsonl'))):
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=common.DEFAULT_CORPUS)
+    parser.add_argument('--megabytes', type=int, nargs='+', default=[16, 64])
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--shard-bytes', type=int, default=4 * 1024 * 1024)
+    parser.add_argument('--compiled-rules', action='store_true')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    lines = common.load_corpus(args.corpus)
+    results = {}
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for megabytes in args.megabytes:
+            corpus = os.path.join(tmp, 'corpus-{}.txt'.format(megabytes))
+            write_corpus(corpus, lines, megabytes)
+            expected = None
+            for processes in args.processes:
+                directory = os.path.join(tmp, 'out-{}-{}'.format(megabytes, processes))
+                manifest, seconds = common.timed(lambda: normalize_sharded(
+                    corpus, directory, args.shard_bytes, processes, compiled_rules=args.compiled_rules))
+                documents = sum(shard['documents'] for shard in manifest.shards)
+                name = '{}_mb_{}_processes'.format(megabytes, processes)
+                results[name] = {'shards': len(manifest.shards), 'documents': documents, 'seconds': seconds,
+                                 'documents_per_second': documents / seconds,
+                                 'max_shard_rss_kb': max(shard['max_rss_kb'] or 0 for shard in manifest.shards)}
+                output = shards_digest(directory)
+                if expected is None:
+                    expected = output
+                    first = results[name]
+                elif output != expected:
+                    mismatches += 1
+                    print('shards of {} differ'.format(name), file=sys.stderr)
+                results[name]['speedup'] = first['seconds'] / seconds
+    results['mismatches'] = mismatches
+    common.write_results('shards', results, args.output)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
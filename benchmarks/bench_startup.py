@@ -0,0 +1,69 @@
+"""Measure how long a fresh process takes until its normalizer is usable, with and without a snapshot.
+
+    python3 benchmarks/bench_startup.py [--runs 3] [--snapshot PATH] [--output results.json]
+
+Every run starts a new Python process, so imports and model loading are included in the times.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import common
+
+
+def child(snapshot_path):
+    start = time.perf_counter()
+    from normalizer_loader import load_normalizer
+    normalizer = load_normalizer(snapshot_path)
+    normalizer.normalize_tokenwise('Klukkan er 12:30.', '')
+    print(json.dumps({'seconds': time.perf_counter() - start}))
+
+
+def measure(snapshot_path, runs):
+    command = [sys.executable, os.path.abspath(__file__), '--child']
+    if snapshot_path:
+        command += ['--snapshot', snapshot_path]
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        total = time.perf_counter() - start
+        timings.append({'process_seconds': total, 'load_seconds': json.loads(output.splitlines()[-1])['seconds']})
+    return {
+        'runs': timings,
+        'min_process_seconds': min(t['process_seconds'] for t in timings),
+        'min_load_seconds': min(t['load_seconds'] for t in timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--snapshot', help='snapshot file to use (default: a temporary file)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    if args.child:
+        child(args.snapshot)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = args.snapshot or os.path.join(tmp, 'normalizer.snapshot')
+        if os.path.exists(snapshot_path):
+            os.unlink(snapshot_path)
+        results = {'without_snapshot': measure(None, args.runs)}
+        # the first run with a snapshot path builds the snapshot and is not counted
+        measure(snapshot_path, 1)
+        results['with_snapshot'] = measure(snapshot_path, args.runs)
+        results['snapshot_bytes'] = os.path.getsize(snapshot_path)
+    results['speedup'] = results['without_snapshot']['min_process_seconds'] / \
+        results['with_snapshot']['min_process_seconds']
+    common.write_results('startup', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
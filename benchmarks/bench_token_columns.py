@@ -0,0 +1,100 @@
+"""Compare the memory of normalize_tokenwise results as lists of tuples and as TokenColumns.
+
+    python3 benchmarks/bench_token_columns.py [--corpus FILE] [--kilobytes 1024] [--output results.json]
+
+Builds the normalize_tokenwise result of a document of --kilobytes of corpus paragraphs, each
+distinct paragraph normalized once but with strings of its own wherever it occurs, as the
+normalizer would return them. For both representations it measures unpickling the result, as the
+parent of a normalizer process does: the pickle size, and with tracemalloc the bytes and memory
+blocks the result keeps and the peak while it is made. And encoding it to a serialized
+TokenBasedNormalizedResponse, also by building the protobuf message: the peak and the time taken,
+which is measured without tracemalloc. Exits with status 1 if the encodings differ.
+"""
+import argparse
+import pickle
+import sys
+import tracemalloc
+
+import common
+from normalizer_loader import load_normalizer
+from response_encoding import encode_tokenbased_response
+from token_columns import TokenColumns
+
+
+def traced(function, *args):
+    """Return (result, bytes still allocated, memory blocks still allocated, peak bytes, seconds) of a call."""
+    _, seconds = common.timed(function, *args)
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        current, peak = tracemalloc.get_traced_memory()
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    finally:
+        tracemalloc.stop()
+    return result, current, blocks, peak, seconds
+
+
+def build_protobuf(normalized_arr):
+    from generated.messages import tts_frontend_message_pb2
+    response = tts_frontend_message_pb2.TokenBasedNormalizedResponse()
+    for sentence in normalized_arr:
+        sentence_response = response.sentence.add()
+        for index, pair in enumerate(sentence):
+            sentence_response.token_info.add(original_token=pair[0], normalized_token=pair[1], original_index=index,
+                                             has_changed=pair[0] != pair[1])
+        sentence_response.normalized_sentence = ' '.join([pair[1] for pair in sentence]).strip()
+    return response.SerializeToString()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=common.DEFAULT_CORPUS)
+    parser.add_argument('--kilobytes', type=int, default=1024, help='size of the document')
+    parser.add_argument('--domain', default='')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    paragraphs = common.load_corpus(args.corpus)
+    normalizer = load_normalizer()
+    normalized_paragraphs = {}
+    normalized = []
+    size = 0
+    while size < args.kilobytes * 1024:
+        for paragraph in paragraphs:
+            if paragraph not in normalized_paragraphs:
+                normalized_paragraphs[paragraph] = normalizer.normalize_tokenwise(paragraph, args.domain)
+            normalized.extend([[(original.encode('utf-8').decode('utf-8'), token.encode('utf-8').decode('utf-8'))
+                                for original, token in sentence] for sentence in normalized_paragraphs[paragraph]])
+            size += len(paragraph.encode('utf-8')) + 1
+    columns = TokenColumns.from_tokenwise(normalized)
+
+    results = {'document_bytes': size, 'sentences': len(normalized),
+               'tokens': sum(len(sentence) for sentence in normalized)}
+    encodings = {}
+    for name, value in (('tuples', normalized), ('columns', columns)):
+        pickled = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        value, retained, blocks, peak, seconds = traced(pickle.loads, pickled)
+        encoded, _, _, encode_peak, encode_seconds = traced(encode_tokenbased_response, value)
+        encodings[name] = encoded
+        results[name] = {'pickle_bytes': len(pickled), 'retained_bytes': retained, 'retained_blocks': blocks,
+                         'unpickle_peak_bytes': peak, 'unpickle_seconds': seconds, 'encode_peak_bytes': encode_peak,
+                         'encode_seconds': encode_seconds}
+    try:
+        encoded, _, _, peak, seconds = traced(build_protobuf, normalized)
+    except ImportError:
+        pass
+    else:
+        encodings['protobuf'] = encoded
+        results['protobuf'] = {'encode_peak_bytes': peak, 'encode_seconds': seconds}
+    results['columns_retained_fraction'] = results['columns']['retained_bytes'] / results['tuples']['retained_bytes']
+    mismatches = [name for name, encoded in encodings.items() if encoded != encodings['tuples']]
+    for name in mismatches:
+        print('{} encoding differs'.format(name), file=sys.stderr)
+    results['mismatches'] = len(mismatches)
+    common.write_results('token_columns', results, args.output)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
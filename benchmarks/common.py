@@ -0,0 +1,57 @@
+"""Helpers shared by the benchmark scripts."""
+import json
+import os
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), 'src')
+DEFAULT_CORPUS = os.path.join(BENCHMARK_DIR, 'corpus.txt')
+
+# make the service modules importable the same way tts_frontend_server.py does
+sys.path.append(SRC_DIR)
+sys.path.append(os.path.join(SRC_DIR, 'generated'))
+
+
+def load_corpus(path=DEFAULT_CORPUS):
+    """Return the non-empty lines of a plain text corpus, one paragraph per line."""
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def latency_summary(latencies):
+    """Summarize a list of latencies in seconds as milliseconds."""
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'mean_ms': 1000 * sum(values) / len(values) if values else 0.0,
+        'p50_ms': 1000 * percentile(values, 0.5),
+        'p95_ms': 1000 * percentile(values, 0.95),
+        'p99_ms': 1000 * percentile(values, 0.99),
+        'p999_ms': 1000 * percentile(values, 0.999),
+        'max_ms': 1000 * values[-1] if values else 0.0,
+    }
+
+
+def timed(function, *args, **kwargs):
+    """Call function and return (result, elapsed seconds)."""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def write_results(name, results, output=None):
+    """Print results as JSON and, if output is given, write them to that file as well."""
+    document = {'benchmark': name, 'timestamp': time.time(), 'results': results}
+    text = json.dumps(document, indent=2, ensure_ascii=False)
+    print(text)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
@@ -0,0 +1,188 @@
+"""gRPC load generator that replays a corpus against the TTS frontend server.
+
+    python3 benchmarks/load_test.py [--mode closed|open] [--concurrency 1 8 32] [--rate 20 50] [--duration 10]
+                                    [--rpc Normalize|NormalizeTokenwise] [--target HOST:PORT]
+                                    [--output results.json] [-- SERVER OPTIONS]
+
+Without --target, a one-worker server is started in this process on a free local port, with the server
+options given after `--`, e.g. `-- --fast-path --cache-bytes 0`. Client and server then share a process
+and its GIL, so compare results of in-process runs only with each other.
+
+In closed-loop mode each of --concurrency clients sends its next request as soon as the previous one
+is answered. In open-loop mode requests are sent at a fixed --rate per second whether or not earlier
+ones have been answered, and latency is measured from the time a request was due, so a server that
+falls behind shows it as queueing delay instead of sending fewer requests. Every concurrency level or
+rate is run for --duration seconds and reported with its throughput, latency percentiles of the
+successful requests and the number of failures per status code.
+"""
+import argparse
+import collections
+import functools
+import socket
+import sys
+import threading
+import time
+
+import grpc
+
+import common
+import tts_frontend_server
+from generated.messages import tts_frontend_message_pb2
+from generated.services import tts_frontend_service_pb2_grpc
+
+RPCS = ('Normalize', 'NormalizeTokenwise')
+
+
+class Recorder:
+    """Collects latencies of successful requests and counts of failed ones."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = collections.Counter()
+        self.lock = threading.Lock()
+
+    def record(self, seconds, error=None):
+        with self.lock:
+            if error is None:
+                self.latencies.append(seconds)
+            else:
+                self.errors[error.code().name if isinstance(error, grpc.RpcError) else repr(error)] += 1
+
+    def summary(self, elapsed):
+        summary = common.latency_summary(self.latencies)
+        summary['throughput_rps'] = len(self.latencies) / elapsed if elapsed else 0.0
+        summary['errors'] = dict(self.errors)
+        return summary
+
+
+def free_port():
+    with socket.socket(socket.AF_INET6, socket.SOCK_STREAM) as sock:
+        sock.bind(('::', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(server_argv):
+    """Start a server in this process and return it and its address once it is ready."""
+    port = free_port()
+    options = tts_frontend_server.parse_args(server_argv + ['--workers', '1', '--port', str(port)])
+    servicer = tts_frontend_server.create_servicer(options)
+    server = tts_frontend_server.create_server(options, servicer)
+    server.start()
+    servicer.ready.wait()
+    return server, servicer, 'localhost:{}'.format(port)
+
+
+def closed_loop(calls, requests, concurrency, duration, call_options):
+    recorder = Recorder()
+    stop_at = time.monotonic() + duration
+
+    def client(index):
+        call = calls[index % len(calls)]
+        sent = index
+        while time.monotonic() < stop_at:
+            request = requests[sent % len(requests)]
+            sent += concurrency
+            start = time.perf_counter()
+            try:
+                call(request, **call_options)
+                recorder.record(time.perf_counter() - start)
+            except grpc.RpcError as e:
+                recorder.record(time.perf_counter() - start, e)
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.summary(time.perf_counter() - start)
+
+
+def open_loop(calls, requests, rate, duration, call_options):
+    recorder = Recorder()
+
+    def done(due, future):
+        recorder.record(time.perf_counter() - due, future.exception())
+
+    futures = []
+    # how far the generator itself fell behind the schedule, large values make the results unreliable
+    max_send_lag = 0.0
+    start = time.perf_counter()
+    for sent in range(int(rate * duration)):
+        due = start + sent / rate
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            max_send_lag = max(max_send_lag, -delay)
+        future = calls[sent % len(calls)].future(requests[sent % len(requests)], **call_options)
+        future.add_done_callback(functools.partial(done, due))
+        futures.append(future)
+    for future in futures:
+        future.exception()
+    summary = recorder.summary(time.perf_counter() - start)
+    summary['max_send_lag_ms'] = 1000 * max_send_lag
+    return summary
+
+
+def main():
+    argv = sys.argv[1:]
+    server_argv = []
+    if '--' in argv:
+        server_argv = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=common.DEFAULT_CORPUS)
+    parser.add_argument('--target', help='HOST:PORT of a running server (default: start one in-process)')
+    parser.add_argument('--rpc', choices=RPCS, default='NormalizeTokenwise')
+    parser.add_argument('--mode', choices=('closed', 'open'), default='closed')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32],
+                        help='closed loop: concurrent clients, one run per value')
+    parser.add_argument('--rate', type=float, nargs='+', default=[20.0],
+                        help='open loop: requests per second, one run per value')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per run')
+    parser.add_argument('--warmup', type=int, default=20, help='requests sent before measuring')
+    parser.add_argument('--channels', type=int, default=1, help='gRPC channels the requests are spread over')
+    parser.add_argument('--timeout', type=float, default=None, help='deadline of each request in seconds')
+    parser.add_argument('--traffic-class', choices=('interactive', 'bulk'), default=None,
+                        help='send x-traffic-class metadata with every request')
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    server = servicer = None
+    target = args.target
+    if target is None:
+        server, servicer, target = start_server(server_argv)
+    channels = [grpc.insecure_channel(target) for _ in range(args.channels)]
+    calls = [getattr(tts_frontend_service_pb2_grpc.TTSFrontendStub(channel), args.rpc) for channel in channels]
+    requests = [tts_frontend_message_pb2.NormalizeRequest(content=paragraph)
+                for paragraph in common.load_corpus(args.corpus)]
+    call_options = {'timeout': args.timeout}
+    if args.traffic_class:
+        call_options['metadata'] = [('x-traffic-class', args.traffic_class)]
+
+    for sent in range(args.warmup):
+        calls[sent % len(calls)](requests[sent % len(requests)], **call_options)
+    results = []
+    if args.mode == 'closed':
+        for concurrency in args.concurrency:
+            result = {'mode': 'closed', 'rpc': args.rpc, 'concurrency': concurrency}
+            result.update(closed_loop(calls, requests, concurrency, args.duration, call_options))
+            results.append(result)
+    else:
+        for rate in args.rate:
+            result = {'mode': 'open', 'rpc': args.rpc, 'rate': rate}
+            result.update(open_loop(calls, requests, rate, args.duration, call_options))
+            results.append(result)
+
+    for channel in channels:
+        channel.close()
+    if server is not None:
+        server.stop(0)
+        servicer.batch_pool.shutdown()
+    common.write_results('load_test', {'target': args.target or 'in-process', 'server_options': server_argv,
+                                       'runs': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
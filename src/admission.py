@@ -0,0 +1,146 @@
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+import grpc
+
+import metrics
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+# request metadata key with which clients choose their traffic class
+TRAFFIC_CLASS_KEY = 'x-traffic-class'
+# cost of a token relative to a character, a token costs a tagger step and a rule lookup
+TOKEN_COST = 8
+# seconds; a longer time remaining counts as no deadline
+NO_DEADLINE = 24 * 3600
+
+
+class _Waiter:
+    __slots__ = ('granted', 'traffic_class', 'cancelled')
+
+    def __init__(self, traffic_class):
+        self.granted = threading.Event()
+        self.traffic_class = traffic_class
+        self.cancelled = False
+
+
+class AdmissionController:
+    """Decides when, and whether, a normalization request may run.
+
+    Requests larger than `max_content_bytes` are rejected. With `slots > 0` at most `slots`
+    requests are normalized at a time, and waiting requests are scheduled by traffic class:
+    interactive requests always go first, earliest deadline first and then cheapest first, while
+    bulk requests run cheapest first on at most `bulk_slots` of the slots. At most `max_bulk_queue`
+    bulk requests may wait, so they cannot occupy all handler threads. The traffic class is taken
+    from the `x-traffic-class` request metadata, or else requests of more than `bulk_bytes` bytes
+    count as bulk.
+    """
+
+    def __init__(self, slots=0, bulk_slots=1, max_bulk_queue=4, bulk_bytes=2000, max_content_bytes=0):
+        self.slots = slots
+        self.bulk_slots = max(1, min(bulk_slots, slots)) if slots else 0
+        self.max_bulk_queue = max_bulk_queue
+        self.bulk_bytes = bulk_bytes
+        self.max_content_bytes = max_content_bytes
+        self.running = {INTERACTIVE: 0, BULK: 0}
+        self.rejected = 0
+        self._queues = {INTERACTIVE: [], BULK: []}
+        self._waiting = {INTERACTIVE: 0, BULK: 0}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def estimate_cost(content):
+        return len(content) + TOKEN_COST * (content.count(' ') + 1)
+
+    def traffic_class(self, content, context):
+        for key, value in context.invocation_metadata() or ():
+            if key == TRAFFIC_CLASS_KEY and value in (INTERACTIVE, BULK):
+                return value
+        return BULK if len(content.encode('utf-8')) > self.bulk_bytes else INTERACTIVE
+
+    def stats(self):
+        with self._lock:
+            return {'running': dict(self.running), 'waiting': dict(self._waiting), 'rejected': self.rejected}
+
+    def _can_run(self, traffic_class):
+        if sum(self.running.values()) >= self.slots:
+            return False
+        return traffic_class == INTERACTIVE or self.running[BULK] < self.bulk_slots
+
+    def _dispatch(self):
+        """Grant free slots to the best waiting requests. Called with the lock held."""
+        for traffic_class in (INTERACTIVE, BULK):
+            queue = self._queues[traffic_class]
+            while queue and self._can_run(traffic_class):
+                waiter = heapq.heappop(queue)[-1]
+                if waiter.cancelled:
+                    continue
+                self._waiting[traffic_class] -= 1
+                self.running[traffic_class] += 1
+                waiter.granted.set()
+
+    def _release(self, traffic_class):
+        with self._lock:
+            self.running[traffic_class] -= 1
+            self._dispatch()
+
+    def check_size(self, content, context):
+        """Abort the RPC with RESOURCE_EXHAUSTED if content is over the size limit."""
+        if not self.max_content_bytes or len(content) * 4 <= self.max_content_bytes:
+            return
+        if len(content) > self.max_content_bytes or len(content.encode('utf-8')) > self.max_content_bytes:
+            with self._lock:
+                self.rejected += 1
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                          'content exceeds the limit of {} bytes'.format(self.max_content_bytes))
+
+    @contextlib.contextmanager
+    def admit(self, content, context):
+        """Context manager that waits for a slot to normalize content, or aborts the RPC."""
+        if not self.slots:
+            yield
+            return
+
+        traffic_class = self.traffic_class(content, context)
+        remaining = context.time_remaining()
+        if remaining is not None and remaining > NO_DEADLINE:
+            # the sync server reports calls without a deadline as having years left
+            remaining = None
+        deadline = time.monotonic() + remaining if remaining is not None else float('inf')
+        waiter = _Waiter(traffic_class)
+        with self._lock:
+            if traffic_class == BULK and self._waiting[BULK] >= self.max_bulk_queue \
+                    and not self._can_run(BULK):
+                self.rejected += 1
+                waiter = None
+            else:
+                if traffic_class == INTERACTIVE:
+                    priority = (deadline, self.estimate_cost(content))
+                else:
+                    priority = (self.estimate_cost(content),)
+                heapq.heappush(self._queues[traffic_class], priority + (next(self._sequence), waiter))
+                self._waiting[traffic_class] += 1
+                self._dispatch()
+        if waiter is None:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, 'too many bulk requests waiting')
+
+        start = time.perf_counter()
+        timeout = None if remaining is None else max(0.0, deadline - time.monotonic())
+        granted = waiter.granted.wait(timeout)
+        metrics.observe_stage('admission', time.perf_counter() - start)
+        if not granted:
+            with self._lock:
+                granted = waiter.granted.is_set()
+                if not granted:
+                    waiter.cancelled = True
+                    self._waiting[traffic_class] -= 1
+            if not granted:
+                context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, 'deadline passed while waiting to be scheduled')
+        try:
+            yield
+        finally:
+            self._release(traffic_class)
@@ -0,0 +1,155 @@
+"""Split a memory-mapped corpus file into shards and keep track of the shards done.
+
+A shard is a byte range of the corpus that ends at a line break, or in a line of plain text that
+runs on for too long, at a boundary of the normalizer's sentences (see segmentation); normalizing
+the shards one by one gives the same sentences as normalizing the whole corpus. Shards are read through the mapping a window at a time, and
+the pages read are released again, so reading a shard takes the same memory however large it is.
+"""
+import json
+import mmap
+import os
+
+# bytes searched past a shard's nominal end for a line break or a sentence boundary
+SEARCH_BYTES = 64 * 1024
+# bytes of a shard read at a time, before their pages are released again
+WINDOW_BYTES = 16 * 1024 * 1024
+MANIFEST = 'manifest.json'
+
+
+def open_corpus(path):
+    """Map a corpus file read-only, returns None for an empty file, which can't be mapped."""
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _sentence_boundary(data, start, end, splitter):
+    """Byte offset of the first sentence boundary in data[start:end], or -1."""
+    # start and end on character boundaries, UTF-8 continuation bytes are 0b10xxxxxx
+    while start < end and data[start] & 0xc0 == 0x80:
+        start += 1
+    while end > start and data[end - 1] & 0xc0 == 0x80:
+        end -= 1
+    if end > start and data[end - 1] >= 0xc0:
+        end -= 1
+    try:
+        text = data[start:end].decode('utf-8')
+    except UnicodeDecodeError:
+        return -1
+    # from the first space on tokens are whole; the text may go on past end
+    first_space = text.find(' ')
+    if first_space < 0:
+        return -1
+    previous = first_space
+    for boundary in splitter.iter_boundaries(text, first_space, final=False):
+        # a sentence without letters or digits at the end of a shard would be appended to the one before it
+        if splitter.has_words(text[previous:boundary]):
+            return start + len(text[:boundary].encode('utf-8'))
+        previous = boundary
+    return -1
+
+
+def shard_ranges(data, shard_bytes, splitter=None):
+    """Return the (start, end) byte ranges of shards of about shard_bytes of the mapped corpus.
+
+    Shards end after a line break. With a SentenceSplitter, a line that runs on for more than a
+    shard may also be split at a sentence boundary.
+    """
+    ranges = []
+    size = len(data)
+    start = 0
+    while start < size:
+        end = start + shard_bytes
+        while end < size:
+            search_end = min(size, end + SEARCH_BYTES)
+            line_break = data.find(b'\n', end, search_end)
+            if line_break >= 0:
+                end = line_break + 1
+                break
+            if splitter is not None:
+                boundary = _sentence_boundary(data, end, search_end, splitter)
+                if boundary >= 0:
+                    end = boundary
+                    break
+            end = search_end
+        end = min(end, size)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _release(data, start, end):
+    if hasattr(data, 'madvise') and hasattr(mmap, 'MADV_DONTNEED'):
+        start -= start % mmap.PAGESIZE
+        if end > start:
+            data.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+
+def iter_lines(data, start, end):
+    """Yield (byte offset, bytes of the line without its line break) of the lines of data[start:end]."""
+    position = start
+    released = start
+    while position < end:
+        line_end = data.find(b'\n', position, end)
+        if line_end < 0:
+            line_end = end
+        yield position, data[position:line_end]
+        position = line_end + 1
+        if position - released >= WINDOW_BYTES:
+            _release(data, released, position)
+            released = position
+    _release(data, released, min(position, end))
+
+
+class Manifest:
+    """The shards of a job and which of them are done, kept in DIRECTORY/manifest.json.
+
+    `job` describes the input and the settings the shards were made with; a manifest made for
+    another job is not resumed.
+    """
+
+    def __init__(self, directory, job, shards):
+        self.directory = directory
+        self.job = job
+        # dicts with index, start, end, output and done
+        self.shards = shards
+
+    @classmethod
+    def load(cls, directory):
+        """The manifest in directory, or None if there is none."""
+        try:
+            with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+                document = json.load(f)
+        except FileNotFoundError:
+            return None
+        return cls(directory, document['job'], document['shards'])
+
+    @classmethod
+    def create(cls, directory, job, ranges):
+        shards = [{'index': index, 'start': start, 'end': end, 'output': 'shard-{:05d}.jsonl'.format(index),
+                   'done': False} for index, (start, end) in enumerate(ranges)]
+        manifest = cls(directory, job, shards)
+        manifest.save()
+        return manifest
+
+    def output_path(self, shard):
+        return os.path.join(self.directory, shard['output'])
+
+    def pending(self):
+        """Shards not done, or whose output has gone missing."""
+        return [shard for shard in self.shards
+                if not shard['done'] or not os.path.exists(self.output_path(shard))]
+
+    def mark_done(self, index, **stats):
+        self.shards[index].update(stats, done=True)
+        self.save()
+
+    def save(self):
+        path = os.path.join(self.directory, MANIFEST)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'job': self.job, 'shards': self.shards}, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
@@ -0,0 +1,265 @@
+"""Normalization domains beyond the normalizer's own, loaded from domain pack files.
+
+The normalizer knows the domains '' and 'sport' (and 'other'). A domain pack builds on one of them,
+its `base`, and rewrites the words of the normalized text with rule tables of its own, such as the
+units and abbreviations of weather reports. A pack is a JSON file NAME.json in the packs directory:
+
+    {"base": "", "tables": ["tables/units.json"], "rules": {"^frostm$": "frostmark"}}
+
+`tables` are rule files, relative to the packs directory, and `rules` the pack's own. A rule table
+is a JSON object of {pattern: replacement}, applied like the normalizer's tables: re.sub of every
+rule, in order, to every word of the normalized text, so normalize and normalize_tokenwise agree.
+Rules see the normalizer's output, not the request's text: the abbreviations and units it knows are
+already expanded, numbers and short all-capital words are spelled out, and the period of an
+abbreviation at the end of a sentence is a word of its own ('frostm .').
+Tables are compiled once (see rule_engine.RuleTable) and shared by all packs that use them.
+
+Clients select a pack with `x-domain: NAME` request metadata. Packs are loaded when first requested,
+at most `max_domains` are kept, and a pack whose files have changed is reloaded when it is next used,
+at most every `reload_interval` seconds. A reload doesn't hold up requests: they go on with the old
+pack until the new one is in place, and if the new files don't load the old pack stays.
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+
+from rule_engine import RuleTable
+from token_columns import TokenColumns
+
+logger = logging.getLogger(__name__)
+
+DOMAIN_KEY = 'x-domain'
+# the normalizer's own domains, which packs can build on but not replace
+BUILTIN_DOMAINS = ('', 'sport', 'other')
+NAME = re.compile('[a-z0-9][a-z0-9_-]*')
+WORD = re.compile(r'\S+')
+# rewritten words remembered per pack
+MAX_WORDS = 100000
+
+
+class UnknownDomain(KeyError):
+    """A domain that is neither built in nor a pack in the packs directory."""
+
+
+class DomainPackError(ValueError):
+    """A domain pack or rule table that can't be loaded."""
+
+
+def requested(context):
+    """The domain named in a request's metadata, or None."""
+    for key, value in context.invocation_metadata() or ():
+        if key == DOMAIN_KEY:
+            return value
+    return None
+
+
+class DomainPack:
+    """A loaded domain pack, see the module documentation. Packs don't change once loaded."""
+
+    def __init__(self, name, base, tables, version, files):
+        self.name = name
+        self.base = base
+        self.tables = tables
+        # identifies the content of the pack's files, for cache keys
+        self.version = version
+        # {path: (mtime_ns, size)} of the files the pack was loaded from
+        self.files = files
+        self.checked = time.monotonic()
+        self._words = {}
+
+    def rewrite_word(self, word):
+        rewritten = self._words.get(word)
+        if rewritten is None:
+            rewritten = word
+            for table in self.tables:
+                rewritten = table.apply(rewritten)
+            if len(self._words) >= MAX_WORDS:
+                self._words.clear()
+            self._words[word] = rewritten
+        return rewritten
+
+    def rewrite(self, text):
+        return WORD.sub(lambda match: self.rewrite_word(match.group()), text)
+
+    def normalize(self, normalized_arr):
+        """Apply the pack to the result of Normalizer.normalize in the base domain."""
+        return [(self.rewrite(sentence[0]),) + tuple(sentence[1:]) for sentence in normalized_arr]
+
+    def normalize_tokenwise(self, normalized_arr):
+        """Apply the pack to the result of Normalizer.normalize_tokenwise in the base domain."""
+        rewritten = [[(original, self.rewrite(normalized)) for original, normalized in sentence]
+                     for sentence in normalized_arr]
+        if isinstance(normalized_arr, TokenColumns):
+            return TokenColumns.from_tokenwise(rewritten)
+        return rewritten
+
+
+def _stat(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_json(path, digest):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest.update(data)
+        return json.loads(data.decode('utf-8'))
+    except (OSError, ValueError) as e:
+        raise DomainPackError('{}: {}'.format(path, e))
+
+
+def _rules(path, rules):
+    if not isinstance(rules, dict) or not all(isinstance(pattern, str) and isinstance(replacement, str)
+                                              for pattern, replacement in rules.items()):
+        raise DomainPackError('{}: rules must be an object of pattern: replacement strings'.format(path))
+    try:
+        return RuleTable(rules)
+    except re.error as e:
+        raise DomainPackError('{}: {}'.format(path, e))
+
+
+class DomainRegistry:
+    """The domain packs in a directory, loaded on first use, see the module documentation."""
+
+    def __init__(self, directory, max_domains=16, reload_interval=5.0):
+        self.directory = directory
+        self.max_domains = max_domains
+        self.reload_interval = reload_interval
+        self.loads = 0
+        self.reloads = 0
+        self.evictions = 0
+        self._packs = collections.OrderedDict()
+        # compiled rule tables by file and version, shared by the packs using them while any does
+        self._tables = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        # packs are loaded one at a time
+        self._load_lock = threading.Lock()
+
+    def _path(self, name):
+        if name in BUILTIN_DOMAINS or not NAME.fullmatch(name):
+            raise UnknownDomain(name)
+        path = os.path.join(self.directory, name + '.json')
+        if not os.path.isfile(path):
+            raise UnknownDomain(name)
+        return path
+
+    def names(self):
+        """Names of the packs in the directory."""
+        return sorted(entry[:-len('.json')] for entry in os.listdir(self.directory)
+                      if entry.endswith('.json') and NAME.fullmatch(entry[:-len('.json')]))
+
+    def _table(self, path, digest):
+        try:
+            stat = _stat(path)
+        except OSError as e:
+            raise DomainPackError('{}: {}'.format(path, e))
+        key = (path,) + stat
+        table = self._tables.get(key)
+        rules = _read_json(path, digest)
+        if table is None:
+            table = self._tables[key] = _rules(path, rules)
+        return table, stat
+
+    def _load(self, name):
+        path = self._path(name)
+        digest = hashlib.sha1()
+        files = {path: _stat(path)}
+        pack = _read_json(path, digest)
+        if not isinstance(pack, dict):
+            raise DomainPackError('{}: a domain pack is a JSON object'.format(path))
+        base = pack.get('base', '')
+        if base not in BUILTIN_DOMAINS:
+            raise DomainPackError('{}: base must be one of {}'.format(path, ', '.join(map(repr, BUILTIN_DOMAINS))))
+        tables = []
+        for table_name in pack.get('tables', ()):
+            table_path = os.path.join(self.directory, table_name)
+            table, files[table_path] = self._table(table_path, digest)
+            tables.append(table)
+        if pack.get('rules'):
+            tables.append(_rules(path, pack['rules']))
+        return DomainPack(name, base, tables, digest.hexdigest()[:16], files)
+
+    def _changed(self, pack):
+        try:
+            return any(_stat(path) != stat for path, stat in pack.files.items())
+        except OSError:
+            return True
+
+    def get(self, name):
+        """The DomainPack called name, loaded or reloaded as needed.
+
+        Raises UnknownDomain for a name that isn't a pack, and DomainPackError if a pack that isn't
+        loaded yet can't be loaded.
+        """
+        now = time.monotonic()
+        with self._lock:
+            pack = self._packs.get(name)
+            if pack is not None:
+                self._packs.move_to_end(name)
+                if now - pack.checked < self.reload_interval:
+                    return pack
+                # the other requests go on with this pack while this one checks it
+                pack.checked = now
+        if pack is not None and not self._changed(pack):
+            return pack
+        with self._load_lock:
+            with self._lock:
+                current = self._packs.get(name)
+            if current is not None and current is not pack:
+                return current
+            try:
+                new_pack = self._load(name)
+            except (UnknownDomain, DomainPackError) as e:
+                if pack is None:
+                    raise
+                logger.warning('could not reload domain pack %s, keeping the loaded one: %s', name, e)
+                return pack
+            with self._lock:
+                self._packs[name] = new_pack
+                self._packs.move_to_end(name)
+                if pack is None:
+                    self.loads += 1
+                else:
+                    self.reloads += 1
+                while len(self._packs) > self.max_domains:
+                    self._packs.popitem(last=False)
+                    self.evictions += 1
+        logger.info('%s domain pack %s version %s', 'loaded' if pack is None else 'reloaded', name, new_pack.version)
+        return new_pack
+
+    def stats(self):
+        with self._lock:
+            return {'loaded': len(self._packs), 'loads': self.loads, 'reloads': self.reloads,
+                    'evictions': self.evictions, 'tables': len(self._tables)}
+
+
+class DomainNormalizer:
+    """Wraps a Normalizer and normalizes in the domains of a DomainRegistry besides the built-in ones.
+
+    The text is normalized in the pack's base domain by the wrapped normalizer, so the wrappers below
+    this one, such as the sentence memo, share their work between packs with the same base. It offers
+    the same normalize/normalize_tokenwise methods as the Normalizer.
+    """
+
+    def __init__(self, normalizer, registry):
+        self.normalizer = normalizer
+        self.registry = registry
+
+    def normalize(self, text, domain):
+        if domain in BUILTIN_DOMAINS:
+            return self.normalizer.normalize(text, domain)
+        pack = self.registry.get(domain)
+        return pack.normalize(self.normalizer.normalize(text, pack.base))
+
+    def normalize_tokenwise(self, text, domain):
+        if domain in BUILTIN_DOMAINS:
+            return self.normalizer.normalize_tokenwise(text, domain)
+        pack = self.registry.get(domain)
+        return pack.normalize_tokenwise(self.normalizer.normalize_tokenwise(text, pack.base))
@@ -0,0 +1,224 @@
+"""Server-held documents that clients edit, so that only the sentences an edit touches are normalized again.
+
+A session keeps the text of a document split into the normalizer's sentences by a SentenceSplitter,
+with the tokenwise normalization of every piece. An edit replaces `delete` characters at `offset`
+with new text. The text is split again from the last boundary before the edit that the edit can't
+move, up to the first boundary after it that is also a boundary of the old text; the pieces after
+that are unchanged. The normalizer normalizes every sentence on its own, so pieces whose text didn't
+change keep their normalization, and the others are normalized in a single call.
+"""
+import collections
+import logging
+import threading
+import time
+
+from sentence_memo import estimate_size, normalize_sentences
+from token_columns import TokenColumns
+
+logger = logging.getLogger(__name__)
+
+# request metadata: the session, and the edit the request content is inserted with; without an
+# offset the content replaces the whole document, which starts the session if it doesn't exist
+SESSION_KEY = 'x-session-id'
+EDIT_OFFSET_KEY = 'x-edit-offset'
+EDIT_DELETE_KEY = 'x-edit-delete'
+# trailing metadata: the response sentences replace `removed` normalized sentences from index `start`
+# of the previous response, and the document now has `count` normalized sentences
+SENTENCE_START_KEY = 'x-sentence-start'
+SENTENCES_REMOVED_KEY = 'x-sentences-removed'
+SENTENCE_COUNT_KEY = 'x-sentence-count'
+
+
+class EditError(ValueError):
+    """An edit that doesn't fit the session's document."""
+
+
+class UnknownSession(KeyError):
+    """An edit of a session that doesn't exist, or has expired."""
+
+
+class _Piece:
+    __slots__ = ('end', 'sentence', 'normalized')
+
+    def __init__(self, end, sentence, normalized):
+        # offset in the document where the piece ends, the stripped text and its normalizer sentences
+        self.end = end
+        self.sentence = sentence
+        self.normalized = normalized
+
+
+class _Session:
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.text = ''
+        self.pieces = []
+        self.size = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class Splice(collections.namedtuple('Splice', ['start', 'removed', 'sentences', 'count'])):
+    """The normalized sentences replacing `removed` ones from index `start`, and the new sentence count."""
+
+
+class EditSessions:
+    """Edit sessions of one process, bounded by number, total size and idle time.
+
+    `normalizer` offers normalize_tokenwise(), `splitter` is the SentenceSplitter that normalizer
+    results are split up with. Sessions unused for `idle_timeout` seconds are dropped, and the least
+    recently used ones once there are more than `max_sessions` or they take more than about `max_bytes`.
+    """
+
+    def __init__(self, normalizer, splitter, max_sessions=1000, max_bytes=256 * 1024 * 1024, idle_timeout=600):
+        self.normalizer = normalizer
+        self.splitter = splitter
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self.size = 0
+        self.sentences_normalized = 0
+        self.sentences_reused = 0
+        self.evictions = 0
+        self._sessions = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        # sessions are kept in order of last use, so the idle ones are at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.idle_timeout:
+                break
+            self._drop(session_id)
+
+    def _drop(self, session_id):
+        session = self._sessions.pop(session_id)
+        self.size -= session.size
+
+    def _session(self, session_id, domain, create):
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                if not create:
+                    raise UnknownSession(session_id)
+                session = self._sessions[session_id] = _Session(domain)
+            self._sessions.move_to_end(session_id)
+            session.last_used = now
+            return session
+
+    def _resize(self, session_id, session, size):
+        with self._lock:
+            if self._sessions.get(session_id) is session:
+                self.size += size - session.size
+            session.size = size
+            while self._sessions and (len(self._sessions) > self.max_sessions or self.size > self.max_bytes):
+                self._drop(next(iter(self._sessions)))
+                self.evictions += 1
+
+    def close(self, session_id):
+        with self._lock:
+            if session_id in self._sessions:
+                self._drop(session_id)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def edit(self, session_id, content, domain, offset=None, delete=0):
+        """Apply an edit and return the Splice of normalized sentences it changed.
+
+        Without an offset `content` replaces the whole document. Raises UnknownSession for an edit of
+        a session that doesn't exist, and EditError if offset and delete are out of the document's range.
+        """
+        session = self._session(session_id, domain, offset is None)
+        with session.lock:
+            if offset is None:
+                offset, delete = 0, len(session.text)
+            if offset < 0 or delete < 0 or offset + delete > len(session.text):
+                raise EditError('edit of {} characters at {} is outside the document of {} characters'.format(
+                    delete, offset, len(session.text)))
+            # the normalization of another domain can't be reused
+            reusable = domain == session.domain
+            session.domain = domain
+            splice = self._apply(session, offset, delete, content, reusable)
+            size = 2 * len(session.text) + sum(estimate_size(piece.normalized) for piece in session.pieces)
+        self._resize(session_id, session, size)
+        return splice
+
+    def _apply(self, session, offset, delete, content, reusable):
+        old_pieces = session.pieces
+        text = session.text[:offset] + content + session.text[offset + delete:]
+        shift = len(content) - delete
+        edit_end = offset + len(content)
+        # the last boundary before the edit that is still one: the tokens on both sides of it are unchanged, and
+        # so is the sentence after it, which has letters or digits and can't be appended to the one before
+        first = 0
+        while reusable and first < len(old_pieces) and old_pieces[first].end < offset:
+            first += 1
+        first = max(first - 1, 0)
+        while first and not self.splitter.has_words(old_pieces[first].sentence):
+            first -= 1
+        start = old_pieces[first - 1].end if first else 0
+        old_ends = {piece.end + shift: index for index, piece in enumerate(old_pieces[first:], first)
+                    if piece.end >= offset + delete}
+        ends = []
+        last = len(old_pieces)
+        for end in self.splitter.iter_boundaries(text, start):
+            ends.append(end)
+            # from a common boundary after the edit on, the old text is split as before
+            if end >= edit_end and end in old_ends and reusable:
+                last = old_ends[end] + 1
+                break
+        else:
+            ends.append(len(text))
+        pieces = []
+        for end in ends:
+            pieces.append(_Piece(end, text[start:end].strip(), None))
+            start = end
+        self._normalize(session.domain, pieces, old_pieces[first:last] if reusable else [])
+        for piece in old_pieces[last:]:
+            piece.end += shift
+
+        old_sentences = [normalized for piece in old_pieces[first:last] for normalized in piece.normalized]
+        new_sentences = [normalized for piece in pieces for normalized in piece.normalized]
+        before = sum(len(piece.normalized) for piece in old_pieces[:first])
+        # only report sentences that differ, pieces around the edit often normalize as before
+        common_start = 0
+        while common_start < min(len(old_sentences), len(new_sentences)) and \
+                old_sentences[common_start] == new_sentences[common_start]:
+            common_start += 1
+        common_end = 0
+        while common_end < min(len(old_sentences), len(new_sentences)) - common_start and \
+                old_sentences[-1 - common_end] == new_sentences[-1 - common_end]:
+            common_end += 1
+        session.text = text
+        session.pieces = old_pieces[:first] + pieces + old_pieces[last:]
+        count = before + len(new_sentences) + sum(len(piece.normalized) for piece in old_pieces[last:])
+        return Splice(before + common_start, len(old_sentences) - common_start - common_end,
+                      new_sentences[common_start:len(new_sentences) - common_end], count)
+
+    def _normalize(self, domain, pieces, old_pieces):
+        previous = {piece.sentence: piece.normalized for piece in old_pieces}
+        misses = []
+        for piece in pieces:
+            if not piece.sentence:
+                piece.normalized = ()
+            elif piece.sentence in previous:
+                piece.normalized = previous[piece.sentence]
+                self.sentences_reused += 1
+            else:
+                misses.append(piece)
+        if misses:
+            sentences = list(dict.fromkeys(piece.sentence for piece in misses))
+            grouped = normalize_sentences(self.normalizer, 'normalize_tokenwise', self.splitter, sentences, domain)
+            normalized = dict(zip(sentences, grouped))
+            for piece in misses:
+                # a session holds a whole document, as columns it takes a fraction of the memory
+                piece.normalized = TokenColumns.from_tokenwise(normalized[piece.sentence])
+            self.sentences_normalized += len(sentences)
+
+    def stats(self):
+        with self._lock:
+            return {'sessions': len(self._sessions), 'bytes': self.size, 'evictions': self.evictions,
+                    'sentences_normalized': self.sentences_normalized, 'sentences_reused': self.sentences_reused}
@@ -0,0 +1,106 @@
+import re
+import threading
+
+from sentence_memo import normalize_sentences
+
+# lower case words, and capitalized ones: the normalizer spells out words of capitals only, and a capitalized
+# word is unsafe if its lower case form is
+PLAIN_WORD = re.compile('[A-ZÁÉÍÓÚÝÐÞÆÖ]?[a-záéíóúýðþæö]+')
+VOWEL = re.compile('[aáeéiíoóuúyýæö]')
+# punctuation that may end a plain sentence; the normalizer's tokenizer splits it off into a token it leaves as is
+END_PUNCTUATION = frozenset('.?!')
+
+# lower case words without a period that the normalizer may still expand, mostly units and
+# abbreviations that are commonly written without a period, and the names of months and weekdays
+# its rules expand with the period optional
+UNSAFE_WORDS = frozenset([
+    'ath', 'bls', 'ca', 'dags', 'frh', 'gr', 'kap', 'kl', 'klst', 'km', 'kr', 'ma', 'millj', 'mín',
+    'nr', 'nk', 'sek', 'sbr', 'skv', 'st', 'stk', 'þús', 'umf', 'útg',
+    'alþm', 'aths', 'atr', 'etv', 'höf', 'kcal', 'khöfn', 'möo', 'ofl', 'ohf', 'omfl', 'osfr', 'osfrv',
+    'oþh', 'qed', 'ritstj', 'rvík', 'samþ', 'símanr', 'uppl', 'utd', 'ísl', 'þeas', 'þþaa',
+    'jan', 'feb', 'mar', 'apr', 'jún', 'júl', 'ág', 'ágú', 'sep', 'sept', 'okt', 'nóv', 'des',
+    'mán', 'mánud', 'þri', 'þriðjud', 'miðvikud', 'fim', 'fimmtud', 'fös', 'föstud', 'lau', 'laugard',
+    'sun', 'sunnud',
+])
+# 'kl' run into a number word, which the normalizer's rule for times written with words expands
+UNSAFE_WORD = re.compile('kl(núll|eitt|tvö|þrjú|fjögur|fimm|sex|sjö|átta|níu|tíu|ellefu|tólf|þrettán|fjórtán'
+                         '|fimmtán|sextán|sautján|átján|nítján|tuttugu)')
+
+
+class FastPathNormalizer:
+    """Wraps a Normalizer and answers sentences that need no normalization without calling it.
+
+    A sentence consisting only of plain words, lower case or capitalized, and possibly ending with a
+    full stop, question mark or exclamation mark, normalizes to itself, so normalize_tokenwise
+    returns the identity mapping for it and skips the normalizer, and the POS tagger, altogether.
+    The remaining sentences of the text are normalized in a single call. normalize() is passed
+    through: the records it returns per sentence are the normalizer's own.
+    """
+
+    def __init__(self, normalizer, splitter, unsafe_words=UNSAFE_WORDS):
+        self.normalizer = normalizer
+        self.splitter = splitter
+        self.unsafe_words = set(unsafe_words)
+        # abbreviations the tokenizer knows are unsafe even when written without the period
+        for abbreviation in splitter.abbreviations:
+            word = abbreviation.rstrip('.')
+            if PLAIN_WORD.fullmatch(word):
+                self.unsafe_words.add(word)
+        self.fast_sentences = 0
+        self.sentences = 0
+        self._lock = threading.Lock()
+
+    def is_plain_word(self, word):
+        if not PLAIN_WORD.fullmatch(word):
+            return False
+        word = word.lower()
+        return VOWEL.search(word) is not None and word not in self.unsafe_words and not UNSAFE_WORD.fullmatch(word)
+
+    def plain_tokens(self, sentence):
+        """The normalizer's tokens of sentence if it normalizes to itself, otherwise None."""
+        tokens = sentence.split()
+        if tokens and tokens[-1][-1] in END_PUNCTUATION:
+            # split off like the tokenizer does, which keeps the period only on abbreviations, all of them unsafe
+            last = tokens.pop()
+            if len(last) > 1:
+                tokens.append(last[:-1])
+            if not tokens:
+                return None
+            tokens.append(last[-1])
+            words = tokens[:-1]
+        else:
+            words = tokens
+        if not words or not all(self.is_plain_word(word) for word in words):
+            return None
+        return tokens
+
+    def is_plain(self, sentence):
+        return self.plain_tokens(sentence) is not None
+
+    def normalize(self, text, domain):
+        return self.normalizer.normalize(text, domain)
+
+    def normalize_tokenwise(self, text, domain):
+        sentences = self.splitter.split(text)
+        plain = [self.plain_tokens(sentence) for sentence in sentences]
+        fast = sum(tokens is not None for tokens in plain)
+        with self._lock:
+            self.sentences += len(sentences)
+            self.fast_sentences += fast
+        if not fast:
+            return self.normalizer.normalize_tokenwise(text, domain)
+
+        rest = [sentence for sentence, tokens in zip(sentences, plain) if tokens is None]
+        normalized_rest = iter(normalize_sentences(self.normalizer, 'normalize_tokenwise', self.splitter, rest, domain)
+                               if rest else ())
+        normalized = []
+        for tokens in plain:
+            if tokens is not None:
+                normalized.append([(token, token) for token in tokens])
+            else:
+                normalized.extend(next(normalized_rest))
+        return normalized
+
+    def stats(self):
+        with self._lock:
+            return {'sentences': self.sentences, 'fast_sentences': self.fast_sentences}
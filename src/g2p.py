@@ -0,0 +1,163 @@
+"""Grapheme-to-phoneme conversion of normalized words into Icelandic X-SAMPA phones.
+
+Words are looked up in a pronunciation lexicon first. Words not in the lexicon are transcribed by
+the ice-g2p model, and the transcriptions cached; without the model they can't be transcribed and
+raise G2PUnavailable. format_pronunciation() turns the phones into the alphabet and format a
+PhonemeDescription asks for.
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+VOWELS = frozenset([
+    'a', 'ai', 'au', 'E', 'ei', 'i', 'I', 'O', 'Oi', 'ou', 'Y', 'Yi', '9', '9i', 'u',
+])
+
+X_SAMPA_TO_IPA = {
+    'a': 'a', 'ai': 'ai', 'au': 'au', 'E': 'ɛ', 'ei': 'ei', 'i': 'i', 'I': 'ɪ', 'O': 'ɔ', 'Oi': 'ɔi',
+    'ou': 'ou', 'Y': 'ʏ', 'Yi': 'ʏi', '9': 'œ', '9i': 'œy', 'u': 'u',
+    'p': 'p', 'p_h': 'pʰ', 't': 't', 't_h': 'tʰ', 'c': 'c', 'c_h': 'cʰ', 'k': 'k', 'k_h': 'kʰ',
+    'f': 'f', 'v': 'v', 'T': 'θ', 'D': 'ð', 's': 's', 'C': 'ç', 'j': 'j', 'x': 'x', 'G': 'ɣ', 'h': 'h',
+    'm': 'm', 'm_0': 'm̥', 'n': 'n', 'n_0': 'n̥', 'J': 'ɲ', 'J_0': 'ɲ̊', 'N': 'ŋ', 'N_0': 'ŋ̊',
+    'l': 'l', 'l_0': 'l̥', 'r': 'r', 'r_0': 'r̥',
+}
+
+# consonant sequences that can begin an Icelandic syllable, used to split clusters between vowels
+ONSETS = frozenset([
+    ('s', 'p'), ('s', 't'), ('s', 'k'), ('s', 'c'), ('s', 'v'), ('s', 'm'), ('s', 'n'), ('s', 'l'), ('s', 'j'),
+    ('s', 'p', 'r'), ('s', 't', 'r'), ('s', 'k', 'r'), ('s', 'k', 'v'), ('s', 't', 'j'),
+    ('p_h', 'r'), ('t_h', 'r'), ('k_h', 'r'), ('p', 'r'), ('t', 'r'), ('k', 'r'), ('f', 'r'), ('T', 'r'),
+    ('p_h', 'l'), ('k_h', 'l'), ('p', 'l'), ('k', 'l'), ('f', 'l'), ('T', 'j'), ('t_h', 'v'), ('k_h', 'v'),
+    ('t', 'v'), ('k', 'v'), ('T', 'v'), ('p_h', 'j'), ('t_h', 'j'), ('f', 'j'), ('v', 'j'), ('m', 'j'),
+])
+
+STRESS_MARK = {'sampa': '"', 'ipa': 'ˈ'}
+
+
+class G2PUnavailable(Exception):
+    """A word is not in the lexicon and there is no G2P model to transcribe it."""
+
+
+def load_g2p_model():
+    """Return the ice-g2p transcriber, or None if ice-g2p or its models are not installed."""
+    try:
+        from ice_g2p.transcriber import Transcriber
+    except ImportError:
+        logger.error('ice-g2p is not installed, words missing from the lexicon can not be transcribed')
+        return None
+    try:
+        return Transcriber()
+    except Exception:
+        logger.exception('could not load the ice-g2p models, install them with fetch-models')
+        return None
+
+
+def is_vowel(phone):
+    return phone.rstrip(':') in VOWELS
+
+
+def syllabify(phones):
+    """Split phones into syllables, consonants between vowels start the next syllable as far as
+    they form a valid onset."""
+    nuclei = [index for index, phone in enumerate(phones) if is_vowel(phone)]
+    if len(nuclei) < 2:
+        return [list(phones)] if phones else []
+    boundaries = []
+    for previous, following in zip(nuclei, nuclei[1:]):
+        cluster = tuple(phone.rstrip(':') for phone in phones[previous + 1:following])
+        onset = 1 if cluster else 0
+        for length in range(len(cluster), 1, -1):
+            if cluster[-length:] in ONSETS:
+                onset = length
+                break
+        boundaries.append(following - onset)
+    syllables = []
+    start = 0
+    for boundary in boundaries:
+        syllables.append(list(phones[start:boundary]))
+        start = boundary
+    syllables.append(list(phones[start:]))
+    return syllables
+
+
+def _to_ipa(phone):
+    long = phone.endswith(':')
+    ipa = X_SAMPA_TO_IPA.get(phone.rstrip(':'), phone.rstrip(':'))
+    return ipa + 'ː' if long else ipa
+
+
+def format_pronunciation(phones, alphabet='sampa', cmu=False, syllabified=False, stress_labels=False):
+    """Format X-SAMPA phones as space separated `alphabet` ('sampa' or 'ipa') phones.
+
+    Syllables are separated by ' . ' if syllabified. Stress falls on the first syllable: with
+    stress_labels, cmu format marks every vowel with 1 or 0, plain format puts a stress mark in
+    front of the first syllable.
+    """
+    syllables = syllabify(phones) if syllabified or stress_labels else [list(phones)]
+    formatted = []
+    for index, syllable in enumerate(syllables):
+        if alphabet == 'ipa':
+            syllable = [_to_ipa(phone) for phone in syllable]
+        if stress_labels and cmu:
+            stress = '1' if index == 0 else '0'
+            syllable = [phone + stress if is_vowel(original) else phone
+                        for phone, original in zip(syllable, syllables[index])]
+        text = ' '.join(syllable)
+        if stress_labels and not cmu and index == 0 and text:
+            text = STRESS_MARK[alphabet] + text
+        formatted.append(text)
+    return (' . ' if syllabified else ' ').join(part for part in formatted if part)
+
+
+class G2P:
+    """Transcribes words with a lexicon and the ice-g2p model, in that order.
+
+    `lexicon` needs a get(word) method that returns a space separated transcription or None, `cache`
+    is a ResultCache for the transcriptions of words not in the lexicon. The model is only loaded
+    when the first such word comes up, and not at all if `use_model` is false; words not in the
+    lexicon then raise G2PUnavailable.
+    """
+
+    def __init__(self, lexicon=None, cache=None, use_model=True):
+        self.lexicon = lexicon
+        self.cache = cache
+        self.use_model = use_model
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.lexicon_hits = 0
+        self.model_calls = 0
+
+    def _get_model(self):
+        if not self.use_model:
+            return None
+        with self._model_lock:
+            if self._model is None:
+                self._model = load_g2p_model()
+                if self._model is None:
+                    self.use_model = False
+            return self._model
+
+    def transcribe(self, word):
+        """Return the X-SAMPA phones of word as a tuple."""
+        word = word.lower()
+        if self.lexicon is not None:
+            transcription = self.lexicon.get(word)
+            if transcription is not None:
+                self.lexicon_hits += 1
+                return tuple(transcription.split())
+        if self.cache is not None:
+            phones = self.cache.get(word)
+            if phones is not None:
+                return phones
+        model = self._get_model()
+        if model is None:
+            raise G2PUnavailable('{!r} is not in the lexicon and no G2P model is loaded'.format(word))
+        self.model_calls += 1
+        phones = tuple(model.transcribe(word).split())
+        if self.cache is not None:
+            self.cache.put(word, phones)
+        return phones
+
+    def stats(self):
+        return {'lexicon_hits': self.lexicon_hits, 'model_calls': self.model_calls}
@@ -0,0 +1,187 @@
+"""Read-only pronunciation lexicons that are memory-mapped instead of loaded.
+
+All worker processes that open the same lexicon file share one copy of it in the page cache, and
+opening it costs next to nothing regardless of its size, as no per-process table is built. Lookups
+still create a few small objects per call, see BinaryLexicon. Build a binary lexicon from a TSV file with
+
+    python3 src/lexicon.py lexicon.tsv lexicon.bin
+"""
+import argparse
+import mmap
+import struct
+import sys
+
+# binary format: header, an index entry per word sorted by the UTF-8 bytes of the words, then the
+# words and transcriptions back to back. An index entry holds the first 8 bytes of the word as a big
+# endian number, so that most comparisons of a lookup are between ints, and where the word's bytes
+# start together with the lengths of the word and its transcription.
+MAGIC = b'TTSLEX\x00\x01'
+HEADER = struct.Struct('<8sI')
+INDEX_ENTRY = struct.Struct('<QIHH')
+PREFIX_BYTES = 8
+# limits of the index entry fields
+MAX_OFFSET = 0xffffffff
+MAX_LENGTH = 0xffff
+
+
+def _prefix(key):
+    return int.from_bytes(key[:PREFIX_BYTES].ljust(PREFIX_BYTES, b'\x00'), 'big')
+
+
+class TsvLexicon:
+    """A pronunciation lexicon in a text file with one `word<TAB>transcription` line per word.
+
+    The lines must be sorted by the UTF-8 bytes of the words, as `LC_ALL=C sort` does; lookups are a
+    binary search over the mapped file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            # an empty file can't be mapped
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if f.seek(0, 2) else b''
+
+    def get(self, word):
+        """Return the transcription of word, or None if it is not in the lexicon."""
+        key = word.encode('utf-8')
+        data = self._map
+        low, high = 0, len(data)
+        while low < high:
+            middle = (low + high) // 2
+            start = data.rfind(b'\n', 0, middle) + 1
+            end = data.find(b'\n', start)
+            if end < 0:
+                end = len(data)
+            separator = data.find(b'\t', start, end)
+            line_key = data[start:separator if separator >= 0 else end]
+            if line_key == key:
+                return data[separator + 1:end].decode('utf-8').strip() if separator >= 0 else ''
+            if line_key < key:
+                low = end + 1
+            else:
+                high = start
+        return None
+
+    def __contains__(self, word):
+        return self.get(word) is not None
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+
+class BinaryLexicon:
+    """A lexicon in the binary format written by build_lexicon().
+
+    Lookups are a binary search over the mapped index, which only compares ints until the word
+    is found or its prefix is shared with other words. Each lookup still creates small objects:
+    the word's UTF-8 key, the unpacked fields of every index entry it visits, a bytes slice of
+    every word that shares the key's prefix and the transcription it returns.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError('{} is not a binary lexicon'.format(path))
+        self._index_start = HEADER.size
+
+    def get(self, word):
+        """Return the transcription of word, or None if it is not in the lexicon."""
+        key = word.encode('utf-8')
+        prefix = _prefix(key)
+        data = self._map
+        unpack_entry = INDEX_ENTRY.unpack_from
+        index_start = self._index_start
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry_prefix, offset, key_length, value_length = unpack_entry(data, index_start + middle * INDEX_ENTRY.size)
+            if entry_prefix == prefix:
+                # a key of up to 8 bytes is all in its prefix, apart from trailing zero bytes
+                entry_key = data[offset:offset + key_length] if key_length > PREFIX_BYTES or len(key) != key_length \
+                    else key
+                if entry_key == key:
+                    return data[offset + key_length:offset + key_length + value_length].decode('utf-8')
+                if entry_key < key:
+                    low = middle + 1
+                else:
+                    high = middle
+            elif entry_prefix < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def __contains__(self, word):
+        return self.get(word) is not None
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._map.close()
+
+
+def read_tsv(path):
+    """Yield (word, transcription) from the `word<TAB>transcription` lines of a text file."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            word, separator, transcription = line.rstrip('\n').partition('\t')
+            if separator and word:
+                yield word, ' '.join(transcription.split())
+
+
+def build_lexicon(entries, path):
+    """Write (word, transcription) pairs as a binary lexicon, the first transcription of a word wins.
+
+    Raises ValueError, before anything is written, if an entry or the lexicon is too large for the format.
+    """
+    encoded = {}
+    for word, transcription in entries:
+        key = word.encode('utf-8')
+        if key not in encoded:
+            encoded[key] = transcription.encode('utf-8')
+    keys = sorted(encoded)
+    offsets = []
+    offset = HEADER.size + len(keys) * INDEX_ENTRY.size
+    for key in keys:
+        value = encoded[key]
+        if len(key) > MAX_LENGTH or len(value) > MAX_LENGTH:
+            raise ValueError('entry for {!r} is too long'.format(key))
+        offsets.append(offset)
+        offset += len(key) + len(value)
+    if offset > MAX_OFFSET:
+        raise ValueError('lexicon is too large for the binary format')
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(keys)))
+        for key, offset in zip(keys, offsets):
+            f.write(INDEX_ENTRY.pack(_prefix(key), offset, len(key), len(encoded[key])))
+        for key in keys:
+            f.write(key)
+            f.write(encoded[key])
+    return len(keys)
+
+
+def open_lexicon(path):
+    """Open a binary lexicon, or a sorted TSV lexicon if the file is not in the binary format."""
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+    if magic == MAGIC:
+        return BinaryLexicon(path)
+    return TsvLexicon(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build a binary pronunciation lexicon from a TSV file')
+    parser.add_argument('tsv', help='lines of word<TAB>transcription, in any order')
+    parser.add_argument('output', help='binary lexicon to write')
+    args = parser.parse_args(argv)
+    count = build_lexicon(read_tsv(args.tsv), args.output)
+    print('wrote {} entries to {}'.format(count, args.output), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,399 @@
+"""Counters, gauges and histograms exposed in the Prometheus text format.
+
+Metric updates don't take locks: every thread counts into its own shard and the shards are only
+summed up when the metrics are rendered, so instrumentation can stay on in production.
+"""
+import bisect
+import contextlib
+import functools
+import http.server
+import logging
+import sys
+import threading
+import time
+import urllib.parse
+
+import grpc
+
+logger = logging.getLogger(__name__)
+
+# seconds, from well below a cached response to a long document
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# characters of request content
+SIZE_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class _Shards:
+    """Per-thread lists of `size` numbers that are summed up on read."""
+
+    def __init__(self, size):
+        self.size = size
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = [0] * self.size
+            with self._lock:
+                self._shards.append(values)
+            return values
+
+    def total(self):
+        with self._lock:
+            shards = list(self._shards)
+        return [sum(column) for column in zip(*shards)] if shards else [0] * self.size
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} {}'.format(self.name, self.kind)]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _CounterChild:
+
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        self._shards.get()[0] += amount
+
+    def value(self):
+        return self._shards.total()[0]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return ['{}{} {}'.format(self.name, _format_labels(self.labelnames, values), child.value())]
+
+
+class Gauge(Counter):
+    """A value that goes up and down, such as the number of requests in flight."""
+    kind = 'gauge'
+
+    def dec(self, amount=1):
+        self.labels().inc(-amount)
+
+
+class _HistogramChild:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # a count per bucket, one for values above the last bucket and the sum of all values
+        self._shards = _Shards(len(buckets) + 2)
+
+    def observe(self, value):
+        values = self._shards.get()
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        totals = child._shards.total()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), totals[:-1]):
+            cumulative += count
+            lines.append('{}_bucket{} {}'.format(
+                self.name, _format_labels(self.labelnames, values, [('le', bound)]), cumulative))
+        labels = _format_labels(self.labelnames, values)
+        lines.append('{}_sum{} {}'.format(self.name, labels, totals[-1]))
+        lines.append('{}_count{} {}'.format(self.name, labels, cumulative))
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """A counter or gauge read from `function()` when rendered, which returns {label values: value}."""
+
+    def __init__(self, name, documentation, kind, function, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.function = function
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} {}'.format(self.name, self.kind)]
+        try:
+            samples = self.function()
+        except Exception:
+            logger.exception('could not collect %s', self.name)
+            return []
+        for values, value in sorted(samples.items()):
+            lines.append('{}{} {}'.format(self.name, _format_labels(self.labelnames, values), value))
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'tts_frontend_requests_total', 'Finished RPCs by method and status code.', ('method', 'code')))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'tts_frontend_request_seconds', 'RPC latency by method.', ('method',)))
+REQUEST_CHARACTERS = REGISTRY.register(Histogram(
+    'tts_frontend_request_characters', 'Content length of unary requests by method.', ('method',), SIZE_BUCKETS))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    'tts_frontend_in_flight_requests', 'RPCs being handled.'))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'tts_frontend_stage_seconds', 'Time spent per request processing stage.', ('stage',)))
+
+
+_trace = threading.local()
+
+
+@contextlib.contextmanager
+def trace():
+    """Collect the stage times of the enclosed block in this thread, yields a dict {stage: seconds}."""
+    stages = {}
+    previous = getattr(_trace, 'stages', None)
+    _trace.stages = stages
+    try:
+        yield stages
+    finally:
+        _trace.stages = previous
+
+
+def observe_stage(name, seconds):
+    STAGE_SECONDS.labels(name).observe(seconds)
+    stages = getattr(_trace, 'stages', None)
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time the enclosed block as processing stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def observe_rpc(method, seconds, code, content=None):
+    REQUESTS.labels(method, code).inc()
+    REQUEST_SECONDS.labels(method).observe(seconds)
+    if content is not None:
+        REQUEST_CHARACTERS.labels(method).observe(len(content))
+
+
+# (stage, module, attribute) of normalizer internals timed by instrument_normalizer(), the ones
+# the loaded normalizer doesn't have are skipped
+NORMALIZER_STAGES = (
+    ('tokenization', 'regina_normalizer.tokenizer', 'Tokenizer.detect_sentences'),
+    ('tagging', 'pos', 'Tagger.tag_bulk'),
+    ('tagging', 'pos', 'Tagger.tag_sent'),
+    ('rules', 'regina_normalizer.abbr_functions', 'replace_abbreviations'),
+    ('rules', 'regina_normalizer.number_functions', 'handle_sentence'),
+)
+
+_stage_depth = threading.local()
+
+
+def _timed_stage(name, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        # only the outermost call is timed when stage functions call each other
+        depth = getattr(_stage_depth, name, 0)
+        setattr(_stage_depth, name, depth + 1)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            setattr(_stage_depth, name, depth)
+            if not depth:
+                observe_stage(name, time.perf_counter() - start)
+    wrapper.stage = name
+    return wrapper
+
+
+def instrument_normalizer(stages=NORMALIZER_STAGES):
+    """Wrap the normalizer's internal functions in stage timers, returns the stages instrumented.
+
+    Only modules that are already imported are instrumented, so call this once the normalizer is loaded.
+    """
+    instrumented = []
+    for name, module_name, attribute in stages:
+        owner = sys.modules.get(module_name)
+        if owner is None:
+            continue
+        *path, function_name = attribute.split('.')
+        for part in path:
+            owner = getattr(owner, part, None)
+        function = getattr(owner, function_name, None)
+        if function is None or hasattr(function, 'stage'):
+            continue
+        setattr(owner, function_name, _timed_stage(name, function))
+        instrumented.append('{}.{}'.format(module_name, attribute))
+    logger.debug('instrumented normalizer stages: %s', instrumented)
+    return instrumented
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Counts RPCs and observes their latency, status code and request size."""
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return handler
+        method = handler_call_details.method.rsplit('/', 1)[-1]
+        if handler.unary_unary:
+            return handler._replace(unary_unary=self._unary(method, handler.unary_unary))
+        if handler.unary_stream:
+            return handler._replace(unary_stream=self._streaming(method, handler.unary_stream))
+        if handler.stream_unary:
+            return handler._replace(stream_unary=self._unary(method, handler.stream_unary))
+        return handler._replace(stream_stream=self._streaming(method, handler.stream_stream))
+
+    @staticmethod
+    def _code(context, failed):
+        code = context.code() if hasattr(context, 'code') else None
+        if code is None:
+            code = grpc.StatusCode.UNKNOWN if failed else grpc.StatusCode.OK
+        return code.name
+
+    def _unary(self, method, behavior):
+        def observed(request, context):
+            IN_FLIGHT.inc()
+            start = time.perf_counter()
+            failed = True
+            try:
+                response = behavior(request, context)
+                failed = False
+                return response
+            finally:
+                IN_FLIGHT.dec()
+                observe_rpc(method, time.perf_counter() - start, self._code(context, failed),
+                            getattr(request, 'content', None))
+        return observed
+
+    def _streaming(self, method, behavior):
+        def observed(request, context):
+            IN_FLIGHT.inc()
+            start = time.perf_counter()
+            failed = True
+            try:
+                yield from behavior(request, context)
+                failed = False
+            finally:
+                IN_FLIGHT.dec()
+                observe_rpc(method, time.perf_counter() - start, self._code(context, failed),
+                            getattr(request, 'content', None))
+        return observed
+
+
+class _MetricsServer(http.server.ThreadingHTTPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    registry = REGISTRY
+    routes = {}
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == '/metrics':
+            content_type, body = 'text/plain; version=0.0.4; charset=utf-8', self.registry.render()
+        elif url.path in self.routes:
+            query = {name: values[-1] for name, values in urllib.parse.parse_qs(url.query).items()}
+            try:
+                content_type, body = self.routes[url.path](query)
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+        else:
+            self.send_error(404)
+            return
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, registry=REGISTRY, routes=None, host='127.0.0.1'):
+    """Serve registry on http://host:port/metrics from a daemon thread.
+
+    `routes` maps further paths to functions that take the query parameters as a dict and return
+    (content type, body), or raise ValueError for a bad request.
+    """
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry, 'routes': dict(routes or {})})
+    server = _MetricsServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
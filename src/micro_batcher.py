@@ -0,0 +1,204 @@
+import collections
+import logging
+import queue
+import sys
+import threading
+import time
+from concurrent import futures
+
+logger = logging.getLogger(__name__)
+
+# the normalizer modules whose functions decide what the POS tagger is given, see BatchTagger.install
+NUMBER_FUNCTIONS = 'regina_normalizer.number_functions'
+ABBR_FUNCTIONS = 'regina_normalizer.abbr_functions'
+
+
+class BatchTagger:
+    """Stands in for the normalizer's POS tagger and answers tag_sent from tags computed in bulk.
+
+    The normalizer tags every sentence on its own, with tag_sent. prefetch() tags the sentences of
+    several texts in one tag_bulk call instead, and tag_sent returns those tags until forget() is
+    called for them. Sentences that weren't prefetched are tagged by the tagger itself, so the tags
+    are the same either way. `prepare(text, domain)` returns the token tuples the normalizer passes
+    to tag_sent for a text, one per sentence.
+    """
+
+    def __init__(self, tagger, prepare):
+        self.tagger = tagger
+        self.prepare = prepare
+        self.bulk_calls = 0
+        self.bulk_sentences = 0
+        self.hits = 0
+        self.misses = 0
+        # token tuple -> [tags, number of prefetch() calls not yet forgotten]
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def install(cls, splitter):
+        """Put a BatchTagger in place of the loaded normalizer's tagger and return it.
+
+        Returns None if the normalizer, or its tagger, isn't loaded, or it doesn't tag sentences
+        the way prepare() expects.
+        """
+        number_functions = sys.modules.get(NUMBER_FUNCTIONS)
+        abbr_functions = sys.modules.get(ABBR_FUNCTIONS)
+        tagger = getattr(number_functions, 'tagger', None)
+        if (tagger is None or splitter.tokenizer is None or not hasattr(number_functions, 'replace_domain')
+                or not hasattr(abbr_functions, 'replace_abbreviations')):
+            return None
+        if isinstance(tagger, cls):
+            return tagger
+
+        def prepare(text, domain):
+            # as Normalizer.normalize and number_functions.handle_sentence do before tagging
+            return [tuple(number_functions.replace_domain(
+                abbr_functions.replace_abbreviations(sentence, domain).split(), domain))
+                for sentence in splitter.tokenizer.detect_sentences(text)]
+        batch_tagger = number_functions.tagger = cls(tagger, prepare)
+        return batch_tagger
+
+    def __getattr__(self, name):
+        return getattr(self.tagger, name)
+
+    def tag_sent(self, sent):
+        with self._lock:
+            entry = self._tags.get(tuple(sent))
+            if entry is not None:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        return self.tagger.tag_sent(sent)
+
+    def prefetch(self, sentence_lists):
+        """Tag the sentences of every list in one tag_bulk call, keeping the tags until each list is forgotten.
+
+        Only one thread may prefetch at a time.
+        """
+        # sentences to tag -> the number of lists they are in
+        missing = collections.OrderedDict()
+        with self._lock:
+            for sentences in sentence_lists:
+                for sentence in sentences:
+                    if sentence in self._tags:
+                        self._tags[sentence][1] += 1
+                    elif sentence:
+                        missing[sentence] = missing.get(sentence, 0) + 1
+        if not missing:
+            return
+        tags = self.tagger.tag_bulk(list(missing), batch_size=len(missing))
+        with self._lock:
+            self.bulk_calls += 1
+            self.bulk_sentences += len(missing)
+            for (sentence, count), sentence_tags in zip(missing.items(), tags):
+                self._tags[sentence] = [sentence_tags, count]
+
+    def forget(self, sentences):
+        """Drop the tags prefetched for sentences once no other prefetched list still needs them."""
+        with self._lock:
+            for sentence in sentences:
+                entry = self._tags.get(sentence)
+                if entry is not None:
+                    entry[1] -= 1
+                    if entry[1] <= 0:
+                        del self._tags[sentence]
+
+
+class _Job:
+    __slots__ = ('sentences', 'future')
+
+    def __init__(self, sentences):
+        # token tuples the normalizer will tag for the text
+        self.sentences = sentences
+        self.future = futures.Future()
+
+
+class MicroBatchingNormalizer:
+    """Wraps a Normalizer and tags the sentences of concurrent calls in one POS tagger call.
+
+    Calls are queued and collected for up to `window` seconds or until `max_sentences` sentences
+    are waiting. The sentences the normalizer will tag for all of them are then tagged with one
+    Tagger.tag_bulk call, through a BatchTagger in place of the normalizer's tagger, and every text
+    is normalized on its own with its tags ready. Without a tagger to replace, calls go straight to
+    the normalizer. It offers the same normalize/normalize_tokenwise methods as the Normalizer.
+    """
+
+    def __init__(self, normalizer, splitter, window=0.003, max_sentences=64, tagger=None):
+        self.normalizer = normalizer
+        self.splitter = splitter
+        self.window = window
+        self.max_sentences = max_sentences
+        # the BatchTagger, installed on the first call after the normalizer has loaded unless given
+        self.tagger = tagger
+        self.batches = 0
+        self.batched_calls = 0
+        self._install_lock = threading.Lock()
+        self._warned = False
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name='micro-batcher', daemon=True).start()
+
+    def normalize(self, text, domain):
+        return self._submit('normalize', text, domain)
+
+    def normalize_tokenwise(self, text, domain):
+        return self._submit('normalize_tokenwise', text, domain)
+
+    def _batch_tagger(self):
+        if self.tagger is None:
+            with self._install_lock:
+                if self.tagger is None:
+                    self.tagger = BatchTagger.install(self.splitter)
+                if self.tagger is None and not self._warned:
+                    logger.warning('the normalizer has no POS tagger to batch, calls are not micro-batched')
+                    self._warned = True
+        return self.tagger
+
+    def _submit(self, method, text, domain):
+        normalize = getattr(self.normalizer, method)
+        tagger = self._batch_tagger()
+        if tagger is None:
+            return normalize(text, domain)
+        try:
+            sentences = tagger.prepare(text, domain)
+        except Exception:
+            # the normalizer reports its own errors
+            sentences = None
+        if not sentences:
+            return normalize(text, domain)
+        job = _Job(sentences)
+        self._queue.put(job)
+        job.future.result()
+        try:
+            return normalize(text, domain)
+        finally:
+            tagger.forget(sentences)
+
+    def _collect(self):
+        jobs = [self._queue.get()]
+        sentences = len(jobs[0].sentences)
+        deadline = time.monotonic() + self.window
+        while sentences < self.max_sentences:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            jobs.append(job)
+            sentences += len(job.sentences)
+        return jobs
+
+    def _run(self):
+        while True:
+            jobs = self._collect()
+            try:
+                self.tagger.prefetch([job.sentences for job in jobs])
+            except Exception:
+                # the normalizer tags the sentences itself then
+                logger.exception('tagging a batch of %d calls failed', len(jobs))
+            else:
+                self.batches += 1
+                self.batched_calls += len(jobs)
+            for job in jobs:
+                job.future.set_result(None)
@@ -0,0 +1,116 @@
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+
+from persistent_cache import normalizer_version
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+
+def snapshot_header():
+    """Identifies what a snapshot was built from; a snapshot with another header is rebuilt."""
+    return {'format': SNAPSHOT_FORMAT, 'normalizer': normalizer_version(),
+            'python': '{}.{}'.format(*sys.version_info[:2])}
+
+
+def _read_snapshot(path):
+    with open(path, 'rb') as f:
+        header = pickle.load(f)
+        if header != snapshot_header():
+            logger.info('snapshot %s was built for %s, rebuilding it', path, header)
+            return None
+        return pickle.load(f)
+
+
+def write_snapshot(normalizer, path):
+    """Pickle normalizer to path, atomically replacing an existing snapshot.
+
+    The snapshot holds the whole initialized Normalizer, POS tagger included, not only its rule and
+    abbreviation tables: those are module globals of regina_normalizer that are built on import and
+    can't be handed to a Normalizer, and most of the startup time is spent loading the tagger.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.normalizer-snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(snapshot_header(), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(normalizer, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_normalizer(snapshot_path=None, compiled_rules=False):
+    """Create a Normalizer, from the snapshot at snapshot_path if there is a valid one.
+
+    Without a valid snapshot the Normalizer is built from scratch and, if snapshot_path is given,
+    written there for the next start. Snapshots are pickles, only point this to trusted files.
+    With compiled_rules the normalizer's rule passes are replaced by those of rule_engine.
+    """
+    normalizer = _load_normalizer(snapshot_path)
+    if compiled_rules:
+        import rule_engine
+        rule_engine.install()
+    return normalizer
+
+
+def _load_normalizer(snapshot_path):
+    start = time.monotonic()
+    if snapshot_path and os.path.exists(snapshot_path):
+        try:
+            normalizer = _read_snapshot(snapshot_path)
+        except Exception:
+            logger.exception('could not read normalizer snapshot %s, rebuilding it', snapshot_path)
+            normalizer = None
+        if normalizer is not None:
+            logger.info('loaded normalizer snapshot in %.2fs', time.monotonic() - start)
+            return normalizer
+
+    from regina_normalizer.main import Normalizer
+    normalizer = Normalizer()
+    logger.info('initialized normalizer in %.2fs', time.monotonic() - start)
+    if snapshot_path:
+        try:
+            write_snapshot(normalizer, snapshot_path)
+        except Exception:
+            logger.exception('could not write normalizer snapshot %s', snapshot_path)
+    return normalizer
+
+
+class LazyNormalizer:
+    """Stands in for a Normalizer that is loaded in a background thread.
+
+    Calls made before loading has finished block until it has. `ready` is set once the
+    normalizer is usable; if loading fails the process exits, so that it gets restarted.
+    """
+
+    def __init__(self, load):
+        self.ready = threading.Event()
+        self._load = load
+        self._normalizer = None
+
+    def start(self):
+        threading.Thread(target=self._run, name='normalizer-loader', daemon=True).start()
+
+    def _run(self):
+        try:
+            self._normalizer = self._load()
+        except BaseException:
+            logger.exception('loading the normalizer failed')
+            os._exit(1)
+        self.ready.set()
+
+    def normalize(self, text, domain):
+        self.ready.wait()
+        return self._normalizer.normalize(text, domain)
+
+    def normalize_tokenwise(self, text, domain):
+        self.ready.wait()
+        return self._normalizer.normalize_tokenwise(text, domain)
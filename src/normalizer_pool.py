@@ -0,0 +1,85 @@
+import collections
+import logging
+import multiprocessing
+import threading
+from concurrent import futures
+
+from token_columns import TokenColumns
+
+logger = logging.getLogger(__name__)
+
+# normalizer of the current pool process, created by _init_process()
+_normalizer = None
+
+
+def _init_process(snapshot_path, compiled_rules):
+    global _normalizer
+    from normalizer_loader import load_normalizer
+    _normalizer = load_normalizer(snapshot_path, compiled_rules)
+
+
+def _normalize_chunk(method, items):
+    normalize = getattr(_normalizer, method)
+    if method == 'normalize_tokenwise':
+        # columns pickle to about the size of the text, a fraction of the tuples, and encode as they are
+        return [TokenColumns.from_tokenwise(normalize(content, domain)) for content, domain in items]
+    return [normalize(content, domain) for content, domain in items]
+
+
+class NormalizerPool:
+    """A pool of processes, each holding its own Normalizer, for fanning out batches.
+
+    The processes are spawned on first use, so a server that never receives a
+    batch request does not pay for them.
+    """
+
+    def __init__(self, num_processes, chunk_size=16, snapshot_path=None, compiled_rules=False):
+        self.num_processes = num_processes
+        self.chunk_size = chunk_size
+        self.snapshot_path = snapshot_path
+        self.compiled_rules = compiled_rules
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                logger.info('starting normalizer pool with %d processes', self.num_processes)
+                # gRPC does not survive a fork, so pool processes are spawned
+                self._executor = futures.ProcessPoolExecutor(max_workers=self.num_processes,
+                                                             mp_context=multiprocessing.get_context('spawn'),
+                                                             initializer=_init_process,
+                                                             initargs=(self.snapshot_path, self.compiled_rules))
+            return self._executor
+
+    def _chunks(self, items):
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def imap(self, method, items):
+        """Normalize (content, domain) items with `method` of Normalizer, yielding results in input order.
+
+        `items` may be a lazy iterator. At most two chunks per process are in flight, so
+        arbitrarily long batches can be streamed through the pool.
+        """
+        executor = self._get_executor()
+        pending = collections.deque()
+        max_pending = 2 * self.num_processes
+        for chunk in self._chunks(items):
+            pending.append(executor.submit(_normalize_chunk, method, chunk))
+            while len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -0,0 +1,193 @@
+import collections
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# the real total size is recomputed from the database every so many writes
+EVICTION_CHECK_INTERVAL = 100
+# eviction frees space down to this fraction of the budget
+EVICTION_TARGET = 0.9
+# hit counts are written back in batches of this many lookups
+HIT_FLUSH_INTERVAL = 100
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key BLOB PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE INDEX IF NOT EXISTS entries_hits ON entries (hits);
+'''
+
+
+def cache_key(*parts):
+    """Hash the parts of a cache key, e.g. (method, content, domain, version), into a short digest."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.digest()
+
+
+def normalizer_version():
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        return 'unknown'
+    try:
+        return version('regina_normalizer')
+    except PackageNotFoundError:
+        return 'unknown'
+
+
+class PersistentCache:
+    """A cache of serialized responses in an SQLite database in WAL mode.
+
+    The database can be shared by all server processes on a host, or by several hosts on a
+    shared volume, and survives restarts. Keys have to include everything the value depends on,
+    e.g. the normalizer and ABI version, so that servers of different versions can share the
+    database; entries no longer used by any of them are evicted like others. The total size of the
+    entries is kept below `max_bytes` by evicting the least recently used ones. The cache is best
+    effort: a lookup or write that fails because the database is busy counts as a miss or is skipped.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._pending_hits = collections.Counter()
+        self._lookups = 0
+        self._connection()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        try:
+            row = self._connection().execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+        except sqlite3.OperationalError as e:
+            logger.debug('persistent cache lookup failed: %s', e)
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._pending_hits[key] += 1
+            self._lookups += 1
+            if self._lookups < HIT_FLUSH_INTERVAL:
+                return row[0]
+            pending = self._pending_hits
+            self._pending_hits = collections.Counter()
+            self._lookups = 0
+        self._flush_hits(pending)
+        return row[0]
+
+    def _flush_hits(self, pending):
+        now = time.time()
+        try:
+            with self._connection() as connection:
+                connection.execute('BEGIN')
+                connection.executemany('UPDATE entries SET hits = hits + ?, accessed = ? WHERE key = ?',
+                                       [(count, now, key) for key, count in pending.items()])
+        except sqlite3.OperationalError as e:
+            logger.debug('could not record persistent cache hits: %s', e)
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        try:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO entries (key, value, size, hits, accessed) VALUES (?, ?, ?, 0, ?)',
+                (key, value, len(value), time.time()))
+        except sqlite3.OperationalError as e:
+            logger.debug('persistent cache write failed: %s', e)
+            return
+        with self._lock:
+            self._writes += 1
+            check = self._writes % EVICTION_CHECK_INTERVAL == 0
+        if check:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache is below its budget."""
+        try:
+            with self._connection() as connection:
+                connection.execute('BEGIN IMMEDIATE')
+                total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+                if total <= self.max_bytes:
+                    return
+                excess = total - EVICTION_TARGET * self.max_bytes
+                evicted = 0
+                freed = 0
+                for key, size in connection.execute('SELECT key, size FROM entries ORDER BY accessed').fetchall():
+                    if freed >= excess:
+                        break
+                    connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+                    freed += size
+                    evicted += 1
+        except sqlite3.OperationalError as e:
+            logger.debug('persistent cache eviction failed: %s', e)
+            return
+        with self._lock:
+            self.evictions += evicted
+
+    def hottest(self, limit):
+        """Return up to limit (key, value) pairs, most frequently hit first."""
+        return self._connection().execute('SELECT key, value FROM entries ORDER BY hits DESC, accessed DESC LIMIT ?',
+                                          (limit,)).fetchall()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class TieredCache:
+    """An in-memory ResultCache in front of a PersistentCache, with the same get/put interface."""
+
+    def __init__(self, memory, persistent):
+        self.memory = memory
+        self.persistent = persistent
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None:
+            value = self.persistent.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        self.persistent.put(key, value)
+
+    def warm_up(self, limit):
+        """Load the `limit` most frequently used persistent entries into memory."""
+        start = time.monotonic()
+        entries = self.persistent.hottest(limit)
+        # insert the hottest entries last, so they are the last to be evicted
+        for key, value in reversed(entries):
+            self.memory.put(key, value)
+        logger.info('loaded %d cache entries in %.2fs', len(entries), time.monotonic() - start)
+
+    def stats(self):
+        return {'memory': self.memory.stats(), 'persistent': self.persistent.stats()}
@@ -0,0 +1,52 @@
+import re
+
+import metrics
+from g2p import format_pronunciation
+
+# tokens without letters or digits, such as punctuation, are passed through untranscribed
+WORD = re.compile(r'\w')
+
+
+class TTSPreprocessor:
+    """Normalizes text and transcribes the normalized words, for TTSPreprocess.
+
+    The text is split into sentences with a SentenceSplitter. Normalization of each next sentence
+    runs on `executor` while the current one is transcribed, so the two stages overlap. Every word
+    becomes its transcription in curly braces, e.g. `{h a l ou}`, punctuation is kept as it is.
+    """
+
+    def __init__(self, normalizer, splitter, g2p, executor):
+        self.normalizer = normalizer
+        self.splitter = splitter
+        self.g2p = g2p
+        self.executor = executor
+
+    def _normalize(self, sentence):
+        with metrics.stage('normalizer'):
+            return self.normalizer.normalize_tokenwise(sentence, '')
+
+    def _transcribe(self, normalized, options):
+        transcribed = []
+        with metrics.stage('g2p'):
+            for normalizer_sentence in normalized:
+                for _, normalized_token in normalizer_sentence:
+                    for word in normalized_token.split():
+                        if WORD.search(word):
+                            word = '{' + format_pronunciation(self.g2p.transcribe(word), **options) + '}'
+                        transcribed.append(word)
+        return transcribed
+
+    def preprocess(self, content, alphabet='sampa', cmu=False, syllabified=False, stress_labels=False):
+        """Return the transcribed content, see g2p.format_pronunciation for the options."""
+        options = {'alphabet': alphabet, 'cmu': cmu, 'syllabified': syllabified, 'stress_labels': stress_labels}
+        sentences = self.splitter.split(content)
+        if not sentences:
+            return ''
+        transcribed = []
+        pending = self.executor.submit(self._normalize, sentences[0])
+        for index in range(len(sentences)):
+            normalized = pending.result()
+            if index + 1 < len(sentences):
+                pending = self.executor.submit(self._normalize, sentences[index + 1])
+            transcribed.extend(self._transcribe(normalized, options))
+        return ' '.join(transcribed)
@@ -0,0 +1,117 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.connection import wait
+
+logger = logging.getLogger(__name__)
+
+# a worker that dies sooner than this after being started counts as a crash loop
+MIN_WORKER_UPTIME = 5.0
+MAX_RESTART_DELAY = 30.0
+SHUTDOWN_TIMEOUT = 10.0
+
+
+class ProcessSupervisor:
+    """Runs a fixed number of worker processes and restarts the ones that die.
+
+    Every worker runs `target(worker_index, *args)`. Workers are forked, so
+    anything the parent has built before calling `run()` is shared with
+    the workers copy-on-write. The parent itself must not create any gRPC
+    objects before forking. Signals in `forward_signals` that the parent
+    receives are sent on to all workers, which ignore them unless they
+    install handlers of their own.
+    """
+
+    def __init__(self, target, num_workers, args=(), forward_signals=()):
+        if num_workers < 1:
+            raise ValueError('num_workers must be at least 1, got {}'.format(num_workers))
+        self.target = target
+        self.num_workers = num_workers
+        self.args = args
+        self.forward_signals = tuple(forward_signals)
+        self._context = multiprocessing.get_context('fork')
+        self._workers = {}
+        self._restart_delay = {}
+        self._stopping = False
+
+    def _run_worker(self, index):
+        # forked workers inherit the supervisor's handlers
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        for signum in self.forward_signals:
+            signal.signal(signum, signal.SIG_IGN)
+        self.target(index, *self.args)
+
+    def _start_worker(self, index):
+        process = self._context.Process(target=self._run_worker, args=(index,),
+                                        name='tts-frontend-worker-{}'.format(index))
+        process.start()
+        self._workers[index] = (process, time.monotonic())
+        logger.info('started worker %d (pid %d)', index, process.pid)
+
+    def _next_restart_delay(self, index, uptime):
+        if uptime >= MIN_WORKER_UPTIME:
+            self._restart_delay[index] = 0.0
+        else:
+            previous = self._restart_delay.get(index, 0.0)
+            self._restart_delay[index] = min(max(2 * previous, 0.5), MAX_RESTART_DELAY)
+        return self._restart_delay[index]
+
+    def _handle_stop_signal(self, signum, frame):
+        logger.info('received signal %d, stopping workers', signum)
+        self._stopping = True
+
+    def _forward_signal(self, signum, frame):
+        for pid in self.pids():
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def pids(self):
+        return [process.pid for process, _ in self._workers.values()]
+
+    def run(self):
+        """Start all workers and supervise them until SIGTERM/SIGINT."""
+        signal.signal(signal.SIGTERM, self._handle_stop_signal)
+        signal.signal(signal.SIGINT, self._handle_stop_signal)
+        for signum in self.forward_signals:
+            signal.signal(signum, self._forward_signal)
+        for index in range(self.num_workers):
+            self._start_worker(index)
+
+        while not self._stopping:
+            sentinels = {process.sentinel: index for index, (process, _) in self._workers.items()}
+            ready = wait(list(sentinels), timeout=1.0)
+            for sentinel in ready:
+                if self._stopping:
+                    break
+                index = sentinels[sentinel]
+                process, started = self._workers[index]
+                process.join()
+                uptime = time.monotonic() - started
+                delay = self._next_restart_delay(index, uptime)
+                logger.warning('worker %d (pid %d) exited with code %s after %.1fs, restarting in %.1fs',
+                               index, process.pid, process.exitcode, uptime, delay)
+                if delay:
+                    time.sleep(delay)
+                if not self._stopping:
+                    self._start_worker(index)
+
+        self.stop()
+
+    def stop(self):
+        """Ask all workers to terminate and kill the ones that do not."""
+        for process, _ in self._workers.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for process, _ in self._workers.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning('worker pid %d did not stop in time, killing it', process.pid)
+                process.kill()
+                process.join()
+        self._workers.clear()
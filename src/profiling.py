@@ -0,0 +1,149 @@
+"""On-demand sampling profiler and a log of the slowest requests.
+
+SamplingProfiler records the stacks of all threads of a process at a fixed interval and writes them as
+collapsed stacks, one `frame;frame;frame count` line per distinct stack, the input format of
+flamegraph.pl, speedscope and similar tools. SlowRequestLog keeps the K slowest requests with their
+content and stage timings, so pathological texts can be reproduced offline.
+"""
+import collections
+import heapq
+import itertools
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SIGNAL = signal.SIGUSR1
+SLOW_REQUESTS_SIGNAL = signal.SIGUSR2
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('{}:{}'.format(os.path.basename(code.co_filename), code.co_name))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads but its own every `interval` seconds."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def sample(self, seconds):
+        """Sample for `seconds` and return a Counter of collapsed stacks, prefixed with the thread name.
+
+        Only one profile runs at a time, a call made while another is running returns None.
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            own = threading.get_ident()
+            stacks = collections.Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident != own:
+                        stacks['{};{}'.format(names.get(ident, ident), _collapse(frame))] += 1
+                time.sleep(self.interval)
+            return stacks
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def write_collapsed(stacks, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write('{} {}\n'.format(stack, count))
+
+
+class SlowRequestLog:
+    """Keeps the `size` slowest requests. Contents longer than `max_chars` are truncated."""
+
+    def __init__(self, size, max_chars=100000):
+        self.size = size
+        self.max_chars = max_chars
+        self._heap = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def threshold(self):
+        """Requests faster than this are not recorded."""
+        with self._lock:
+            return self._heap[0][0] if len(self._heap) >= self.size else 0.0
+
+    def record(self, seconds, method, domain, content, stages):
+        if seconds < self.threshold():
+            return
+        entry = {
+            'seconds': seconds,
+            'method': method,
+            'domain': domain,
+            'time': time.time(),
+            'stages': stages,
+            'content_chars': len(content),
+            'content': content[:self.max_chars],
+        }
+        with self._lock:
+            item = (seconds, next(self._sequence), entry)
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            elif seconds > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def entries(self):
+        """The recorded requests, slowest first."""
+        with self._lock:
+            return [entry for _, _, entry in sorted(self._heap, reverse=True)]
+
+    def write_jsonl(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for entry in self.entries():
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def _output_path(directory, kind, worker_index, suffix):
+    return os.path.join(directory, '{}-{}-{}-{}.{}'.format(
+        kind, worker_index, os.getpid(), time.strftime('%Y%m%d-%H%M%S'), suffix))
+
+
+def profile_to_file(profiler, seconds, directory, worker_index):
+    """Profile this process for `seconds` and write the collapsed stacks to `directory`."""
+    stacks = profiler.sample(seconds)
+    if stacks is None:
+        logger.warning('worker %d is already being profiled', worker_index)
+        return None
+    path = _output_path(directory, 'profile', worker_index, 'collapsed')
+    profiler.write_collapsed(stacks, path)
+    logger.info('worker %d wrote %d samples to %s', worker_index, sum(stacks.values()), path)
+    return path
+
+
+def signal_handlers(profiler, seconds, directory, worker_index, slow_requests=None):
+    """Handlers for PROFILE_SIGNAL and SLOW_REQUESTS_SIGNAL, as {signal: handler(*args)}.
+
+    The profile signal profiles the process for `seconds` in the background, the other signal writes
+    the slow request log, both to files in `directory`.
+    """
+    def profile(*args):
+        threading.Thread(target=profile_to_file, args=(profiler, seconds, directory, worker_index),
+                         name='profiler', daemon=True).start()
+
+    def dump_slow_requests(*args):
+        if slow_requests is None:
+            logger.warning('worker %d does not record slow requests, see --slow-requests', worker_index)
+            return
+        path = _output_path(directory, 'slow-requests', worker_index, 'jsonl')
+        slow_requests.write_jsonl(path)
+        logger.info('worker %d wrote slow requests to %s', worker_index, path)
+
+    return {PROFILE_SIGNAL: profile, SLOW_REQUESTS_SIGNAL: dump_slow_requests}
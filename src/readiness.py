@@ -0,0 +1,53 @@
+import threading
+
+import grpc
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
+
+from service_extensions import SERVICE_NAME
+
+# methods that are served while the normalizer is still loading
+ALWAYS_SERVED = frozenset([
+    '/grpc.health.v1.Health/Check',
+    '/grpc.health.v1.Health/Watch',
+    '/{}/GetVersion'.format(SERVICE_NAME),
+])
+
+
+def _unavailable(request, context):
+    context.abort(grpc.StatusCode.UNAVAILABLE, 'the normalizer is still loading')
+
+
+class ReadinessInterceptor(grpc.ServerInterceptor):
+    """Rejects RPCs with UNAVAILABLE until `ready` is set, except health checks and GetVersion."""
+
+    def __init__(self, ready):
+        self.ready = ready
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or self.ready.is_set() or handler_call_details.method in ALWAYS_SERVED:
+            return handler
+        if handler.unary_unary:
+            return handler._replace(unary_unary=_unavailable)
+        if handler.unary_stream:
+            return handler._replace(unary_stream=_unavailable)
+        if handler.stream_unary:
+            return handler._replace(stream_unary=_unavailable)
+        return handler._replace(stream_stream=_unavailable)
+
+
+def add_health_to_server(server, ready):
+    """Register the standard gRPC health service, reporting NOT_SERVING until `ready` is set."""
+    health_servicer = health.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+
+    for service in ('', SERVICE_NAME):
+        health_servicer.set(service, health_pb2.HealthCheckResponse.NOT_SERVING)
+
+    def update_status():
+        ready.wait()
+        for service in ('', SERVICE_NAME):
+            health_servicer.set(service, health_pb2.HealthCheckResponse.SERVING)
+
+    threading.Thread(target=update_status, name='health-status', daemon=True).start()
+    return health_servicer
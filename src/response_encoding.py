@@ -0,0 +1,139 @@
+"""Encode normalizer results directly to serialized response messages.
+
+The functions here return the same bytes as building a NormalizeResponse or
+TokenBasedNormalizedResponse and calling SerializeToString(), without creating any protobuf objects.
+"""
+import itertools
+
+from token_columns import TokenColumns
+
+
+def _encode_varint(value):
+    encoded = bytearray()
+    while value > 0x7f:
+        encoded.append((value & 0x7f) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+_VARINTS = [_encode_varint(value) for value in range(1 << 14)]
+
+
+def encode_varint(value):
+    if value < len(_VARINTS):
+        return _VARINTS[value]
+    return _encode_varint(value)
+
+
+def _length_delimited(tag, payload):
+    return tag + encode_varint(len(payload)) + payload
+
+
+# field tags, (field number << 3) | wire type
+_TAG_1_BYTES = b'\x0a'
+_TAG_2_BYTES = b'\x12'
+_TAG_3_VARINT = b'\x18'
+_TAG_4_VARINT = b'\x20'
+_HAS_CHANGED = _TAG_4_VARINT + b'\x01'
+
+
+def encode_normalize_response(normalized_arr):
+    """Serialized NormalizeResponse for the result of Normalizer.normalize."""
+    return b''.join([_length_delimited(_TAG_1_BYTES, sentence[0].encode('utf-8')) for sentence in normalized_arr])
+
+
+def _encode_token_info(index, original, normalized, extra_fields=b''):
+    parts = []
+    if original:
+        parts.append(_length_delimited(_TAG_1_BYTES, original.encode('utf-8')))
+    if normalized:
+        parts.append(_length_delimited(_TAG_2_BYTES, normalized.encode('utf-8')))
+    if index:
+        parts.append(_TAG_3_VARINT + encode_varint(index))
+    if original != normalized:
+        parts.append(_HAS_CHANGED)
+    if extra_fields:
+        parts.append(extra_fields)
+    return _length_delimited(_TAG_2_BYTES, b''.join(parts))
+
+
+# what str.strip() strips from the ends of a string but bytes.strip() doesn't, ASCII information separators
+# and any non-ASCII whitespace
+_STR_ONLY_WHITESPACE = frozenset(range(0x1c, 0x20)) | frozenset(range(0x80, 0x100))
+
+
+def _normalized_sentence(normalized_tokens):
+    # the UTF-8 of ' '.join(normalized_tokens).strip()
+    joined = b' '.join(normalized_tokens)
+    stripped = joined.strip()
+    if stripped and (stripped[0] in _STR_ONLY_WHITESPACE or stripped[-1] in _STR_ONLY_WHITESPACE):
+        return joined.decode('utf-8').strip().encode('utf-8')
+    return stripped
+
+
+def encode_token_columns(columns):
+    """Serialized TokenBasedNormalizedResponse for a TokenColumns, copying the fields from its byte table."""
+    view = memoryview(columns.data)
+    ends = columns.ends
+    encoded = bytearray()
+    field = 0
+    start = 0
+    for sentence_end in columns.sentence_ends:
+        tokens = bytearray()
+        normalized_tokens = []
+        index = 0
+        while field < sentence_end:
+            original_end = ends[field]
+            normalized_end = ends[field + 1]
+            original = view[start:original_end]
+            normalized = view[original_end:normalized_end]
+            normalized_tokens.append(normalized)
+            token = bytearray()
+            if original_end > start:
+                token += _TAG_1_BYTES + encode_varint(original_end - start)
+                token += original
+            if normalized_end > original_end:
+                token += _TAG_2_BYTES + encode_varint(normalized_end - original_end)
+                token += normalized
+            if index:
+                token += _TAG_3_VARINT + encode_varint(index)
+            if original != normalized:
+                token += _HAS_CHANGED
+            tokens += _TAG_2_BYTES + encode_varint(len(token))
+            tokens += token
+            start = normalized_end
+            field += 2
+            index += 1
+        sentence = _normalized_sentence(normalized_tokens)
+        sentence_size = len(tokens)
+        if sentence:
+            sentence_size += 1 + len(encode_varint(len(sentence))) + len(sentence)
+        encoded += _TAG_1_BYTES + encode_varint(sentence_size)
+        if sentence:
+            encoded += _TAG_1_BYTES + encode_varint(len(sentence))
+            encoded += sentence
+        encoded += tokens
+    return bytes(encoded)
+
+
+def encode_tokenbased_response(normalized_arr, extra_fields=None):
+    """Serialized TokenBasedNormalizedResponse for the result of Normalizer.normalize_tokenwise.
+
+    extra_fields, if given, yields the encoded fields to add to the RawNormalizedTokenInfo of each
+    token in turn, such as the offsets of token_offsets.
+    """
+    if extra_fields is None:
+        if isinstance(normalized_arr, TokenColumns):
+            return encode_token_columns(normalized_arr)
+        extra_fields = itertools.repeat(b'')
+    sentences = []
+    for sentence in normalized_arr:
+        parts = []
+        normalized_sentence = ' '.join([pair[1] for pair in sentence]).strip()
+        if normalized_sentence:
+            parts.append(_length_delimited(_TAG_1_BYTES, normalized_sentence.encode('utf-8')))
+        parts.extend([_encode_token_info(index, pair[0], pair[1], fields)
+                      for (index, pair), fields in zip(enumerate(sentence), extra_fields)])
+        sentences.append(_length_delimited(_TAG_1_BYTES, b''.join(parts)))
+    return b''.join(sentences)
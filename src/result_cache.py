@@ -0,0 +1,81 @@
+import collections
+import threading
+import time
+
+# rough per-entry bookkeeping cost of the dict node, key object and timestamps
+ENTRY_OVERHEAD = 200
+
+
+class ResultCache:
+    """A thread-safe LRU cache of serialized responses, bounded by an approximate byte budget.
+
+    Keys are bytes, such as the persistent_cache.cache_key digests of the response cache, strings,
+    or tuples of strings and small values. Values are bytes unless a `sizeof` function estimating
+    the size of other values is given. Entries older than `ttl` seconds are treated
+    as missing; `ttl=None` keeps entries until they are evicted.
+    """
+
+    def __init__(self, max_bytes, ttl=None, sizeof=len):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry_size(self, key, value):
+        if isinstance(key, (str, bytes)):
+            key_size = len(key)
+        else:
+            key_size = sum(len(part) for part in key if isinstance(part, (str, bytes)))
+        return ENTRY_OVERHEAD + self.sizeof(value) + key_size
+
+    def _remove(self, key):
+        value, _, size = self._entries.pop(key)
+        self.size -= size
+        return value
+
+    def get(self, key):
+        """Return the cached value for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored, _ = entry
+            if self.ttl is not None and time.monotonic() - stored > self.ttl:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self._entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic(), size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.size, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
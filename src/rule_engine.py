@@ -0,0 +1,163 @@
+"""Compiled versions of the regina normalizer's abbreviation and number rule passes.
+
+regina applies its rules as `re.sub(pattern, replacement, sentence)` over tables of about 1300
+patterns, more than the `re` module caches, so every rule is compiled again for every sentence, and
+the number expansion searches hundreds of (number, tag) pattern pairs per number. install() replaces
+those functions with ones that compile every table once. Each table, and each chunk of CHUNK_RULES
+rules within it, also gets a gate: one regex that is the alternation of the table's or chunk's
+patterns. If the gate finds nothing in a sentence, none of its rules can change the sentence, so all
+of them are skipped with a single scan. The output is the same as that of the original functions:
+tests/test_rule_engine.py compares both over benchmarks/corpus.txt, and bench_rule_engine.py does so
+for the whole normalizer.
+"""
+import logging
+import re
+import sys
+
+logger = logging.getLogger(__name__)
+
+# rules per gated chunk of a table
+CHUNK_RULES = 16
+# patterns that can't be joined into an alternation: backreferences to numbered or named groups and
+# conditionals, whose group numbers change in the alternation, and flags that would apply to all patterns
+UNGATEABLE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(|\(\?[aiLmsux]+\)')
+
+
+def _gate(patterns):
+    if any(UNGATEABLE.search(pattern) for pattern in patterns):
+        return None
+    try:
+        return re.compile('|'.join('(?:{})'.format(pattern) for pattern in patterns))
+    except (re.error, OverflowError, RecursionError):
+        return None
+
+
+class RuleTable:
+    """The rules of a regina dict of {pattern: replacement}, applied in the dict's order."""
+
+    def __init__(self, rules):
+        self.source = rules
+        patterns = list(rules)
+        self.gate = _gate(patterns)
+        self.chunks = []
+        for start in range(0, len(patterns), CHUNK_RULES):
+            chunk = patterns[start:start + CHUNK_RULES]
+            self.chunks.append((_gate(chunk), [(re.compile(pattern), rules[pattern]) for pattern in chunk]))
+
+    def apply(self, text):
+        if self.gate is not None and not self.gate.search(text):
+            return text
+        for gate, rules in self.chunks:
+            # the chunk's rules can only change the text if one of them matches it as it is now
+            if gate is not None and not gate.search(text):
+                continue
+            for pattern, replacement in rules:
+                text = pattern.sub(replacement, text)
+        return text
+
+
+class NumberTable:
+    """A regina tuple list of (number pattern, tag pattern, column, value), with the patterns compiled."""
+
+    def __init__(self, tuples):
+        self.source = tuples
+        tag_patterns = {}
+        self.rules = []
+        for rule in tuples:
+            # the original skips the assignment of shorter tuples with an IndexError
+            if len(rule) < 4:
+                continue
+            tag_index = tag_patterns.setdefault(rule[1], len(tag_patterns))
+            self.rules.append((re.compile(rule[0]), tag_index, rule[2], rule[3]))
+        # every distinct tag pattern is only searched once per number
+        self.tag_patterns = [re.compile(pattern) for pattern in tag_patterns]
+
+    def fill(self, word, tag, entries):
+        tag_matches = [None] * len(self.tag_patterns)
+        for pattern, tag_index, column, value in self.rules:
+            if not pattern.search(word):
+                continue
+            matched = tag_matches[tag_index]
+            if matched is None:
+                matched = tag_matches[tag_index] = self.tag_patterns[tag_index].search(tag) is not None
+            if matched:
+                entries[column] = value
+
+
+_rule_tables = {}
+_number_tables = {}
+_gates = {}
+
+
+def _table(tables, source, table_class):
+    # regina's tables are module constants, so they are keyed by identity
+    table = tables.get(id(source))
+    if table is None or table.source is not source:
+        table = tables[id(source)] = table_class(source)
+    return table
+
+
+def replace_all(text, dic, ptrn=""):
+    """Replacement of regina_normalizer.abbr_functions.replace_all."""
+    gate = _gates.get(ptrn)
+    if gate is None:
+        gate = _gates[ptrn] = re.compile(ptrn)
+    if gate.search(text):
+        return _table(_rule_tables, dic, RuleTable).apply(text)
+    return text
+
+
+def fill_dict(word, tag, tuples, type_dict, cols):
+    """Replacement of regina_normalizer.number_functions.fill_dict."""
+    entries = type_dict[word]
+    _table(_number_tables, tuples, NumberTable).fill(word, tag, entries)
+    return ''.join([entries[col] for col in cols])
+
+
+def _compile_tables(module):
+    # the module's tables, compiled before the first request needs them; what doesn't compile isn't a table
+    for value in list(vars(module).values()):
+        try:
+            if isinstance(value, dict) and value and all(isinstance(key, str) for key in value):
+                _table(_rule_tables, value, RuleTable)
+            elif isinstance(value, list) and value and all(isinstance(item, tuple) and len(item) >= 4
+                                                           for item in value):
+                _table(_number_tables, value, NumberTable)
+        except (re.error, TypeError):
+            pass
+
+
+# (module, function, replacement) of install()
+REPLACEMENTS = (
+    ('regina_normalizer.abbr_functions', 'replace_all', replace_all),
+    ('regina_normalizer.number_functions', 'fill_dict', fill_dict),
+)
+
+_originals = {}
+
+
+def install(replacements=REPLACEMENTS):
+    """Replace the regina rule functions with the compiled ones, returns the functions replaced.
+
+    Only modules that are already imported are patched, so call this once the normalizer is loaded.
+    """
+    installed = []
+    for module_name, name, replacement in replacements:
+        module = sys.modules.get(module_name)
+        if module is None or not hasattr(module, name):
+            continue
+        original = getattr(module, name)
+        if original is not replacement:
+            _originals[(module_name, name)] = original
+            setattr(module, name, replacement)
+            _compile_tables(module)
+        installed.append('{}.{}'.format(module_name, name))
+    logger.info('compiled rule engine replaces %s', ', '.join(installed) or 'nothing')
+    return installed
+
+
+def uninstall():
+    """Restore the functions install() replaced."""
+    for (module_name, name), original in list(_originals.items()):
+        setattr(sys.modules[module_name], name, original)
+        del _originals[(module_name, name)]
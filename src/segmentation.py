@@ -0,0 +1,129 @@
+import re
+
+TOKEN = re.compile('\\S+')
+
+
+def _load_tokenizer():
+    try:
+        from regina_normalizer import tokenizer
+    except ImportError:
+        return None
+    return tokenizer
+
+
+class SentenceSplitter:
+    """Splits raw text into sentences without normalizing it.
+
+    The sentences are exactly those of the normalizer's own sentence detection,
+    Tokenizer.detect_sentences: it decides on a sentence end between two tokens from those two
+    tokens alone, and appends a last sentence without letters or digits to the sentence before it.
+    The splitter makes the same decisions on the raw text and returns the text of every sentence,
+    so normalizing the sentences one by one gives the same result as normalizing the whole text.
+    Without the normalizer's tokenizer the text is not split at all.
+    """
+
+    def __init__(self, abbreviations=None):
+        # the normalizer's tokenizer, for its sentence detection and abbreviation lists
+        self.tokenizer = None
+        self._alphanumeric = re.compile('[^\\W_]')
+        module = _load_tokenizer()
+        if module is not None:
+            self.tokenizer = module.Tokenizer()
+            self._alphabetic = re.compile(module.ALPHABETIC)
+            self._alphanumeric = re.compile(module.ALPHABETIC + '|\\d')
+        if abbreviations is None:
+            abbreviations = frozenset()
+            if self.tokenizer is not None:
+                abbreviations = frozenset(abbr.lower() for abbr in self.tokenizer.abbreviations
+                                          + self.tokenizer.abbreviations_non_ending)
+        self.abbreviations = abbreviations
+
+    def has_words(self, text):
+        """Whether text has letters or digits; the normalizer never appends such a sentence to the one before."""
+        return self._alphanumeric.search(text) is not None
+
+    def iter_boundaries(self, text, pos=0, final=True):
+        """Yield the end offsets of the sentences in text[pos:], excluding the last one.
+
+        Unless final, text may go on: a token at its very end is not complete yet, and only the
+        ends of sentences that no text that follows can change are yielded.
+        """
+        tokenizer = self.tokenizer
+        if tokenizer is None:
+            return
+        # the end of the last sentence found, not yielded until the sentence after it has letters or digits,
+        # or ends itself; whether that sentence has tokens yet
+        boundary = None
+        after = False
+        # a token ending with a dot, which ends a sentence depending on the token after it
+        last_token = ''
+        last_end = pos
+        for match in TOKEN.finditer(text, pos):
+            if not final and match.end() == len(text):
+                return
+            token = match.group()
+            tokenized = token if self._alphabetic.fullmatch(token) else tokenizer.process_special_characters(token)
+            if last_token and tokenizer.is_full_stop_EOS(tokenized, last_token):
+                if boundary is not None:
+                    yield boundary
+                boundary = last_end
+            after = True
+            if boundary is not None and self._alphanumeric.search(token):
+                yield boundary
+                boundary = None
+            last_end = match.end()
+            last_token = tokenized if tokenizer.ends_with_dot(tokenized) else ''
+            if not last_token and tokenizer.is_EOS(tokenized):
+                if boundary is not None:
+                    yield boundary
+                boundary = last_end
+                after = False
+        # a dangling last_token ends a sentence of its own, other text is appended to the sentence before
+        if final and boundary is not None and after and last_token:
+            yield boundary
+
+    def iter_sentences(self, text):
+        """Lazily yield the sentences of text with surrounding whitespace removed."""
+        start = 0
+        for end in self.iter_boundaries(text):
+            sentence = text[start:end].strip()
+            if sentence:
+                yield sentence
+            start = end
+        sentence = text[start:].strip()
+        if sentence:
+            yield sentence
+
+    def split(self, text):
+        return list(self.iter_sentences(text))
+
+    def normalizer_sentence_count(self, text):
+        """Number of sentences the normalizer will produce for text, or None if that is unknown."""
+        if self.tokenizer is None:
+            return None
+        return len(self.tokenizer.detect_sentences(text))
+
+
+class SentenceBuffer:
+    """Collects text arriving in arbitrary chunks and hands out complete sentences."""
+
+    def __init__(self, splitter):
+        self.splitter = splitter
+        self._buffer = ''
+
+    def feed(self, text):
+        """Add text and yield every sentence that no text still to come can change."""
+        self._buffer += text
+        start = 0
+        for end in self.splitter.iter_boundaries(self._buffer, final=False):
+            sentence = self._buffer[start:end].strip()
+            if sentence:
+                yield sentence
+            start = end
+        self._buffer = self._buffer[start:]
+
+    def flush(self):
+        """Yield the sentences left in the buffer."""
+        sentences = self.splitter.split(self._buffer)
+        self._buffer = ''
+        yield from sentences
@@ -0,0 +1,113 @@
+import logging
+
+from token_columns import TokenColumns
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_size(value):
+    """Rough memory footprint in bytes of nested lists/tuples of strings, or of TokenColumns."""
+    if isinstance(value, TokenColumns):
+        return value.nbytes
+    if isinstance(value, str):
+        return 50 + len(value)
+    if isinstance(value, (list, tuple)):
+        return 56 + 8 * len(value) + sum(estimate_size(item) for item in value)
+    return 32
+
+
+def _group(normalized):
+    # TokenColumns are immutable already
+    return normalized if isinstance(normalized, TokenColumns) else tuple(normalized)
+
+
+def _runs(splitter, sentences):
+    """Split sentences into runs that the splitter splits into the same sentences when joined with spaces.
+
+    Sentences are split where the normalizer's sentence detection decides on a boundary from the two
+    tokens around it, so it is enough to check every two sentences that follow each other.
+    """
+    if len(sentences) < 2 or splitter.split(' '.join(sentences)) == list(sentences):
+        return [list(sentences)]
+    runs = [[sentences[0]]]
+    for sentence in sentences[1:]:
+        previous = runs[-1][-1]
+        if splitter.split(previous + ' ' + sentence) == [previous, sentence]:
+            runs[-1].append(sentence)
+        else:
+            runs.append([sentence])
+    return runs
+
+
+def normalize_sentences(normalizer, method, splitter, sentences, domain):
+    """Normalize sentences from a SentenceSplitter with as few calls of normalizer.method as possible.
+
+    Returns a tuple of normalizer sentences, or a TokenColumns, per input sentence. Sentences are
+    joined into one call unless the normalizer would split the joined text elsewhere, e.g. append a
+    sentence of punctuation to the one before, and the combined result is split up by the number of
+    sentences the normalizer makes of each; if that is unknown or the numbers don't add up, the
+    sentences are normalized one by one instead.
+    """
+    normalize = getattr(normalizer, method)
+    counts = [splitter.normalizer_sentence_count(sentence) for sentence in sentences]
+    if None in counts:
+        return [_group(normalize(sentence, domain)) for sentence in sentences]
+    grouped = []
+    for run in _runs(splitter, sentences):
+        run_counts = counts[len(grouped):len(grouped) + len(run)]
+        normalized = normalize(' '.join(run), domain)
+        if len(normalized) != sum(run_counts):
+            logger.debug('normalizer split %d sentences into %d, normalizing them one by one',
+                         sum(run_counts), len(normalized))
+            grouped.extend(_group(normalize(sentence, domain)) for sentence in run)
+            continue
+        start = 0
+        for count in run_counts:
+            grouped.append(_group(normalized[start:start + count]))
+            start += count
+    return grouped
+
+
+class SentenceMemoNormalizer:
+    """Wraps a Normalizer and memoizes its results per sentence.
+
+    The input is split into sentences with a SentenceSplitter, every sentence is looked up in a
+    ResultCache shared by all requests, and the sentences not found are normalized together in a
+    single call to the wrapped normalizer. As the splitter splits where the normalizer does, and the
+    normalizer normalizes every sentence on its own, the result is the same as normalizing the whole
+    text at once. It offers the same normalize/normalize_tokenwise methods as the Normalizer;
+    normalize_tokenwise results are cached and returned as TokenColumns.
+    """
+
+    def __init__(self, normalizer, splitter, cache):
+        self.normalizer = normalizer
+        self.splitter = splitter
+        self.cache = cache
+
+    def normalize(self, text, domain):
+        return self._normalize('normalize', text, domain)
+
+    def normalize_tokenwise(self, text, domain):
+        return self._normalize('normalize_tokenwise', text, domain)
+
+    def _normalize(self, method, text, domain):
+        sentences = self.splitter.split(text)
+        results = {}
+        misses = []
+        for sentence in sentences:
+            if sentence in results:
+                continue
+            cached = self.cache.get((method, sentence, domain))
+            if cached is None:
+                misses.append(sentence)
+            results[sentence] = cached
+        if misses:
+            grouped = normalize_sentences(self.normalizer, method, self.splitter, misses, domain)
+            for sentence, normalized in zip(misses, grouped):
+                if method == 'normalize_tokenwise':
+                    normalized = TokenColumns.from_tokenwise(normalized)
+                results[sentence] = normalized
+                self.cache.put((method, sentence, domain), normalized)
+        if method == 'normalize_tokenwise':
+            return TokenColumns.concat([results[sentence] for sentence in sentences])
+        return [normalized for sentence in sentences for normalized in results[sentence]]
@@ -0,0 +1,110 @@
+"""RPCs served in addition to the ones generated from the tts-frontend-api protos.
+
+They are registered under the same service name and reuse the existing message
+types, so clients only need the generated message modules and `TTSFrontendExtStub`.
+"""
+import grpc
+
+from generated.messages import tts_frontend_message_pb2
+import token_offsets
+
+SERVICE_NAME = 'com.grammatek.tts_frontend.TTSFrontend'
+
+
+def _method_path(name):
+    return '/{}/{}'.format(SERVICE_NAME, name)
+
+
+class TTSFrontendExtStub(object):
+    """Client stub for the extension RPCs."""
+
+    def __init__(self, channel):
+        self.NormalizeBatch = channel.stream_stream(
+                _method_path('NormalizeBatch'),
+                request_serializer=tts_frontend_message_pb2.NormalizeRequest.SerializeToString,
+                response_deserializer=tts_frontend_message_pb2.NormalizeResponse.FromString,
+                )
+        self.NormalizeTokenwiseBatch = channel.stream_stream(
+                _method_path('NormalizeTokenwiseBatch'),
+                request_serializer=tts_frontend_message_pb2.NormalizeRequest.SerializeToString,
+                response_deserializer=tts_frontend_message_pb2.TokenBasedNormalizedResponse.FromString,
+                )
+        self.NormalizeStream = channel.unary_stream(
+                _method_path('NormalizeStream'),
+                request_serializer=tts_frontend_message_pb2.NormalizeRequest.SerializeToString,
+                response_deserializer=tts_frontend_message_pb2.NormalizeResponse.FromString,
+                )
+        self.NormalizeDocumentStream = channel.stream_stream(
+                _method_path('NormalizeDocumentStream'),
+                request_serializer=tts_frontend_message_pb2.NormalizeRequest.SerializeToString,
+                response_deserializer=tts_frontend_message_pb2.NormalizeResponse.FromString,
+                )
+        # returns (TokenBasedNormalizedResponse, token offsets), see token_offsets
+        self.NormalizeTokenwiseOffsets = channel.unary_unary(
+                _method_path('NormalizeTokenwiseOffsets'),
+                request_serializer=tts_frontend_message_pb2.NormalizeRequest.SerializeToString,
+                response_deserializer=token_offsets.parse_response,
+                )
+        self.NormalizeEdit = channel.unary_unary(
+                _method_path('NormalizeEdit'),
+                request_serializer=tts_frontend_message_pb2.NormalizeRequest.SerializeToString,
+                response_deserializer=tts_frontend_message_pb2.TokenBasedNormalizedResponse.FromString,
+                )
+
+
+def _serialize(message):
+    # responses encoded by response_encoding or served from the result cache are already serialized
+    if isinstance(message, bytes):
+        return message
+    return message.SerializeToString()
+
+
+def add_extensions_to_server(servicer, server):
+    """Register the extension RPCs. Normalize and NormalizeTokenwise are registered again with a
+    serializer that passes pre-serialized responses through, so this has to be called before
+    the generated add_TTSFrontendServicer_to_server(). The batch RPCs, NormalizeTokenwiseOffsets and NormalizeEdit use the same serializer.
+    """
+    rpc_method_handlers = {
+            'Normalize': grpc.unary_unary_rpc_method_handler(
+                    servicer.Normalize,
+                    request_deserializer=tts_frontend_message_pb2.NormalizeRequest.FromString,
+                    response_serializer=_serialize,
+            ),
+            'NormalizeTokenwise': grpc.unary_unary_rpc_method_handler(
+                    servicer.NormalizeTokenwise,
+                    request_deserializer=tts_frontend_message_pb2.NormalizeRequest.FromString,
+                    response_serializer=_serialize,
+            ),
+            'NormalizeBatch': grpc.stream_stream_rpc_method_handler(
+                    servicer.NormalizeBatch,
+                    request_deserializer=tts_frontend_message_pb2.NormalizeRequest.FromString,
+                    response_serializer=_serialize,
+            ),
+            'NormalizeTokenwiseBatch': grpc.stream_stream_rpc_method_handler(
+                    servicer.NormalizeTokenwiseBatch,
+                    request_deserializer=tts_frontend_message_pb2.NormalizeRequest.FromString,
+                    response_serializer=_serialize,
+            ),
+            'NormalizeStream': grpc.unary_stream_rpc_method_handler(
+                    servicer.NormalizeStream,
+                    request_deserializer=tts_frontend_message_pb2.NormalizeRequest.FromString,
+                    response_serializer=tts_frontend_message_pb2.NormalizeResponse.SerializeToString,
+            ),
+            'NormalizeDocumentStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.NormalizeDocumentStream,
+                    request_deserializer=tts_frontend_message_pb2.NormalizeRequest.FromString,
+                    response_serializer=tts_frontend_message_pb2.NormalizeResponse.SerializeToString,
+            ),
+            'NormalizeTokenwiseOffsets': grpc.unary_unary_rpc_method_handler(
+                    servicer.NormalizeTokenwiseOffsets,
+                    request_deserializer=tts_frontend_message_pb2.NormalizeRequest.FromString,
+                    response_serializer=_serialize,
+            ),
+            'NormalizeEdit': grpc.unary_unary_rpc_method_handler(
+                    servicer.NormalizeEdit,
+                    request_deserializer=tts_frontend_message_pb2.NormalizeRequest.FromString,
+                    response_serializer=_serialize,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(SERVICE_NAME, rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
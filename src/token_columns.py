@@ -0,0 +1,125 @@
+"""A compact form of normalize_tokenwise results.
+
+normalize_tokenwise returns a list per sentence of (original, normalized) tuples, three objects and
+two strings per token. TokenColumns keeps the same result as one UTF-8 byte table of every token's
+original and normalized string, with an array of where each of those fields ends and one of where
+each sentence's fields end: a handful of objects however many tokens, and a fraction of the memory.
+It pickles to about the size of the tuples but unpickles without creating an object per token, and
+response_encoding encodes it to a TokenBasedNormalizedResponse straight from the byte table.
+
+A TokenColumns is a read-only sequence of sentences, which are created as lists of tuples when they
+are accessed, so it can stand in for a normalize_tokenwise result.
+"""
+from array import array
+from itertools import accumulate
+
+
+def _offsets(values):
+    try:
+        return array('I', values)
+    except OverflowError:
+        return array('Q', values)
+
+
+class TokenColumns:
+    """A normalize_tokenwise result as columns, see the module documentation."""
+
+    __slots__ = ('data', 'ends', 'sentence_ends')
+
+    def __init__(self, data=b'', ends=(), sentence_ends=()):
+        # data[ends[i - 1]:ends[i]] is field i; the fields of a sentence are the original and normalized string of
+        # each of its tokens, sentence_ends[j] is the number of fields up to and including sentence j
+        self.data = data
+        self.ends = ends if isinstance(ends, array) else _offsets(ends)
+        self.sentence_ends = sentence_ends if isinstance(sentence_ends, array) else _offsets(sentence_ends)
+
+    @classmethod
+    def from_tokenwise(cls, normalized_arr):
+        """Columns of a normalize_tokenwise result, or of any iterable of sentences of (original, normalized)."""
+        if isinstance(normalized_arr, TokenColumns):
+            return normalized_arr
+        fields = []
+        sentence_ends = []
+        for sentence in normalized_arr:
+            for original, normalized in sentence:
+                fields.append(original.encode('utf-8'))
+                fields.append(normalized.encode('utf-8'))
+            sentence_ends.append(len(fields))
+        return cls(b''.join(fields), list(accumulate(map(len, fields))), sentence_ends)
+
+    @classmethod
+    def concat(cls, parts):
+        """The sentences of a sequence of TokenColumns, as one."""
+        parts = [part for part in parts if len(part)]
+        if len(parts) == 1:
+            return parts[0]
+        ends = []
+        sentence_ends = []
+        data_size = 0
+        fields = 0
+        for part in parts:
+            ends.extend([end + data_size for end in part.ends])
+            sentence_ends.extend([end + fields for end in part.sentence_ends])
+            data_size += len(part.data)
+            fields += len(part.ends)
+        return cls(b''.join([part.data for part in parts]), ends, sentence_ends)
+
+    def _field_start(self, field):
+        return self.ends[field - 1] if field else 0
+
+    def field(self, index):
+        """Field index decoded."""
+        return self.data[self._field_start(index):self.ends[index]].decode('utf-8')
+
+    def _sentence(self, index):
+        first = self.sentence_ends[index - 1] if index else 0
+        fields = [self.field(field) for field in range(first, self.sentence_ends[index])]
+        return list(zip(fields[::2], fields[1::2]))
+
+    def __len__(self):
+        return len(self.sentence_ends)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            sentences = range(len(self))[index]
+            if index.step not in (None, 1):
+                return TokenColumns.from_tokenwise([self._sentence(sentence) for sentence in sentences])
+            if not sentences:
+                return TokenColumns()
+            first, stop = sentences[0], sentences[-1] + 1
+            first_field = self.sentence_ends[first - 1] if first else 0
+            last_field = self.sentence_ends[stop - 1]
+            start = self._field_start(first_field)
+            return TokenColumns(self.data[start:self._field_start(last_field)],
+                                [end - start for end in self.ends[first_field:last_field]],
+                                [end - first_field for end in self.sentence_ends[first:stop]])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('sentence index out of range')
+        return self._sentence(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._sentence(index)
+
+    def __eq__(self, other):
+        if isinstance(other, TokenColumns):
+            return self.data == other.data and list(self.ends) == list(other.ends) and \
+                list(self.sentence_ends) == list(other.sentence_ends)
+        return NotImplemented
+
+    def __repr__(self):
+        return 'TokenColumns({!r})'.format(list(self))
+
+    def __getstate__(self):
+        return self.data, self.ends, self.sentence_ends
+
+    def __setstate__(self, state):
+        self.data, self.ends, self.sentence_ends = state
+
+    @property
+    def nbytes(self):
+        """Approximate memory footprint in bytes."""
+        return 200 + len(self.data) + self.ends.itemsize * len(self.ends) + \
+            self.sentence_ends.itemsize * len(self.sentence_ends)
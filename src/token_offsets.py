@@ -0,0 +1,108 @@
+"""Where the tokens of a tokenwise normalization are found in the request content.
+
+The NormalizeTokenwiseOffsets RPC (see service_extensions) returns a TokenBasedNormalizedResponse
+whose RawNormalizedTokenInfo messages have two fields beyond those of the API's message: `start`
+and `end`, the character offsets of the token's original text in the request content. Clients that
+parse the response with the generated message class don't see them; parse_response() returns the
+message together with the (sentence index, start, end) of every token, in response order.
+
+The offsets follow the normalizer's tokenizer: it splits the content's whitespace separated words
+into tokens, and may add tokens of its own, such as a full stop at the end of a sentence. So every
+token of a sentence is either the next text in the content after whitespace, or one that the
+normalizer added, which gets an empty span at the end of the token before it.
+"""
+from generated.messages import tts_frontend_message_pb2
+from response_encoding import encode_tokenbased_response, encode_varint
+
+# RawNormalizedTokenInfo fields of NormalizeTokenwiseOffsets responses, well above the API's own
+START_FIELD = 100
+END_FIELD = 101
+
+_START_TAG = encode_varint(START_FIELD << 3)
+_END_TAG = encode_varint(END_FIELD << 3)
+# the TokenBasedNormalizedResponse fields the offsets are nested in
+_SENTENCE_FIELD = 1
+_TOKEN_INFO_FIELD = 2
+_VARINT = 0
+_LENGTH_DELIMITED = 2
+
+
+def align(content, normalized_arr):
+    """Yield (sentence index, start, end) in content of every original token of a normalize_tokenwise result."""
+    position = 0
+    length = len(content)
+    for sentence_index, sentence in enumerate(normalized_arr):
+        for original, _ in sentence:
+            start = position
+            while start < length and content[start].isspace():
+                start += 1
+            if original and content.startswith(original, start):
+                position = start + len(original)
+                yield sentence_index, start, position
+            else:
+                # added by the normalizer
+                yield sentence_index, position, position
+
+
+def encode_response(content, normalized_arr):
+    """Serialized TokenBasedNormalizedResponse for a normalize_tokenwise result of content, with token offsets."""
+    offsets = (_START_TAG + encode_varint(start) + _END_TAG + encode_varint(end)
+               for _, start, end in align(content, normalized_arr))
+    return encode_tokenbased_response(normalized_arr, offsets)
+
+
+def _varint(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+
+def _fields(data, start=0, end=None):
+    """Yield (field number, wire type, value) of a serialized message, value a varint or a (start, end) slice."""
+    position = start
+    end = len(data) if end is None else end
+    while position < end:
+        tag, position = _varint(data, position)
+        wire_type = tag & 7
+        if wire_type == _VARINT:
+            value, position = _varint(data, position)
+        elif wire_type == _LENGTH_DELIMITED:
+            length, position = _varint(data, position)
+            value = (position, position + length)
+            position += length
+        elif wire_type == 1:
+            value, position = None, position + 8
+        elif wire_type == 5:
+            value, position = None, position + 4
+        else:
+            raise ValueError('unsupported wire type {}'.format(wire_type))
+        yield tag >> 3, wire_type, value
+
+
+def decode_offsets(data):
+    """Return the (sentence index, start, end) of every token of a serialized NormalizeTokenwiseOffsets response."""
+    offsets = []
+    sentence_index = 0
+    for field, wire_type, sentence in _fields(data):
+        if field != _SENTENCE_FIELD or wire_type != _LENGTH_DELIMITED:
+            continue
+        for token_field, token_wire_type, token in _fields(data, *sentence):
+            if token_field != _TOKEN_INFO_FIELD or token_wire_type != _LENGTH_DELIMITED:
+                continue
+            span = {START_FIELD: 0, END_FIELD: 0}
+            for info_field, info_wire_type, value in _fields(data, *token):
+                if info_field in span and info_wire_type == _VARINT:
+                    span[info_field] = value
+            offsets.append((sentence_index, span[START_FIELD], span[END_FIELD]))
+        sentence_index += 1
+    return offsets
+
+
+def parse_response(data):
+    """Return (TokenBasedNormalizedResponse, offsets as by decode_offsets) of a NormalizeTokenwiseOffsets response."""
+    return tts_frontend_message_pb2.TokenBasedNormalizedResponse.FromString(data), decode_offsets(data)
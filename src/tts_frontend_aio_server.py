@@ -0,0 +1,308 @@
+"""TTS frontend server on grpc.aio.
+
+Serves the same TTSFrontendServicer as tts_frontend_server.py, but handles all I/O on an asyncio
+event loop and runs normalization on a bounded thread pool. Requests that find the pool and its
+queue full are rejected with RESOURCE_EXHAUSTED instead of waiting, and requests whose deadline has
+passed by the time a thread picks them up are dropped with DEADLINE_EXCEEDED. The requests of
+client streams are read on the event loop, so a client that is slow to send holds no thread.
+"""
+import asyncio
+import logging
+import signal
+import threading
+import time
+from concurrent import futures
+
+import grpc
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
+
+import metrics
+import tts_frontend_server
+import service_extensions
+from generated.services import tts_frontend_service_pb2_grpc
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+# requests buffered per bidirectional stream before the client is slowed down
+STREAM_BUFFER = 64
+
+
+class _Abort(Exception):
+
+    def __init__(self, code, details):
+        super().__init__(details)
+        self.code = code
+        self.details = details
+
+
+class _OffloadedContext:
+    """The ServicerContext handed to servicer methods running in the thread pool.
+
+    Reads are passed on to the aio context, status and trailing metadata are recorded and
+    applied on the event loop when the method returns.
+    """
+
+    def __init__(self, context):
+        self._context = context
+        self.code = None
+        self.details = None
+        self.trailing_metadata = None
+
+    def invocation_metadata(self):
+        return self._context.invocation_metadata()
+
+    def peer(self):
+        return self._context.peer()
+
+    def time_remaining(self):
+        return self._context.time_remaining()
+
+    def is_active(self):
+        return not self._context.done()
+
+    def set_code(self, code):
+        self.code = code
+
+    def set_details(self, details):
+        self.details = details
+
+    def set_trailing_metadata(self, trailing_metadata):
+        self.trailing_metadata = trailing_metadata
+
+    def abort(self, code, details):
+        raise _Abort(code, details)
+
+
+class AsyncServicerAdapter:
+    """Exposes a TTSFrontendServicer as aio handlers that offload every call to a bounded thread pool."""
+
+    def __init__(self, servicer, threads, max_queue):
+        self.servicer = servicer
+        self.capacity = threads + max_queue
+        self.executor = futures.ThreadPoolExecutor(max_workers=threads, thread_name_prefix='normalizer')
+        self.pending = 0
+
+    def _admit(self, context, name):
+        if name != 'GetVersion' and not self.servicer.ready.is_set():
+            raise _Abort(grpc.StatusCode.UNAVAILABLE, 'the normalizer is still loading')
+        if self.pending >= self.capacity:
+            raise _Abort(grpc.StatusCode.RESOURCE_EXHAUSTED, 'server is busy, {} requests pending'.format(self.pending))
+        remaining = context.time_remaining()
+        return None if remaining is None else time.monotonic() + remaining
+
+    @staticmethod
+    def _call(deadline, function, *args):
+        if deadline is not None and time.monotonic() >= deadline:
+            raise _Abort(grpc.StatusCode.DEADLINE_EXCEEDED, 'deadline passed before the request was processed')
+        return function(*args)
+
+    @staticmethod
+    async def _finish(context, offloaded):
+        if offloaded.trailing_metadata is not None:
+            context.set_trailing_metadata(offloaded.trailing_metadata)
+        if offloaded.code is not None and offloaded.code != grpc.StatusCode.OK:
+            await context.abort(offloaded.code, offloaded.details or '')
+
+    async def _unary(self, name, request, context):
+        offloaded = _OffloadedContext(context)
+        metrics.IN_FLIGHT.inc()
+        start = time.perf_counter()
+        code = grpc.StatusCode.UNKNOWN
+        try:
+            deadline = self._admit(context, name)
+            response = await self._offload(deadline, getattr(self.servicer, name), request, offloaded)
+            code = offloaded.code or grpc.StatusCode.OK
+        except _Abort as e:
+            code = e.code
+            await context.abort(e.code, e.details)
+        finally:
+            metrics.IN_FLIGHT.dec()
+            metrics.observe_rpc(name, time.perf_counter() - start, code.name, getattr(request, 'content', None))
+        await self._finish(context, offloaded)
+        return response
+
+    async def _offload(self, deadline, function, *args):
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self._call, deadline, function,
+                                                                    *args)
+        finally:
+            self.pending -= 1
+
+    async def _responses(self, deadline, function, *args):
+        """Yield the responses of a servicer method that returns an iterator, each computed in the thread pool."""
+        responses = await self._offload(deadline, function, *args)
+        while True:
+            response = await self._offload(None, next, responses, _END)
+            if response is _END:
+                return
+            yield response
+
+    @staticmethod
+    async def _feed(request_iterator, requests):
+        try:
+            async for request in request_iterator:
+                await requests.put(request)
+        except Exception as e:
+            await requests.put(e)
+        else:
+            await requests.put(_END)
+
+    @staticmethod
+    async def _chunks(requests):
+        """Yield lists of the requests that have arrived, waiting for the next one on the event loop."""
+        while True:
+            chunk = [await requests.get()]
+            while chunk[-1] is not _END and not requests.empty():
+                chunk.append(requests.get_nowait())
+            if isinstance(chunk[-1], Exception):
+                raise chunk[-1]
+            if chunk[-1] is _END:
+                if len(chunk) > 1:
+                    yield chunk[:-1]
+                return
+            yield chunk
+
+    def _chunk_handlers(self, name, context):
+        """Functions that return the responses to a chunk of the requests of a stream, and to its end."""
+        if name == 'NormalizeDocumentStream':
+            stream = tts_frontend_server.DocumentStream(self.servicer, context)
+            return stream.feed, stream.finish
+        method = getattr(self.servicer, name)
+        return (lambda requests: method(iter(requests), context)), (lambda: iter(()))
+
+    async def _chunked_responses(self, name, deadline, request_iterator, context):
+        """Yield the responses to a bidirectional stream.
+
+        Requests are read on the event loop, and the ones that have arrived are handed to the thread
+        pool together, so that no pool thread waits for a client to send more.
+        """
+        feed, finish = self._chunk_handlers(name, context)
+        requests = asyncio.Queue(maxsize=STREAM_BUFFER)
+        feeder = asyncio.ensure_future(self._feed(request_iterator, requests))
+        try:
+            async for chunk in self._chunks(requests):
+                async for response in self._responses(deadline, feed, chunk):
+                    yield response
+            async for response in self._responses(deadline, finish):
+                yield response
+        finally:
+            feeder.cancel()
+
+    async def _streaming(self, name, request, context, request_iterator=None):
+        offloaded = _OffloadedContext(context)
+        metrics.IN_FLIGHT.inc()
+        start = time.perf_counter()
+        code = grpc.StatusCode.UNKNOWN
+        try:
+            deadline = self._admit(context, name)
+            if request_iterator is None:
+                responses = self._responses(deadline, getattr(self.servicer, name), request, offloaded)
+            else:
+                responses = self._chunked_responses(name, deadline, request_iterator, offloaded)
+            async for response in responses:
+                yield response
+            code = offloaded.code or grpc.StatusCode.OK
+        except _Abort as e:
+            code = e.code
+            await context.abort(e.code, e.details)
+        finally:
+            metrics.IN_FLIGHT.dec()
+            metrics.observe_rpc(name, time.perf_counter() - start, code.name, getattr(request, 'content', None))
+        await self._finish(context, offloaded)
+
+    async def Normalize(self, request, context):
+        return await self._unary('Normalize', request, context)
+
+    async def NormalizeTokenwise(self, request, context):
+        return await self._unary('NormalizeTokenwise', request, context)
+
+    async def NormalizeTokenwiseOffsets(self, request, context):
+        return await self._unary('NormalizeTokenwiseOffsets', request, context)
+
+    async def NormalizeEdit(self, request, context):
+        return await self._unary('NormalizeEdit', request, context)
+
+    async def TTSPreprocess(self, request, context):
+        return await self._unary('TTSPreprocess', request, context)
+
+    async def GetDefaultPhonemeDescription(self, request, context):
+        return await self._unary('GetDefaultPhonemeDescription', request, context)
+
+    async def GetVersion(self, request, context):
+        return await self._unary('GetVersion', request, context)
+
+    async def NormalizeStream(self, request, context):
+        async for response in self._streaming('NormalizeStream', request, context):
+            yield response
+
+    async def NormalizeBatch(self, request_iterator, context):
+        async for response in self._streaming('NormalizeBatch', None, context, request_iterator):
+            yield response
+
+    async def NormalizeTokenwiseBatch(self, request_iterator, context):
+        async for response in self._streaming('NormalizeTokenwiseBatch', None, context, request_iterator):
+            yield response
+
+    async def NormalizeDocumentStream(self, request_iterator, context):
+        async for response in self._streaming('NormalizeDocumentStream', None, context, request_iterator):
+            yield response
+
+
+async def _report_health(health_servicer, ready):
+    for service in ('', service_extensions.SERVICE_NAME):
+        await health_servicer.set(service, health_pb2.HealthCheckResponse.NOT_SERVING)
+    await asyncio.get_running_loop().run_in_executor(None, ready.wait)
+    for service in ('', service_extensions.SERVICE_NAME):
+        await health_servicer.set(service, health_pb2.HealthCheckResponse.SERVING)
+
+
+async def _serve(worker_index, options, normalizer):
+    servicer = tts_frontend_server.create_servicer(options, normalizer)
+    adapter = AsyncServicerAdapter(servicer, options.threads, options.max_queue)
+    server_options = [('grpc.so_reuseport', 1)] if options.workers > 1 else []
+    server = grpc.aio.server(options=server_options)
+    health_servicer = health.aio.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    # registered first, so its handlers take precedence over the generated ones
+    service_extensions.add_extensions_to_server(adapter, server)
+    tts_frontend_service_pb2_grpc.add_TTSFrontendServicer_to_server(adapter, server)
+    server.add_insecure_port('[::]:{}'.format(options.port))
+    profiling_handlers = tts_frontend_server.start_metrics(worker_index, options, servicer)
+    await server.start()
+    logger.info('worker %d serving on port %d (asyncio)', worker_index, options.port)
+    health_task = asyncio.ensure_future(_report_health(health_servicer, servicer.ready))
+
+    loop = asyncio.get_running_loop()
+    stopping = threading.Event()
+
+    def stop():
+        if not stopping.is_set():
+            stopping.set()
+            asyncio.ensure_future(server.stop(options.grace))
+    loop.add_signal_handler(signal.SIGTERM, stop)
+    for signum, handler in profiling_handlers.items():
+        loop.add_signal_handler(signum, handler)
+    await server.wait_for_termination()
+    health_task.cancel()
+    adapter.executor.shutdown()
+    servicer.batch_pool.shutdown()
+
+
+def run_aio_server(worker_index, options, normalizer=None):
+    """Run one asyncio server process until it is terminated."""
+    asyncio.run(_serve(worker_index, options, normalizer))
+
+
+def parse_args(argv=None):
+    parser = tts_frontend_server.build_arg_parser('TTS frontend gRPC server on asyncio')
+    parser.add_argument('--max-queue', type=int, default=100,
+                        help='requests per process that may wait for a free --threads thread, '
+                             'more are rejected with RESOURCE_EXHAUSTED')
+    return tts_frontend_server.parse_args(argv, parser)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    tts_frontend_server.serve(parse_args(), run=run_aio_server)
@@ -0,0 +1,385 @@
+"""Normalize a corpus tokenwise offline, without a server.
+
+    python3 src/tts_frontend_bulk.py INPUT OUTPUT [--format jsonl] [--processes 4] [--compiled-rules]
+
+INPUT has a document per line, as plain text or as JSON objects with the text in --text-field and
+optionally a `domain` ('' or 'sport') and an `id`. OUTPUT gets a JSON object per input line, in input
+order: `line`, the `id` if there was one, and `sentences`, the normalize_tokenwise result as lists of
+[original, normalized] token pairs. '-' reads stdin or writes stdout.
+
+With --shard-bytes, INPUT is memory-mapped and split into shards at line breaks, or at sentence
+boundaries within over-long lines of text, which are normalized on --processes processes into files
+in the directory OUTPUT, see corpus_shards. The records of a shard have the `offset` of their text in
+INPUT instead of the `line`.
+
+Documents are read and written in batches, so memory stays bounded however large the corpus. The
+sentences of a batch are sorted out first: sentences of plain words need no normalizer
+(see fast_path), and sentences seen before are taken from a cache. The rest are normalized in one
+normalizer call per --batch-sentences on --processes normalizer processes. Documents are split into
+the normalizer's own sentences (see segmentation), so the output is that of normalizing every
+document on its own.
+"""
+import sys
+from os.path import dirname
+sys.path.append(dirname(__file__)+'/generated/')
+
+import argparse
+import collections
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent import futures
+
+import corpus_shards
+from fast_path import FastPathNormalizer
+from normalizer_loader import load_normalizer
+from result_cache import ResultCache
+from segmentation import SentenceSplitter
+from sentence_memo import estimate_size, normalize_sentences
+
+logger = logging.getLogger(__name__)
+
+# normalizer and splitter of the current process, created by _init_process()
+_normalizer = None
+_splitter = None
+
+
+def _init_process(snapshot_path, compiled_rules):
+    global _normalizer, _splitter
+    _normalizer = load_normalizer(snapshot_path, compiled_rules)
+    _splitter = SentenceSplitter()
+
+
+def _normalize_sentences(sentences, domain):
+    return normalize_sentences(_normalizer, 'normalize_tokenwise', _splitter, sentences, domain)
+
+
+class InputError(Exception):
+    """A line of the input that is not UTF-8 or, with --format jsonl, not a JSON object with string text and domain."""
+
+
+def parse_record(key, line, input_format='text', text_field='text'):
+    """Return (key, id or None, text, domain) for a UTF-8 encoded line of the input, None for a blank JSONL line."""
+    line = line.decode('utf-8').rstrip('\r\n')
+    if input_format == 'text':
+        return key, None, line, ''
+    if not line.strip():
+        return None
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError('expected a JSON object, got {}'.format(type(record).__name__))
+    text, domain = record.get(text_field) or '', record.get('domain') or ''
+    for field, value in ((text_field, text), ('domain', domain)):
+        if not isinstance(value, str):
+            raise ValueError('expected a string in {!r}, got {}'.format(field, type(value).__name__))
+    return key, record.get('id'), text, domain
+
+
+def read_records(lines, input_format='text', text_field='text', path='-', position='line'):
+    """Yield (key, id or None, text, domain) for the (key, line) pairs of the input, see parse_record.
+
+    Raises InputError with path and the `position` and key of the line, e.g. its line number, if a
+    line can't be parsed.
+    """
+    for key, line in lines:
+        try:
+            record = parse_record(key, line, input_format, text_field)
+        except ValueError as e:
+            # UnicodeDecodeError and JSONDecodeError included
+            raise InputError('{}: {} {}: {}'.format(path, position, key, e)) from e
+        if record is not None:
+            yield record
+
+
+class BulkNormalizer:
+    """Normalizes batches of records tokenwise, see the module documentation.
+
+    With `processes` > 1 the normalizer runs in a pool of spawned processes, otherwise in this one.
+    """
+
+    def __init__(self, processes=1, batch_sentences=256, cache_bytes=256 * 1024 * 1024, snapshot_path=None,
+                 compiled_rules=False):
+        self.splitter = SentenceSplitter()
+        self.batch_sentences = batch_sentences
+        self.processes = processes
+        self.executor = None
+        if processes > 1:
+            self.executor = futures.ProcessPoolExecutor(max_workers=processes,
+                                                        mp_context=multiprocessing.get_context('spawn'),
+                                                        initializer=_init_process,
+                                                        initargs=(snapshot_path, compiled_rules))
+        else:
+            _init_process(snapshot_path, compiled_rules)
+        # only used to tell plain sentences apart
+        self.fast_path = FastPathNormalizer(None, self.splitter)
+        self.cache = ResultCache(cache_bytes, sizeof=estimate_size) if cache_bytes > 0 else None
+        self.counts = collections.Counter()
+
+    def _submit(self, sentences, domain):
+        if self.executor is None:
+            future = futures.Future()
+            future.set_result(_normalize_sentences(sentences, domain))
+            return future
+        return self.executor.submit(_normalize_sentences, sentences, domain)
+
+    def submit(self, records):
+        """Start normalizing a batch of records, returns a function that waits for and returns the results."""
+        results = {}
+        pending = collections.defaultdict(dict)
+        split_records = []
+        for record in records:
+            _, _, text, domain = record
+            sentences = self.splitter.split(text)
+            split_records.append((record, sentences))
+            for sentence in sentences:
+                self.counts['sentences'] += 1
+                key = (sentence, domain)
+                if key in results or sentence in pending[domain]:
+                    self.counts['repeated'] += 1
+                    continue
+                plain = self.fast_path.plain_tokens(sentence)
+                if plain is not None:
+                    results[key] = ([(token, token) for token in plain],)
+                    self.counts['plain'] += 1
+                else:
+                    cached = self.cache.get(key) if self.cache is not None else None
+                    if cached is not None:
+                        results[key] = cached
+                        self.counts['cached'] += 1
+                    else:
+                        pending[domain][sentence] = None
+        jobs = []
+        for domain, sentences in pending.items():
+            sentences = list(sentences)
+            self.counts['normalized'] += len(sentences)
+            for start in range(0, len(sentences), self.batch_sentences):
+                chunk = sentences[start:start + self.batch_sentences]
+                jobs.append((domain, chunk, self._submit(chunk, domain)))
+
+        def wait():
+            for domain, chunk, future in jobs:
+                for sentence, normalized in zip(chunk, future.result()):
+                    results[(sentence, domain)] = normalized
+                    if self.cache is not None:
+                        self.cache.put((sentence, domain), normalized)
+            return [(record, [normalized for sentence in sentences for normalized in results[(sentence, record[3])]])
+                    for record, sentences in split_records]
+        return wait
+
+    def normalize(self, records, batch_records=1000):
+        """Yield (record, normalize_tokenwise result) for an iterable of records, in order.
+
+        Up to two batches per process are in flight at a time.
+        """
+        in_flight = collections.deque()
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == batch_records:
+                in_flight.append(self.submit(batch))
+                batch = []
+                while len(in_flight) > max(1, 2 * self.processes):
+                    yield from in_flight.popleft()()
+        if batch:
+            in_flight.append(self.submit(batch))
+        while in_flight:
+            yield from in_flight.popleft()()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def write_result(output, record, normalized, key='line'):
+    number, record_id, _, _ = record
+    document = {key: number}
+    if record_id is not None:
+        document['id'] = record_id
+    document['sentences'] = [[list(pair) for pair in sentence] for sentence in normalized]
+    output.write(json.dumps(document, ensure_ascii=False) + '\n')
+
+
+# BulkNormalizer of a shard process, created by _init_shard_process()
+_bulk = None
+
+
+def _init_shard_process(batch_sentences, cache_bytes, snapshot_path, compiled_rules):
+    global _bulk
+    _bulk = BulkNormalizer(1, batch_sentences, cache_bytes, snapshot_path, compiled_rules)
+
+
+def _max_rss_kb():
+    # the peak RSS of this process; unlike ru_maxrss, VmHWM doesn't start from the parent's on spawn
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _normalize_shard(input_path, shard, output_path, input_format, text_field, batch_records):
+    """Normalize a shard of the corpus into output_path, returns the shard's statistics for the manifest."""
+    start = time.monotonic()
+    sentences = _bulk.counts['sentences']
+    data = corpus_shards.open_corpus(input_path)
+    records = read_records(corpus_shards.iter_lines(data, shard['start'], shard['end']), input_format, text_field,
+                           input_path, 'byte offset')
+    documents = 0
+    tmp_path = output_path + '.partial'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as output:
+            for record, normalized in _bulk.normalize(records, batch_records):
+                write_result(output, record, normalized, key='offset')
+                documents += 1
+    finally:
+        data.close()
+    os.replace(tmp_path, output_path)
+    return {'documents': documents, 'sentences': _bulk.counts['sentences'] - sentences,
+            'seconds': round(time.monotonic() - start, 3), 'max_rss_kb': _max_rss_kb()}
+
+
+def sharded_job(input_path, shard_bytes, input_format='text', text_field='text'):
+    """Describe the job of normalizing input_path into shards, for its manifest."""
+    stat = os.stat(input_path)
+    return {'input': os.path.abspath(input_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'format': input_format, 'text_field': text_field, 'shard_bytes': shard_bytes}
+
+
+def load_manifest(directory, job):
+    """The manifest of job in directory, or None if there is none; raises ValueError if it is another job's."""
+    manifest = corpus_shards.Manifest.load(directory)
+    if manifest is not None and manifest.job != job:
+        raise ValueError('{} has the manifest of another job, use another directory or remove it'.format(directory))
+    return manifest
+
+
+def normalize_sharded(input_path, directory, shard_bytes, processes=1, input_format='text', text_field='text',
+                      batch_sentences=256, batch_records=1000, cache_bytes=256 * 1024 * 1024, snapshot_path=None,
+                      compiled_rules=False):
+    """Normalize a corpus file into shards in directory, see the README; returns the manifest.
+
+    Shards that a previous run of the same job finished are not normalized again. Raises ValueError
+    if directory has the manifest of another job, and InputError for a line of the input that can't
+    be parsed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    job = sharded_job(input_path, shard_bytes, input_format, text_field)
+    manifest = load_manifest(directory, job)
+    if manifest is None:
+        data = corpus_shards.open_corpus(input_path)
+        ranges = []
+        if data is not None:
+            # JSONL records can only be split between lines
+            ranges = corpus_shards.shard_ranges(data, shard_bytes,
+                                                SentenceSplitter() if input_format == 'text' else None)
+            data.close()
+        manifest = corpus_shards.Manifest.create(directory, job, ranges)
+    pending = manifest.pending()
+    logger.info('%d of %d shards to normalize', len(pending), len(manifest.shards))
+    if not pending:
+        return manifest
+
+    initargs = (batch_sentences, cache_bytes, snapshot_path, compiled_rules)
+    if processes <= 1:
+        _init_shard_process(*initargs)
+        for shard in pending:
+            _shard_done(manifest, shard['index'], _normalize_shard(input_path, shard, manifest.output_path(shard),
+                                                                   input_format, text_field, batch_records))
+        return manifest
+    executor = futures.ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=_init_shard_process, initargs=initargs)
+    with executor:
+        jobs = {executor.submit(_normalize_shard, input_path, shard, manifest.output_path(shard), input_format,
+                                text_field, batch_records): shard['index'] for shard in pending}
+        try:
+            for future in futures.as_completed(jobs):
+                _shard_done(manifest, jobs[future], future.result())
+        except BaseException:
+            # only the shards already running are waited for
+            for future in jobs:
+                future.cancel()
+            raise
+    return manifest
+
+
+def _shard_done(manifest, index, stats):
+    # saved right away, so that a run that fails or is killed later resumes after this shard
+    manifest.mark_done(index, **stats)
+    logger.info('shard %d done: %s', index, stats)
+
+
+def _open(path, mode):
+    encoding = None if 'b' in mode else 'utf-8'
+    if path == '-':
+        return open((sys.stdin if 'r' in mode else sys.stdout).fileno(), mode, encoding=encoding, closefd=False)
+    return open(path, mode, encoding=encoding)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help="plain text or JSONL file, '-' for stdin")
+    parser.add_argument('output', help="JSONL file to write, '-' for stdout, or with --shard-bytes a directory")
+    parser.add_argument('--format', choices=('text', 'jsonl'), default='text', help='input format')
+    parser.add_argument('--text-field', default='text', help='field of JSONL records that holds the text')
+    parser.add_argument('--processes', type=int, default=1, help='normalizer processes')
+    parser.add_argument('--batch-sentences', type=int, default=256,
+                        help='sentences normalized in one normalizer call')
+    parser.add_argument('--batch-records', type=int, default=1000, help='input lines read per batch')
+    parser.add_argument('--cache-bytes', type=int, default=256 * 1024 * 1024,
+                        help='byte budget of the cache of normalized sentences, 0 disables it')
+    parser.add_argument('--compiled-rules', action='store_true', help='use the compiled rule engine, see rule_engine')
+    parser.add_argument('--normalizer-snapshot', metavar='PATH', default=None,
+                        help='pickled normalizer to start from, see tts_frontend_server.py')
+    parser.add_argument('--shard-bytes', type=int, default=None,
+                        help='split INPUT into shards of about this many bytes, normalized into the directory '
+                             'OUTPUT with a manifest that lets an interrupted job resume')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.shard_bytes is not None:
+            _main_sharded(parser, args)
+        else:
+            _main_stream(args)
+    except InputError as e:
+        parser.exit(1, '{}: error: {}\n'.format(parser.prog, e))
+
+
+def _main_sharded(parser, args):
+    if args.input == '-' or args.output == '-':
+        parser.error('--shard-bytes needs an input file and an output directory')
+    try:
+        load_manifest(args.output, sharded_job(args.input, args.shard_bytes, args.format, args.text_field))
+    except ValueError as e:
+        parser.error(str(e))
+    normalize_sharded(args.input, args.output, args.shard_bytes, args.processes, args.format, args.text_field,
+                      args.batch_sentences, args.batch_records, args.cache_bytes, args.normalizer_snapshot,
+                      args.compiled_rules)
+
+
+def _main_stream(args):
+    bulk = BulkNormalizer(args.processes, args.batch_sentences, args.cache_bytes, args.normalizer_snapshot,
+                          args.compiled_rules)
+    start = time.monotonic()
+    lines = 0
+    try:
+        with _open(args.input, 'rb') as source, _open(args.output, 'w') as output:
+            records = read_records(enumerate(source, 1), args.format, args.text_field, args.input)
+            for record, normalized in bulk.normalize(records, args.batch_records):
+                write_result(output, record, normalized)
+                lines += 1
+    finally:
+        bulk.shutdown()
+    seconds = time.monotonic() - start
+    logger.info('normalized %d lines, %d sentences in %.1fs (%.0f sentences/s): %s', lines,
+                bulk.counts['sentences'], seconds, bulk.counts['sentences'] / seconds if seconds else 0.0,
+                dict(bulk.counts))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
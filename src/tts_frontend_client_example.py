@@ -8,6 +8,7 @@ import grpc
 from google.protobuf import empty_pb2
 from generated.services import tts_frontend_service_pb2_grpc
 from generated.messages import tts_frontend_message_pb2 as msg_pb2
+from service_extensions import TTSFrontendExtStub
 
 
 def get_version(stub):
@@ -24,6 +25,49 @@ def get_tokenwise_normalized_text(stub):
     response = stub.NormalizeTokenwise(message)
     print(response)
 
+def get_token_offsets(ext_stub):
+    content = 'voru 55 km eftir. Enginn gat farið meira en 2 m.'
+    message = msg_pb2.NormalizeRequest(content=content, domain=msg_pb2.NORM_DOMAIN_SPORT)
+    response, offsets = ext_stub.NormalizeTokenwiseOffsets(message)
+    tokens = [token for sentence in response.sentence for token in sentence.token_info]
+    for token, (sentence_index, start, end) in zip(tokens, offsets):
+        print(sentence_index, start, end, repr(content[start:end]), token.normalized_token)
+
+
+def get_batch_normalized_text(ext_stub):
+    messages = [msg_pb2.NormalizeRequest(content='voru 55 km eftir', domain=msg_pb2.NORM_DOMAIN_SPORT),
+                msg_pb2.NormalizeRequest(content='Enginn gat farið meira en 2 m.', domain=msg_pb2.NORM_DOMAIN_OTHER)]
+    for response in ext_stub.NormalizeBatch(iter(messages)):
+        print(response)
+
+
+def get_streamed_normalized_text(ext_stub):
+    message = msg_pb2.NormalizeRequest(content='voru 55 km eftir. Enginn gat farið meira en 2 m.',
+                                       domain=msg_pb2.NORM_DOMAIN_SPORT)
+    for response in ext_stub.NormalizeStream(message):
+        print(response)
+
+
+def get_preprocessed_text(stub):
+    print(stub.GetDefaultPhonemeDescription(empty_pb2.Empty()))
+    description = msg_pb2.PhonemeDescription(alphabet=msg_pb2.PHONETIC_ALPHABET_IPA, format=msg_pb2.PHONEME_PLAIN,
+                                             syllabified=True, stress_labels=True)
+    message = msg_pb2.PreprocessRequest(content='voru 55 km eftir. Enginn gat farið meira en 2 m.',
+                                        description=description)
+    print(stub.TTSPreprocess(message))
+
+
+def get_edited_normalized_text(ext_stub):
+    text = 'voru 55 km eftir. Enginn gat farið meira en 2 m.'
+    message = msg_pb2.NormalizeRequest(content=text, domain=msg_pb2.NORM_DOMAIN_SPORT)
+    response, call = ext_stub.NormalizeEdit.with_call(message, metadata=[('x-session-id', 'example')])
+    print(response, call.trailing_metadata())
+    # replace '55' by '56'
+    message = msg_pb2.NormalizeRequest(content='56', domain=msg_pb2.NORM_DOMAIN_SPORT)
+    metadata = [('x-session-id', 'example'), ('x-edit-offset', str(text.index('55'))), ('x-edit-delete', '2')]
+    response, call = ext_stub.NormalizeEdit.with_call(message, metadata=metadata)
+    print(response, call.trailing_metadata())
+
 
 def run():
     with grpc.insecure_channel('localhost:8080') as channel:
@@ -34,6 +78,16 @@ def run():
         get_normalized_text(stub)
         print("-------------- Normalize tokenwise --------------")
         get_tokenwise_normalized_text(stub)
+        print("-------------- Token offsets --------------")
+        get_token_offsets(TTSFrontendExtStub(channel))
+        print("-------------- Normalize batch --------------")
+        get_batch_normalized_text(TTSFrontendExtStub(channel))
+        print("-------------- Normalize stream --------------")
+        get_streamed_normalized_text(TTSFrontendExtStub(channel))
+        print("-------------- TTS preprocess --------------")
+        get_preprocessed_text(stub)
+        print("-------------- Normalize edit --------------")
+        get_edited_normalized_text(TTSFrontendExtStub(channel))
 
 
 if __name__=='__main__':
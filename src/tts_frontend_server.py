@@ -3,92 +3,705 @@ from os.path import dirname
 sys.path.append(dirname(__file__)+'/generated/')
 
 from concurrent import futures
+import argparse
+import gc
+import json
 import logging
+import os
+import signal
+import tempfile
+import threading
+import time
 import grpc
 
-from regina_normalizer.main import Normalizer
 from generated.messages import tts_frontend_message_pb2
 from generated.services import tts_frontend_service_pb2_grpc
+from admission import AdmissionController
+import domain_packs
+import edit_sessions
+from normalizer_loader import LazyNormalizer, load_normalizer
+from fast_path import FastPathNormalizer
+from g2p import G2P, G2PUnavailable
+from lexicon import open_lexicon
+import metrics
+from micro_batcher import MicroBatchingNormalizer
+from normalizer_pool import NormalizerPool
+from process_supervisor import ProcessSupervisor
+import profiling
+from response_encoding import encode_normalize_response, encode_tokenbased_response
+from readiness import ReadinessInterceptor, add_health_to_server
+from preprocess import TTSPreprocessor
+from persistent_cache import PersistentCache, TieredCache, cache_key, normalizer_version
+from result_cache import ResultCache
+from segmentation import SentenceBuffer, SentenceSplitter
+from sentence_memo import SentenceMemoNormalizer, estimate_size
+import service_extensions
+import token_offsets
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PHONEME_DESCRIPTION = tts_frontend_message_pb2.PhonemeDescription(
+    alphabet=tts_frontend_message_pb2.PHONETIC_ALPHABET_SAMPA, format=tts_frontend_message_pb2.PHONEME_PLAIN,
+    syllabified=False, stress_labels=False)
+
+
+class DocumentStream:
+    """A NormalizeDocumentStream call: the text of the sentence still incomplete, and the document's domain.
+
+    Servers that read requests on their own, such as the asyncio server, feed it the requests as they arrive.
+    """
+
+    def __init__(self, servicer, context):
+        self.servicer = servicer
+        self.context = context
+        self.buffer = SentenceBuffer(servicer.splitter)
+        self.domain = None
+
+    def feed(self, requests):
+        """Yield the responses to the sentences that the requests complete."""
+        for request in requests:
+            self.servicer.admission.check_size(request.content, self.context)
+            if self.domain is None:
+                self.domain = self.servicer.request_domain(request, self.context)
+            yield from self.servicer.stream_sentences(self.buffer.feed(request.content), self.domain, self.context)
+
+    def finish(self):
+        """Yield the responses to the sentences left when the client has sent the whole document."""
+        yield from self.servicer.stream_sentences(self.buffer.flush(), self.domain, self.context)
 
 
 class TTSFrontendServicer(tts_frontend_service_pb2_grpc.TTSFrontendServicer):
     """Provides methods that implement functionality of tts frontend server."""
 
-    def __init__(self):
-        # init normalizer
-        self.normalizer = Normalizer()
+    def __init__(self, normalizer=None, batch_processes=None, result_cache=None, sentence_cache=None,
+                 snapshot_path=None, batch_window=0, max_batch_sentences=64, fast_path=False, admission=None,
+                 slow_requests=None, g2p=None, preprocess_threads=10, max_edit_sessions=1000,
+                 edit_session_bytes=256 * 1024 * 1024, edit_session_idle=600, compiled_rules=False,
+                 domain_registry=None):
+        self.splitter = SentenceSplitter()
+        # init normalizer, unless given one, e.g. a LazyNormalizer that is still loading
+        if normalizer is None:
+            normalizer = load_normalizer(snapshot_path, compiled_rules)
+        self.ready = getattr(normalizer, 'ready', None)
+        if self.ready is None:
+            self.ready = threading.Event()
+            self.ready.set()
+        self.normalizer = normalizer
+        # the optional wrappers are kept for their statistics
+        self.micro_batcher = self.fast_path = None
+        if batch_window > 0:
+            self.normalizer = self.micro_batcher = MicroBatchingNormalizer(self.normalizer, self.splitter,
+                                                                           batch_window, max_batch_sentences)
+        if fast_path:
+            self.normalizer = self.fast_path = FastPathNormalizer(self.normalizer, self.splitter)
+        self.sentence_cache = sentence_cache
+        if sentence_cache is not None:
+            self.normalizer = SentenceMemoNormalizer(self.normalizer, self.splitter, sentence_cache)
+        # optional domain_packs.DomainRegistry of the domains clients can select with request metadata
+        self.domains = domain_registry
+        if domain_registry is not None:
+            self.normalizer = domain_packs.DomainNormalizer(self.normalizer, domain_registry)
+        # optional ResultCache, PersistentCache or TieredCache of serialized Normalize/NormalizeTokenwise responses
+        self.result_cache = result_cache
+        # part of the cache keys, so that servers of different versions can share a PersistentCache
+        self.normalizer_version = normalizer_version()
+        # limits request sizes and schedules normalizer calls, see AdmissionController
+        self.admission = admission if admission is not None else AdmissionController()
+        # TTSPreprocess normalizes the next sentence on this pool while the current one goes through G2P
+        self.preprocessor = TTSPreprocessor(self.normalizer, self.splitter, g2p if g2p is not None else G2P(),
+                                            futures.ThreadPoolExecutor(max_workers=preprocess_threads,
+                                                                       thread_name_prefix='preprocess'))
+        # documents of NormalizeEdit clients
+        self.sessions = edit_sessions.EditSessions(self.normalizer, self.splitter, max_edit_sessions,
+                                                   edit_session_bytes, edit_session_idle)
+        # optional profiling.SlowRequestLog of the slowest Normalize/NormalizeTokenwise requests
+        self.slow_requests = slow_requests
+        # batches are fanned out over a separate pool of normalizer processes
+        self.batch_pool = NormalizerPool(batch_processes or os.cpu_count() or 1, snapshot_path=snapshot_path,
+                                         compiled_rules=compiled_rules)
         return
 
+    @staticmethod
+    def normalizer_domain(domain):
+        if domain == tts_frontend_message_pb2.NORM_DOMAIN_SPORT:
+            return 'sport'
+        return ''
+
+    def _domain_pack(self, name, context):
+        if self.domains is None:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, 'unknown domain {!r}, the server has no domain '
+                                                            'packs'.format(name))
+        try:
+            return self.domains.get(name)
+        except domain_packs.UnknownDomain:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, 'unknown domain {!r}, known are {}'.format(
+                name, ', '.join(self.domains.names())))
+        except domain_packs.DomainPackError as e:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, 'domain pack {} can not be loaded: {}'.format(name, e))
+
+    def request_pack(self, context):
+        """The DomainPack named in the request metadata, or None for a built-in domain or none."""
+        name = domain_packs.requested(context)
+        if name is None or name in domain_packs.BUILTIN_DOMAINS:
+            return None
+        return self._domain_pack(name, context)
+
+    def request_domain(self, request, context):
+        """The normalizer domain of a request: the domain named in its metadata, or else its domain field."""
+        name = domain_packs.requested(context)
+        if name is None:
+            return self.normalizer_domain(request.domain)
+        if name not in domain_packs.BUILTIN_DOMAINS:
+            self._domain_pack(name, context)
+        return name
+
+    def cache_domain(self, domain):
+        """The domain as it goes into cache keys, with the version of a domain pack, whose responses change with it."""
+        if domain in domain_packs.BUILTIN_DOMAINS:
+            return domain
+        return '{}@{}'.format(domain, self.domains.get(domain).version)
+
+    def init_response(self, normalized_arr):
+        response = tts_frontend_message_pb2.NormalizeResponse()
+        response.normalized_sentence.extend([sentence[0] for sentence in normalized_arr])
+
+        return response
+
     def init_tokenbased_response(self, normalized_arr):
         response = tts_frontend_message_pb2.TokenBasedNormalizedResponse()
         for sentence in normalized_arr:
-            sentence_response = tts_frontend_message_pb2.TokenBasedNormalizedSentence()
-            norm_sent = ''
+            sentence_response = response.sentence.add()
+            token_info = sentence_response.token_info
             for ind, pair in enumerate(sentence):
-                info = tts_frontend_message_pb2.RawNormalizedTokenInfo()
-                info.original_token = pair[0]
-                info.normalized_token = pair[1]
-                info.original_index = ind
-                if info.original_token != info.normalized_token:
-                    info.has_changed = True
-                sentence_response.token_info.append(info)
-                norm_sent += info.normalized_token + ' '
-            sentence_response.normalized_sentence = norm_sent.strip()
-            response.sentence.append(sentence_response)
+                token_info.add(original_token=pair[0], normalized_token=pair[1], original_index=ind,
+                               has_changed=pair[0] != pair[1])
+            sentence_response.normalized_sentence = ' '.join([pair[1] for pair in sentence]).strip()
 
         return response
 
+    # the RPCs below return serialized responses, see response_encoding, and are registered with a
+    # serializer that passes bytes through by service_extensions
+
+    def _normalize(self, content, domain):
+        with metrics.stage('normalizer'):
+            normalized = self.normalizer.normalize(content, domain)
+        with metrics.stage('response'):
+            return encode_normalize_response(normalized)
+
+    def _normalize_tokenwise(self, content, domain):
+        with metrics.stage('normalizer'):
+            normalized = self.normalizer.normalize_tokenwise(content, domain)
+        with metrics.stage('response'):
+            return encode_tokenbased_response(normalized)
+
+    def _normalize_tokenwise_with_offsets(self, content, domain):
+        with metrics.stage('normalizer'):
+            normalized = self.normalizer.normalize_tokenwise(content, domain)
+        with metrics.stage('response'):
+            return token_offsets.encode_response(content, normalized)
+
+    def _recorded_response(self, method, request, context, build_response):
+        """Return the response of _cached_response, timed per stage for the slow request log if there is one."""
+        if self.slow_requests is None:
+            return self._cached_response(method, request, context, build_response)[1]
+        start = time.perf_counter()
+        with metrics.trace() as stages:
+            domain, response = self._cached_response(method, request, context, build_response)
+        self.slow_requests.record(time.perf_counter() - start, method, domain, request.content, stages)
+        return response
+
+    def _cached_response(self, method, request, context, build_response):
+        """Return the request's domain and the serialized response of build_response(content, domain), via the
+        result cache if there is one.
+
+        Only cache misses wait for admission.
+        """
+        self.admission.check_size(request.content, context)
+        with metrics.stage('domain'):
+            domain = self.request_domain(request, context)
+        if self.result_cache is None:
+            with self.admission.admit(request.content, context):
+                return domain, build_response(request.content, domain)
+        with metrics.stage('cache'):
+            key = cache_key(method, self.cache_domain(domain), self.normalizer_version,
+                            tts_frontend_message_pb2.ABI_VERSION_CURRENT, request.content)
+            response = self.result_cache.get(key)
+        if response is None:
+            with self.admission.admit(request.content, context):
+                response = build_response(request.content, domain)
+            self.result_cache.put(key, response)
+        return domain, response
+
     def Normalize(self, request, context):
         """Normalize text for TTS, returns normalized text prepared for g2p
         """
         context.set_code(grpc.StatusCode.OK)
-        if request.domain == tts_frontend_message_pb2.NORM_DOMAIN_SPORT:
-            domain = 'sport'
-        else:
-            domain = ''
-        normalized = self.normalizer.normalize(request.content, domain)
-        response = tts_frontend_message_pb2.NormalizeResponse()
-        for sentence in normalized:
-            response.normalized_sentence.append(sentence[0])
-
-        return response
+        return self._recorded_response('Normalize', request, context, self._normalize)
 
     def NormalizeTokenwise(self, request, context):
         """Normalize text for TTS, returns normalized text prepared for g2p
         """
         context.set_code(grpc.StatusCode.OK)
-        if request.domain == tts_frontend_message_pb2.NORM_DOMAIN_SPORT:
-            domain = 'sport'
-        else:
-            domain = ''
-        normalized = self.normalizer.normalize_tokenwise(request.content, domain)
-        response = self.init_tokenbased_response(normalized)
+        return self._recorded_response('NormalizeTokenwise', request, context, self._normalize_tokenwise)
 
-        return response
+    def NormalizeTokenwiseOffsets(self, request, context):
+        """Normalize text tokenwise, returns the response of NormalizeTokenwise with the offsets of every token
+        in the content, see token_offsets
+        """
+        context.set_code(grpc.StatusCode.OK)
+        return self._recorded_response('NormalizeTokenwiseOffsets', request, context,
+                                       self._normalize_tokenwise_with_offsets)
+
+    def _batch_items(self, request_iterator, context, pack):
+        for request in request_iterator:
+            self.admission.check_size(request.content, context)
+            # the pool processes normalize in the pack's base domain, the pack is applied here
+            yield request.content, pack.base if pack is not None else self.request_domain(request, context)
+
+    def NormalizeBatch(self, request_iterator, context):
+        """Normalize a stream of requests, returns one NormalizeResponse per request in request order
+        """
+        context.set_code(grpc.StatusCode.OK)
+        pack = self.request_pack(context)
+        for normalized in self.batch_pool.imap('normalize', self._batch_items(request_iterator, context, pack)):
+            yield encode_normalize_response(normalized if pack is None else pack.normalize(normalized))
+
+    def NormalizeTokenwiseBatch(self, request_iterator, context):
+        """Normalize a stream of requests, returns one TokenBasedNormalizedResponse per request in request order
+        """
+        context.set_code(grpc.StatusCode.OK)
+        pack = self.request_pack(context)
+        for normalized in self.batch_pool.imap('normalize_tokenwise',
+                                               self._batch_items(request_iterator, context, pack)):
+            yield encode_tokenbased_response(normalized if pack is None else pack.normalize_tokenwise(normalized))
+
+    def stream_sentences(self, sentences, domain, context):
+        for sentence in sentences:
+            with self.admission.admit(sentence, context), metrics.stage('normalizer'):
+                normalized_sentences = self.normalizer.normalize(sentence, domain)
+            for normalized in normalized_sentences:
+                yield tts_frontend_message_pb2.NormalizeResponse(normalized_sentence=[normalized[0]])
+
+    def NormalizeStream(self, request, context):
+        """Normalize text for TTS, streams one NormalizeResponse per normalized sentence as soon as it is ready
+        """
+        context.set_code(grpc.StatusCode.OK)
+        self.admission.check_size(request.content, context)
+        domain = self.request_domain(request, context)
+        yield from self.stream_sentences(self.splitter.iter_sentences(request.content), domain, context)
+
+    def NormalizeDocumentStream(self, request_iterator, context):
+        """Normalize a document sent in arbitrary chunks, streams one NormalizeResponse per normalized sentence
+        as soon as the sentence is complete. The domain of the first request applies to the whole document.
+        """
+        context.set_code(grpc.StatusCode.OK)
+        stream = DocumentStream(self, context)
+        yield from stream.feed(request_iterator)
+        yield from stream.finish()
+
+    def NormalizeEdit(self, request, context):
+        """Edit a document held by the server and normalize it tokenwise, returns only the sentences the edit changed
+
+        The edit is given in request metadata, see edit_sessions; which sentences of the previous
+        response the returned ones replace is given in trailing metadata.
+        """
+        metadata = dict(context.invocation_metadata() or ())
+        session_id = metadata.get(edit_sessions.SESSION_KEY)
+        if not session_id:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, '{} metadata is missing'.format(edit_sessions.SESSION_KEY))
+        try:
+            offset = metadata.get(edit_sessions.EDIT_OFFSET_KEY)
+            offset = int(offset) if offset is not None else None
+            delete = int(metadata.get(edit_sessions.EDIT_DELETE_KEY, 0))
+        except ValueError:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, 'edit offset and length must be integers')
+        self.admission.check_size(request.content, context)
+        domain = self.request_domain(request, context)
+        with self.admission.admit(request.content, context), metrics.stage('normalizer'):
+            try:
+                splice = self.sessions.edit(session_id, request.content, domain, offset, delete)
+            except edit_sessions.UnknownSession:
+                context.abort(grpc.StatusCode.NOT_FOUND, 'unknown or expired session, send the whole document '
+                                                         'without {}'.format(edit_sessions.EDIT_OFFSET_KEY))
+            except edit_sessions.EditError as e:
+                context.abort(grpc.StatusCode.OUT_OF_RANGE, str(e))
+        context.set_trailing_metadata((
+            (edit_sessions.SENTENCE_START_KEY, str(splice.start)),
+            (edit_sessions.SENTENCES_REMOVED_KEY, str(splice.removed)),
+            (edit_sessions.SENTENCE_COUNT_KEY, str(splice.count)),
+        ))
+        context.set_code(grpc.StatusCode.OK)
+        with metrics.stage('response'):
+            return encode_tokenbased_response(splice.sentences)
+
+    @staticmethod
+    def phoneme_description(description):
+        """The description with the defaults filled in for an unset alphabet or format."""
+        return tts_frontend_message_pb2.PhonemeDescription(
+            alphabet=description.alphabet or DEFAULT_PHONEME_DESCRIPTION.alphabet,
+            format=description.format or DEFAULT_PHONEME_DESCRIPTION.format,
+            syllabified=description.syllabified, stress_labels=description.stress_labels)
 
     def TTSPreprocess(self, request, context):
         """Preprocess text for TTS, including conversion to X-SAMPA
         """
-        context.set_code(grpc.StatusCode.NOT_IMPLEMENTED)
+        self.admission.check_size(request.content, context)
+        description = self.phoneme_description(request.description)
+        ipa = description.alphabet == tts_frontend_message_pb2.PHONETIC_ALPHABET_IPA
+        try:
+            with self.admission.admit(request.content, context):
+                processed = self.preprocessor.preprocess(
+                    request.content, alphabet='ipa' if ipa else 'sampa',
+                    cmu=description.format == tts_frontend_message_pb2.PHONEME_CMU,
+                    syllabified=description.syllabified, stress_labels=description.stress_labels)
+        except G2PUnavailable as e:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, str(e))
+        context.set_code(grpc.StatusCode.OK)
+        return tts_frontend_message_pb2.PreprocessedResponse(processed_content=processed, description=description)
 
     def GetDefaultPhonemeDescription(self, request, context):
         """Default values for the phoneme description
         """
-        context.set_code(grpc.StatusCode.NOT_IMPLEMENTED)
+        context.set_code(grpc.StatusCode.OK)
+        return DEFAULT_PHONEME_DESCRIPTION
 
     def GetVersion(self, request, context):
         context.set_code(grpc.StatusCode.OK)
         return tts_frontend_message_pb2.AbiVersionResponse(version=tts_frontend_message_pb2.ABI_VERSION.ABI_VERSION_CURRENT)
 
 
-def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    tts_frontend_service_pb2_grpc.add_TTSFrontendServicer_to_server(TTSFrontendServicer(), server)
-    server.add_insecure_port('[::]:8080')
+def create_servicer(options, normalizer=None):
+    result_cache = None
+    if options.cache_bytes > 0:
+        result_cache = ResultCache(options.cache_bytes, options.cache_ttl)
+    if options.persistent_cache:
+        persistent_cache = PersistentCache(options.persistent_cache, options.persistent_cache_bytes)
+        if result_cache is None:
+            result_cache = persistent_cache
+        else:
+            result_cache = TieredCache(result_cache, persistent_cache)
+            if options.cache_warmup > 0:
+                result_cache.warm_up(options.cache_warmup)
+    sentence_cache = None
+    if options.sentence_cache_bytes > 0:
+        sentence_cache = ResultCache(options.sentence_cache_bytes, options.cache_ttl, sizeof=estimate_size)
+    g2p_cache = None
+    if options.g2p_cache_bytes > 0:
+        g2p_cache = ResultCache(options.g2p_cache_bytes, sizeof=estimate_size)
+    g2p = G2P(open_lexicon(options.lexicon) if options.lexicon else None, g2p_cache, use_model=options.g2p_model)
+    if normalizer is None and options.lazy_load:
+        normalizer = LazyNormalizer(lambda: load_normalizer(options.normalizer_snapshot, options.compiled_rules))
+        normalizer.start()
+    elif normalizer is None:
+        normalizer = load_normalizer(options.normalizer_snapshot, options.compiled_rules)
+    slow_requests = None
+    if options.slow_requests > 0:
+        slow_requests = profiling.SlowRequestLog(options.slow_requests, options.slow_request_max_chars)
+    admission = AdmissionController(options.admission_slots, options.bulk_slots, options.max_bulk_queue,
+                                    options.bulk_bytes, options.max_content_bytes)
+    domain_registry = None
+    if options.domain_packs:
+        domain_registry = domain_packs.DomainRegistry(options.domain_packs, options.max_domains,
+                                                      options.domain_reload_interval)
+    return TTSFrontendServicer(normalizer, batch_processes=options.batch_processes, result_cache=result_cache,
+                               sentence_cache=sentence_cache, snapshot_path=options.normalizer_snapshot,
+                               batch_window=options.batch_window_ms / 1000,
+                               max_batch_sentences=options.max_batch_sentences, fast_path=options.fast_path,
+                               admission=admission, slow_requests=slow_requests, g2p=g2p,
+                               preprocess_threads=options.threads, max_edit_sessions=options.edit_sessions,
+                               edit_session_bytes=options.edit_session_bytes,
+                               edit_session_idle=options.edit_session_idle, compiled_rules=options.compiled_rules,
+                               domain_registry=domain_registry)
+
+
+def _cache_samples(caches):
+    samples = {}
+    for name, cache in caches.items():
+        if cache is None:
+            continue
+        stats = cache.stats()
+        # a TieredCache reports the stats of its two tiers
+        tiers = stats.items() if 'memory' in stats else [(None, stats)]
+        for tier, tier_stats in tiers:
+            label = name if tier is None else '{}_{}'.format(name, tier)
+            for event in ('hits', 'misses', 'evictions'):
+                samples[(label, event)] = tier_stats[event]
+    return samples
+
+
+def register_metrics(servicer, registry=metrics.REGISTRY):
+    """Export the statistics the servicer's caches, admission controller and normalizer wrappers keep."""
+    caches = {'response': servicer.result_cache, 'sentence': servicer.sentence_cache,
+              'g2p': servicer.preprocessor.g2p.cache}
+    admission = servicer.admission
+    registry.register(metrics.CallbackMetric(
+        'tts_frontend_cache_events_total', 'Cache hits, misses and evictions.', 'counter',
+        lambda: _cache_samples(caches), ('cache', 'event')))
+    registry.register(metrics.CallbackMetric(
+        'tts_frontend_admission_waiting', 'Requests waiting for an admission slot.', 'gauge',
+        lambda: {(traffic_class,): waiting for traffic_class, waiting in admission.stats()['waiting'].items()},
+        ('class',)))
+    registry.register(metrics.CallbackMetric(
+        'tts_frontend_admission_running', 'Requests holding an admission slot.', 'gauge',
+        lambda: {(traffic_class,): running for traffic_class, running in admission.stats()['running'].items()},
+        ('class',)))
+    registry.register(metrics.CallbackMetric(
+        'tts_frontend_admission_rejected_total', 'Requests rejected for their size or a full bulk queue.', 'counter',
+        lambda: {(): admission.rejected}))
+    registry.register(metrics.CallbackMetric(
+        'tts_frontend_edit_sessions', 'Open NormalizeEdit sessions.', 'gauge',
+        lambda: {(): len(servicer.sessions)}))
+    registry.register(metrics.CallbackMetric(
+        'tts_frontend_edit_session_sentences_total', 'Sentences of edited documents, by whether they were '
+        'normalized again or reused.', 'counter',
+        lambda: {('normalized',): servicer.sessions.sentences_normalized,
+                 ('reused',): servicer.sessions.sentences_reused}, ('result',)))
+    if servicer.domains is not None:
+        domains = servicer.domains
+        registry.register(metrics.CallbackMetric(
+            'tts_frontend_domain_packs', 'Domain packs loaded.', 'gauge', lambda: {(): domains.stats()['loaded']}))
+        registry.register(metrics.CallbackMetric(
+            'tts_frontend_domain_pack_events_total', 'Domain packs loaded, reloaded and evicted.', 'counter',
+            lambda: {(event,): domains.stats()[event + 's'] for event in ('load', 'reload', 'eviction')},
+            ('event',)))
+    if servicer.fast_path is not None:
+        fast_path = servicer.fast_path
+        registry.register(metrics.CallbackMetric(
+            'tts_frontend_fast_path_sentences_total', 'Tokenwise sentences, by whether the fast path answered them.',
+            'counter', lambda: {('fast',): fast_path.fast_sentences,
+                                ('normalizer',): fast_path.sentences - fast_path.fast_sentences}, ('path',)))
+    if servicer.micro_batcher is not None:
+        micro_batcher = servicer.micro_batcher
+        registry.register(metrics.CallbackMetric(
+            'tts_frontend_micro_batches_total', 'Bulk POS tagger calls made by the micro-batcher.', 'counter',
+            lambda: {(): micro_batcher.batches}))
+        registry.register(metrics.CallbackMetric(
+            'tts_frontend_micro_batched_calls_total', 'Normalizer calls whose sentences were tagged in bulk.',
+            'counter', lambda: {(): micro_batcher.batched_calls}))
+        registry.register(metrics.CallbackMetric(
+            'tts_frontend_micro_batch_tags_total', 'Sentences tagged by the normalizer, by whether tagged in bulk.',
+            'counter', lambda: {} if micro_batcher.tagger is None else
+            {('bulk',): micro_batcher.tagger.hits, ('single',): micro_batcher.tagger.misses}, ('tagged',)))
+
+
+def _profiling_routes(options, servicer, profiler):
+    def profile(query):
+        seconds = float(query.get('seconds', options.profile_seconds))
+        if not 0 < seconds <= 600:
+            raise ValueError('seconds must be between 0 and 600')
+        stacks = profiler.sample(seconds)
+        if stacks is None:
+            raise ValueError('a profile is already running')
+        return 'text/plain; charset=utf-8', ''.join('{} {}\n'.format(stack, count)
+                                                    for stack, count in stacks.most_common())
+
+    def slow_requests(query):
+        entries = servicer.slow_requests.entries() if servicer.slow_requests is not None else []
+        return 'application/json; charset=utf-8', json.dumps(entries, ensure_ascii=False, indent=2)
+
+    return {'/debug/profile': profile, '/debug/slow-requests': slow_requests}
+
+
+def start_metrics(worker_index, options, servicer):
+    """Export servicer metrics and, with --metrics-port, serve them over HTTP on the worker's port.
+
+    With --profiling, returns the profiling signal handlers for the caller to install. With
+    --debug-http as well, the HTTP server serves /debug/profile and /debug/slow-requests.
+    """
+    register_metrics(servicer)
+    handlers = {}
+    routes = {}
+    if options.profiling:
+        profiler = profiling.SamplingProfiler(options.profile_interval_ms / 1000)
+        handlers = profiling.signal_handlers(profiler, options.profile_seconds, options.profile_dir, worker_index,
+                                             servicer.slow_requests)
+        if options.debug_http:
+            routes = _profiling_routes(options, servicer, profiler)
+
+    def instrument():
+        servicer.ready.wait()
+        metrics.instrument_normalizer()
+    threading.Thread(target=instrument, name='instrument-normalizer', daemon=True).start()
+    if options.metrics_port is not None:
+        port = options.metrics_port + worker_index
+        metrics.start_http_server(port, routes=routes, host=options.metrics_host)
+        logger.info('worker %d serving metrics on http://%s:%d/metrics', worker_index, options.metrics_host, port)
+    return handlers
+
+
+def create_server(options, servicer=None):
+    """Create a gRPC server with a TTSFrontendServicer bound to options.port."""
+    server_options = []
+    if options.workers > 1:
+        # all worker processes listen on the same port, the kernel spreads connections among them
+        server_options.append(('grpc.so_reuseport', 1))
+    if servicer is None:
+        servicer = create_servicer(options)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=options.threads), options=server_options,
+                         interceptors=[metrics.MetricsInterceptor(), ReadinessInterceptor(servicer.ready)])
+    add_health_to_server(server, servicer.ready)
+    # registered first, so its handlers take precedence over the generated ones
+    service_extensions.add_extensions_to_server(servicer, server)
+    tts_frontend_service_pb2_grpc.add_TTSFrontendServicer_to_server(servicer, server)
+    server.add_insecure_port('[::]:{}'.format(options.port))
+    return server
+
+
+def run_server(worker_index, options, normalizer=None):
+    """Run one server process until it is terminated."""
+    servicer = create_servicer(options, normalizer)
+    server = create_server(options, servicer)
+    profiling_handlers = start_metrics(worker_index, options, servicer)
     server.start()
+    logger.info('worker %d serving on port %d', worker_index, options.port)
+    for signum, handler in profiling_handlers.items():
+        signal.signal(signum, handler)
+
+    def stop(signum, frame):
+        server.stop(options.grace)
+    signal.signal(signal.SIGTERM, stop)
     server.wait_for_termination()
+    servicer.batch_pool.shutdown()
+    if servicer.result_cache is not None:
+        logger.info('worker %d result cache: %s', worker_index, servicer.result_cache.stats())
+    if servicer.admission.slots:
+        logger.info('worker %d admission: %s', worker_index, servicer.admission.stats())
+
+
+def preload_normalizer(options):
+    """Build the normalizer in the supervisor, to be shared copy-on-write by all forked workers."""
+    normalizer = load_normalizer(options.normalizer_snapshot, options.compiled_rules)
+    # move everything allocated so far out of the collector's reach, so that collections
+    # in the workers don't touch, and thereby copy, the shared pages
+    gc.collect()
+    gc.freeze()
+    return normalizer
+
+
+def serve(options, run=run_server):
+    """Run `run(worker_index, options, normalizer)` in one process, or in options.workers supervised processes."""
+    if options.workers > 1:
+        normalizer = preload_normalizer(options) if options.preload else None
+        forward_signals = (profiling.PROFILE_SIGNAL, profiling.SLOW_REQUESTS_SIGNAL) if options.profiling else ()
+        ProcessSupervisor(run, options.workers, args=(options, normalizer), forward_signals=forward_signals).run()
+    else:
+        run(0, options)
+
+
+def build_arg_parser(description='TTS frontend gRPC server'):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--port', type=int, default=8080, help='port to listen on')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='number of server processes, each with its own normalizer (default: number of cores)')
+    parser.add_argument('--threads', type=int, default=10, help='gRPC handler threads per server process')
+    parser.add_argument('--grace', type=float, default=5.0,
+                        help='seconds to let in-flight requests finish on shutdown')
+    parser.add_argument('--batch-processes', type=int, default=None,
+                        help='normalizer processes per server process for the batch RPCs '
+                             '(default: number of cores divided by --workers)')
+    parser.add_argument('--preload', action='store_true',
+                        help='load the normalizer once before forking the workers, which then share its memory')
+    parser.add_argument('--batch-window-ms', type=float, default=0,
+                        help='collect concurrent requests for up to this many milliseconds and POS tag their '
+                             'sentences in one call, 0 (default) disables micro-batching')
+    parser.add_argument('--max-batch-sentences', type=int, default=64,
+                        help='tag a micro-batch early once it has this many sentences')
+    parser.add_argument('--fast-path', action='store_true',
+                        help='return sentences of plain words unchanged without running the normalizer')
+    parser.add_argument('--compiled-rules', action='store_true',
+                        help="apply the normalizer's abbreviation and number rules with the precompiled, gated rule "
+                             'engine of src/rule_engine.py, which gives the same output faster')
+    parser.add_argument('--lazy-load', action='store_true',
+                        help='bind the port right away and load the normalizer in the background, '
+                             'health checks report NOT_SERVING until it is loaded')
+    parser.add_argument('--normalizer-snapshot', metavar='PATH', default=None,
+                        help='pickled normalizer to start from, written on first start if missing or outdated')
+    parser.add_argument('--cache-bytes', type=int, default=64 * 1024 * 1024,
+                        help='byte budget of the per-process response cache, 0 disables it')
+    parser.add_argument('--cache-ttl', type=float, default=None,
+                        help='seconds after which cached responses expire (default: never)')
+    parser.add_argument('--persistent-cache', metavar='PATH', default=None,
+                        help='SQLite database for a response cache that is shared by processes and survives restarts')
+    parser.add_argument('--persistent-cache-bytes', type=int, default=1024 * 1024 * 1024,
+                        help='byte budget of the persistent response cache')
+    parser.add_argument('--cache-warmup', type=int, default=0,
+                        help='number of most frequently used persistent cache entries to load into the in-memory cache '
+                             'at startup, needs --persistent-cache and --cache-bytes')
+    parser.add_argument('--sentence-cache-bytes', type=int, default=0,
+                        help='byte budget of the per-process sentence-level memo, 0 (default) disables it')
+    parser.add_argument('--lexicon', metavar='PATH', default=None,
+                        help='pronunciation lexicon for TTSPreprocess, built with src/lexicon.py, or a TSV file of '
+                             'word<TAB>X-SAMPA lines sorted with LC_ALL=C')
+    parser.add_argument('--no-g2p-model', dest='g2p_model', action='store_false',
+                        help='do not load ice-g2p, TTSPreprocess fails with FAILED_PRECONDITION for words missing '
+                             'from the lexicon')
+    parser.add_argument('--g2p-cache-bytes', type=int, default=16 * 1024 * 1024,
+                        help='byte budget of the cache of transcriptions of words missing from the lexicon')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='serve Prometheus metrics on http://HOST:PORT/metrics, worker N on PORT + N')
+    parser.add_argument('--metrics-host', default='127.0.0.1',
+                        help='address the metrics server binds to (default: %(default)s), e.g. 0.0.0.0 for all')
+    parser.add_argument('--profiling', action='store_true',
+                        help='on SIGUSR1 profile every worker for --profile-seconds, on SIGUSR2 write the slow request '
+                             'log, both to --profile-dir')
+    parser.add_argument('--debug-http', action='store_true',
+                        help='with --profiling and --metrics-port, also serve /debug/profile?seconds=N and '
+                             '/debug/slow-requests, which returns request content, on the metrics port')
+    parser.add_argument('--profile-seconds', type=float, default=10.0, help='length of a signalled profile')
+    parser.add_argument('--profile-interval-ms', type=float, default=10.0, help='stack sampling interval')
+    parser.add_argument('--profile-dir', default=tempfile.gettempdir(),
+                        help='directory for profiles and slow request logs (default: %(default)s)')
+    parser.add_argument('--slow-requests', type=int, default=0, metavar='K',
+                        help='keep the K slowest Normalize/NormalizeTokenwise requests with their content and stage '
+                             'timings, 0 (default) disables it')
+    parser.add_argument('--slow-request-max-chars', type=int, default=100000,
+                        help='content kept per slow request')
+    parser.add_argument('--max-content-bytes', type=int, default=0,
+                        help='reject requests with more content bytes with RESOURCE_EXHAUSTED, 0 (default) is unlimited')
+    parser.add_argument('--admission-slots', type=int, default=0,
+                        help='normalizer calls per process that may run at a time, the rest are queued and scheduled '
+                             'by traffic class and deadline; 0 (default) disables scheduling')
+    parser.add_argument('--bulk-slots', type=int, default=1,
+                        help='of the --admission-slots, how many bulk requests may occupy')
+    parser.add_argument('--max-bulk-queue', type=int, default=None,
+                        help='bulk requests per process that may wait for a slot, more are rejected with '
+                             'RESOURCE_EXHAUSTED (default: half of --threads)')
+    parser.add_argument('--bulk-bytes', type=int, default=2000,
+                        help='requests without x-traffic-class metadata and more content bytes are treated as bulk')
+    parser.add_argument('--edit-sessions', type=int, default=1000,
+                        help='NormalizeEdit documents kept per process, the least recently used are dropped')
+    parser.add_argument('--edit-session-bytes', type=int, default=256 * 1024 * 1024,
+                        help='byte budget of the NormalizeEdit documents of a process')
+    parser.add_argument('--edit-session-idle', type=float, default=600.0,
+                        help='seconds after which an unused NormalizeEdit document is dropped')
+    parser.add_argument('--domain-packs', metavar='DIR', default=None,
+                        help='directory of domain packs that requests select with x-domain metadata, see '
+                             'src/domain_packs.py')
+    parser.add_argument('--max-domains', type=int, default=16,
+                        help='domain packs kept loaded per process, the least recently used are dropped')
+    parser.add_argument('--domain-reload-interval', type=float, default=5.0,
+                        help='seconds between checks of a loaded domain pack for changed files')
+    return parser
+
+
+def parse_args(argv=None, parser=None):
+    if parser is None:
+        parser = build_arg_parser()
+    options = parser.parse_args(argv)
+    if options.preload and options.lazy_load:
+        parser.error('--preload and --lazy-load cannot be combined')
+    if options.cache_warmup > 0 and not (options.persistent_cache and options.cache_bytes > 0):
+        # entries are loaded from the persistent cache into the in-memory one
+        parser.error('--cache-warmup needs --persistent-cache and an in-memory cache (--cache-bytes)')
+    if options.debug_http and not (options.profiling and options.metrics_port is not None):
+        parser.error('--debug-http needs --profiling and --metrics-port')
+    if options.batch_processes is None:
+        options.batch_processes = max(1, (os.cpu_count() or 1) // options.workers)
+    if options.max_bulk_queue is None:
+        options.max_bulk_queue = max(1, options.threads // 2)
+    return options
 
 
 if __name__=='__main__':
-    logging.basicConfig()
-    serve()
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+    serve(parse_args())
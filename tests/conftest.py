@@ -0,0 +1,97 @@
+"""Fixtures shared by the tests.
+
+The tests need the normalizer's tokenizer (regina_normalizer.tokenizer). They use the normalizer
+itself if it is installed, and otherwise a reference normalizer that detects sentences with that
+tokenizer and normalizes every sentence on its own, as the normalizer does.
+"""
+import os
+import random
+import re
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+# make the service modules importable the same way tts_frontend_server.py does
+sys.path.append(SRC_DIR)
+sys.path.append(os.path.join(SRC_DIR, 'generated'))
+
+# tokens that make the normalizer's sentence detection interesting: abbreviations, initials, quotes,
+# ordinals and punctuation of its own
+WORDS = ['Hann', 'kom', 'kom?', 'kom.', 'fór', 'fór.', 'Svo', 'hann', 'Ég', 'heiti', 'Jón.', 'Jón…', 'maí', 'bækur.',
+         '!', '?', '.', '..', ':', '–', '"', '?!', 'J.', 'K.', 'A.', 'Rowling', 'nr.', 'Hr.', 't.d.', 'o.s.frv.',
+         'kl.', 'e.', 'Kr.', 'U.S.A.', '„Já.“', '„Já!“', '"Já', 'já."', '"Hæ!"', 'sagði:', '(sjá', 'bls.)', 'ó!',
+         '5.', '1.', '3', '12.5', '2021', 'km.', '5km', 'ís.', 'OK.']
+
+
+class ReferenceNormalizer:
+    """Normalizes like the normalizer: sentence by sentence, each sentence independently of the others.
+
+    As in the normalizer, words of letters keep their case and punctuation tokens are left as they are.
+    """
+
+    def __init__(self):
+        from regina_normalizer.tokenizer import Tokenizer
+        self.tokenizer = Tokenizer()
+
+    def _normalize_sentence(self, sentence, domain):
+        tokens = sentence.split()
+        normalized = []
+        for index, token in enumerate(tokens):
+            word = token
+            if token.isdigit():
+                word = 'tala{}'.format(len(token))
+            elif domain == 'sport' and len(token) > 1 and token.endswith('.'):
+                word = token[:-1]
+            # the words around a token change its normalization, as the POS tags do in the normalizer
+            if index + 1 < len(tokens) and tokens[index + 1].isdigit():
+                word += '_'
+            normalized.append((token, word))
+        return normalized
+
+    def normalize_tokenwise(self, text, domain):
+        return [self._normalize_sentence(sentence, domain) for sentence in self.tokenizer.detect_sentences(text)]
+
+    def normalize(self, text, domain):
+        return [(' '.join(word for _, word in sentence),) for sentence in self.normalize_tokenwise(text, domain)]
+
+
+@pytest.fixture(scope='session')
+def normalizer():
+    pytest.importorskip('regina_normalizer.tokenizer')
+    try:
+        from regina_normalizer.main import Normalizer
+    except ImportError:
+        return ReferenceNormalizer()
+    return Normalizer()
+
+
+@pytest.fixture(scope='session')
+def replace_abbreviations():
+    """The normalizer's abbreviation pass, which runs on each sentence before numbers are spelled out."""
+    abbr_functions = pytest.importorskip('regina_normalizer.abbr_functions')
+    try:
+        abbr_functions.replace_abbreviations('hann', '')
+    except re.error:
+        pytest.skip("the normalizer's rules don't compile on this Python version")
+    return abbr_functions.replace_abbreviations
+
+
+@pytest.fixture(scope='session')
+def splitter():
+    pytest.importorskip('regina_normalizer.tokenizer')
+    from segmentation import SentenceSplitter
+    return SentenceSplitter()
+
+
+def random_text(rng, max_words=15):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(0, max_words))]
+    return ''.join(word + rng.choice([' ', ' ', ' ', '  ', '\n']) for word in words).rstrip(rng.choice([' \n', '']))
+
+
+@pytest.fixture
+def texts():
+    """Random texts of normalizer sentences with tricky ends, the same ones on every run."""
+    rng = random.Random(0)
+    return [random_text(rng) for _ in range(2000)]
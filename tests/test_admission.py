@@ -0,0 +1,154 @@
+import threading
+import time
+
+import pytest
+
+grpc = pytest.importorskip('grpc')
+
+from admission import BULK, INTERACTIVE, AdmissionController  # noqa: E402
+
+
+class Aborted(Exception):
+    pass
+
+
+class Context:
+    def __init__(self, traffic_class=None, time_remaining=None):
+        self.metadata = (('x-traffic-class', traffic_class),) if traffic_class else ()
+        self.remaining = time_remaining
+        self.code = None
+
+    def invocation_metadata(self):
+        return self.metadata
+
+    def time_remaining(self):
+        return self.remaining
+
+    def abort(self, code, details):
+        self.code = code
+        raise Aborted(details)
+
+
+def wait_for(condition):
+    for _ in range(1000):
+        if condition():
+            return
+        time.sleep(0.005)
+    raise AssertionError('timed out')
+
+
+class Holder:
+    """Holds a slot of the controller until released."""
+
+    def __init__(self, controller, content='Hann kom.', context=None, wait=True):
+        self.release = threading.Event()
+        self.entered = threading.Event()
+
+        def hold():
+            with controller.admit(content, context or Context()):
+                self.entered.set()
+                self.release.wait()
+        self.thread = threading.Thread(target=hold)
+        self.thread.start()
+        if wait:
+            assert self.entered.wait(5)
+
+    def stop(self):
+        self.release.set()
+        self.thread.join()
+
+
+def test_scheduling_order():
+    controller = AdmissionController(slots=1)
+    holder = Holder(controller)
+    order = []
+    requests = [('bulk', 'a', Context(BULK)),
+                ('late', 'a', Context(INTERACTIVE, 60)),
+                ('no deadline', 'a', Context(INTERACTIVE)),
+                ('early', 'a', Context(INTERACTIVE, 30)),
+                ('earliest', 'a', Context(INTERACTIVE, 20)),
+                ('cheap bulk', '', Context(BULK))]
+    threads = []
+    for name, content, context in requests:
+        def request(name=name, content=content, context=context):
+            with controller.admit(content, context):
+                order.append(name)
+        threads.append(threading.Thread(target=request))
+        threads[-1].start()
+        # queue the requests in this order
+        wait_for(lambda: sum(controller.stats()['waiting'].values()) == len(threads))
+    holder.stop()
+    for thread in threads:
+        thread.join()
+    assert order == ['earliest', 'early', 'late', 'no deadline', 'cheap bulk', 'bulk']
+    assert controller.stats() == {'running': {INTERACTIVE: 0, BULK: 0}, 'waiting': {INTERACTIVE: 0, BULK: 0},
+                                  'rejected': 0}
+
+
+def test_bulk_slots_and_queue():
+    controller = AdmissionController(slots=2, bulk_slots=1, max_bulk_queue=1)
+    bulk = Holder(controller, context=Context(BULK))
+    waiting = Holder(controller, context=Context(BULK), wait=False)
+    wait_for(lambda: controller.stats()['waiting'][BULK] == 1)
+    # the queue of bulk requests is full
+    context = Context(BULK)
+    with pytest.raises(Aborted):
+        with controller.admit('', context):
+            pass
+    assert context.code == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert controller.stats()['rejected'] == 1
+    # the other slot is still free for interactive requests
+    with controller.admit('', Context(INTERACTIVE)):
+        assert controller.stats()['running'] == {INTERACTIVE: 1, BULK: 1}
+    bulk.stop()
+    assert waiting.entered.wait(5)
+    assert controller.stats()['running'] == {INTERACTIVE: 0, BULK: 1}
+    waiting.stop()
+
+
+def test_deadline_passes_while_waiting():
+    controller = AdmissionController(slots=1)
+    holder = Holder(controller)
+    context = Context(INTERACTIVE, 0.05)
+    with pytest.raises(Aborted):
+        with controller.admit('', context):
+            pass
+    assert context.code == grpc.StatusCode.DEADLINE_EXCEEDED
+    assert controller.stats()['waiting'] == {INTERACTIVE: 0, BULK: 0}
+    holder.stop()
+    # the cancelled request doesn't take the slot
+    with controller.admit('', Context(INTERACTIVE, 1)):
+        assert controller.stats()['running'][INTERACTIVE] == 1
+
+
+def test_years_left_is_no_deadline():
+    controller = AdmissionController(slots=1)
+    with controller.admit('', Context(INTERACTIVE, 10 ** 9)):
+        pass
+
+
+def test_check_size():
+    controller = AdmissionController(max_content_bytes=10)
+    controller.check_size('abc', Context())
+    controller.check_size('á' * 5, Context())
+    context = Context()
+    with pytest.raises(Aborted):
+        controller.check_size('á' * 6, context)
+    assert context.code == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert controller.stats()['rejected'] == 1
+    AdmissionController().check_size('a' * 100000, Context())
+
+
+def test_traffic_class():
+    controller = AdmissionController(bulk_bytes=10)
+    assert controller.traffic_class('a' * 11, Context()) == BULK
+    assert controller.traffic_class('a' * 10, Context()) == INTERACTIVE
+    assert controller.traffic_class('a' * 11, Context(INTERACTIVE)) == INTERACTIVE
+    assert controller.traffic_class('a', Context(BULK)) == BULK
+    assert controller.traffic_class('a' * 11, Context('urgent')) == BULK
+
+
+def test_without_slots():
+    controller = AdmissionController()
+    with controller.admit('', Context(BULK)), controller.admit('', Context(BULK)):
+        assert controller.stats()['running'] == {INTERACTIVE: 0, BULK: 0}
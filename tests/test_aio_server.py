@@ -0,0 +1,182 @@
+import asyncio
+import threading
+
+import pytest
+
+grpc = pytest.importorskip('grpc')
+
+import service_extensions  # noqa: E402
+import tts_frontend_aio_server  # noqa: E402
+import tts_frontend_server  # noqa: E402
+from generated.messages import tts_frontend_message_pb2  # noqa: E402
+from generated.services import tts_frontend_service_pb2_grpc  # noqa: E402
+from google.protobuf import empty_pb2  # noqa: E402
+from normalizer_loader import LazyNormalizer  # noqa: E402
+
+
+class Client:
+    """Requests of a client stream, sent when the test puts them."""
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    def send(self, content):
+        self.queue.put_nowait(content)
+
+    def close(self):
+        self.queue.put_nowait(None)
+
+    async def requests(self):
+        while True:
+            content = await self.queue.get()
+            if content is None:
+                return
+            yield tts_frontend_message_pb2.NormalizeRequest(content=content)
+
+
+async def read_all(call):
+    responses = []
+    while True:
+        response = await call.read()
+        if response is grpc.aio.EOF:
+            return responses
+        responses.append(response)
+
+
+def serve(normalizer, threads, max_queue, test):
+    """Run test(channel) against an asyncio server with the given thread pool."""
+    async def run():
+        servicer = tts_frontend_server.TTSFrontendServicer(normalizer)
+        adapter = tts_frontend_aio_server.AsyncServicerAdapter(servicer, threads, max_queue)
+        server = grpc.aio.server()
+        service_extensions.add_extensions_to_server(adapter, server)
+        tts_frontend_service_pb2_grpc.add_TTSFrontendServicer_to_server(adapter, server)
+        port = server.add_insecure_port('127.0.0.1:0')
+        await server.start()
+        try:
+            async with grpc.aio.insecure_channel('127.0.0.1:{}'.format(port)) as channel:
+                await test(channel)
+        finally:
+            await server.stop(None)
+            adapter.executor.shutdown()
+    asyncio.run(asyncio.wait_for(run(), 60))
+
+
+class BlockingNormalizer:
+    """Normalizes once `release` is set, and counts its calls."""
+
+    def __init__(self, normalizer):
+        self.normalizer = normalizer
+        self.release = threading.Event()
+        self.calls = 0
+
+    def normalize(self, text, domain):
+        self.calls += 1
+        self.release.wait()
+        return self.normalizer.normalize(text, domain)
+
+
+def sentences(normalizer, text):
+    return [[sentence[0]] for part in text for sentence in normalizer.normalize(part, '')]
+
+
+def test_idle_streams_hold_no_thread(normalizer):
+    async def test(channel):
+        stub = service_extensions.TTSFrontendExtStub(channel)
+        clients = [Client() for _ in range(2)]
+        calls = [stub.NormalizeDocumentStream(client.requests()) for client in clients]
+        for client in clients:
+            client.send('Hann kom heim. Ég fór')
+        first = [await call.read() for call in calls]
+        # both streams wait for more text now, with as many streams as threads
+        response = await tts_frontend_service_pb2_grpc.TTSFrontendStub(channel).Normalize(
+            tts_frontend_message_pb2.NormalizeRequest(content='Hann kom 5 sinnum.'), timeout=5)
+        assert [[sentence] for sentence in response.normalized_sentence] == \
+            sentences(normalizer, ['Hann kom 5 sinnum.'])
+        for client in clients:
+            client.send(' út. Svo')
+            client.send(' kom hún.')
+            client.close()
+        for call, response in zip(calls, first):
+            assert [list(response.normalized_sentence)] + [list(r.normalized_sentence) for r in await read_all(call)] \
+                == sentences(normalizer, ['Hann kom heim.', 'Ég fór út.', 'Svo kom hún.'])
+    serve(normalizer, threads=2, max_queue=10, test=test)
+
+
+def test_cancelled_streams_end(normalizer):
+    async def test(channel):
+        stub = service_extensions.TTSFrontendExtStub(channel)
+        clients = [Client() for _ in range(3)]
+        calls = [stub.NormalizeDocumentStream(client.requests()) for client in clients]
+        for client in clients:
+            client.send('Hann kom heim. Ég fór')
+        for call in calls:
+            await call.read()
+            call.cancel()
+        response = await tts_frontend_service_pb2_grpc.TTSFrontendStub(channel).Normalize(
+            tts_frontend_message_pb2.NormalizeRequest(content='Hann kom.'), timeout=5)
+        assert len(response.normalized_sentence) == 1
+    serve(normalizer, threads=1, max_queue=10, test=test)
+
+
+def test_unary(normalizer):
+    async def test(channel):
+        stub = tts_frontend_service_pb2_grpc.TTSFrontendStub(channel)
+        request = tts_frontend_message_pb2.NormalizeRequest(content='Hann kom heim kl. 5. Ég fór')
+        response = await stub.Normalize(request, timeout=5)
+        assert [[sentence] for sentence in response.normalized_sentence] == sentences(normalizer, [request.content])
+        tokenwise = await stub.NormalizeTokenwise(request, timeout=5)
+        assert [[(token.original_token, token.normalized_token) for token in sentence.token_info]
+                for sentence in tokenwise.sentence] == normalizer.normalize_tokenwise(request.content, '')
+        streamed = await read_all(service_extensions.TTSFrontendExtStub(channel).NormalizeStream(request, timeout=5))
+        assert [list(response.normalized_sentence) for response in streamed] == \
+            sentences(normalizer, [request.content])
+    serve(normalizer, threads=2, max_queue=10, test=test)
+
+
+def test_busy_and_expired(normalizer):
+    blocking = BlockingNormalizer(normalizer)
+
+    async def test(channel):
+        stub = tts_frontend_service_pb2_grpc.TTSFrontendStub(channel)
+        request = tts_frontend_message_pb2.NormalizeRequest(content='Hann kom heim.')
+        running = asyncio.ensure_future(stub.Normalize(request, timeout=10))
+        await asyncio.sleep(0.1)
+        queued = asyncio.ensure_future(stub.Normalize(request, timeout=0.3))
+        await asyncio.sleep(0.1)
+        # the thread and the queue are taken
+        with pytest.raises(grpc.aio.AioRpcError) as error:
+            await stub.Normalize(request, timeout=5)
+        assert error.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+        await asyncio.sleep(0.3)
+        blocking.release.set()
+        assert len((await running).normalized_sentence) == 1
+        with pytest.raises(grpc.aio.AioRpcError) as error:
+            await queued
+        assert error.value.code() == grpc.StatusCode.DEADLINE_EXCEEDED
+        # the expired request was dropped before it got to the normalizer
+        assert len((await stub.Normalize(request, timeout=5)).normalized_sentence) == 1
+        assert blocking.calls == 2
+    serve(blocking, threads=1, max_queue=1, test=test)
+
+
+def test_unavailable_while_loading(normalizer):
+    loaded = threading.Event()
+    lazy = LazyNormalizer(lambda: loaded.wait() and normalizer)
+
+    async def test(channel):
+        stub = tts_frontend_service_pb2_grpc.TTSFrontendStub(channel)
+        assert (await stub.GetVersion(empty_pb2.Empty(), timeout=5)).version == \
+            tts_frontend_message_pb2.ABI_VERSION.ABI_VERSION_CURRENT
+        request = tts_frontend_message_pb2.NormalizeRequest(content='Hann kom heim.')
+        with pytest.raises(grpc.aio.AioRpcError) as error:
+            await stub.Normalize(request, timeout=5)
+        assert error.value.code() == grpc.StatusCode.UNAVAILABLE
+        loaded.set()
+        await asyncio.get_running_loop().run_in_executor(None, lazy.ready.wait, 5)
+        assert len((await stub.Normalize(request, timeout=5)).normalized_sentence) == 1
+    lazy.start()
+    try:
+        serve(lazy, threads=1, max_queue=1, test=test)
+    finally:
+        loaded.set()
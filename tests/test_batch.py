@@ -0,0 +1,60 @@
+from concurrent import futures
+
+import pytest
+
+grpc = pytest.importorskip('grpc')
+
+import normalizer_loader  # noqa: E402
+import service_extensions  # noqa: E402
+import tts_frontend_server  # noqa: E402
+from generated.messages import tts_frontend_message_pb2  # noqa: E402
+from normalizer_pool import NormalizerPool  # noqa: E402
+from token_columns import TokenColumns  # noqa: E402
+
+DOMAINS = [('', tts_frontend_message_pb2.NORM_DOMAIN_OTHER), ('sport', tts_frontend_message_pb2.NORM_DOMAIN_SPORT)]
+
+
+@pytest.fixture(scope='module')
+def snapshot(normalizer, tmp_path_factory):
+    """The test normalizer as a snapshot, which the spawned pool processes load instead of building a Normalizer."""
+    path = str(tmp_path_factory.mktemp('snapshot') / 'normalizer.pickle')
+    normalizer_loader.write_snapshot(normalizer, path)
+    return path
+
+
+def test_pool_keeps_input_order(normalizer, snapshot, texts):
+    pool = NormalizerPool(2, chunk_size=3, snapshot_path=snapshot)
+    items = [(text, DOMAINS[index % 2][0]) for index, text in enumerate(texts[:50])]
+    try:
+        assert list(pool.imap('normalize', iter(items))) == [normalizer.normalize(*item) for item in items]
+        tokenwise = list(pool.imap('normalize_tokenwise', iter(items)))
+    finally:
+        pool.shutdown()
+    assert all(isinstance(result, TokenColumns) for result in tokenwise)
+    assert [list(result) for result in tokenwise] == [normalizer.normalize_tokenwise(*item) for item in items]
+
+
+def test_batch_rpcs(normalizer, snapshot, texts):
+    servicer = tts_frontend_server.TTSFrontendServicer(normalizer, batch_processes=2, snapshot_path=snapshot)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    service_extensions.add_extensions_to_server(servicer, server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+    contents = texts[:40]
+    requests = [tts_frontend_message_pb2.NormalizeRequest(content=content, domain=DOMAINS[index % 2][1])
+                for index, content in enumerate(contents)]
+    try:
+        with grpc.insecure_channel('127.0.0.1:{}'.format(port)) as channel:
+            stub = service_extensions.TTSFrontendExtStub(channel)
+            responses = list(stub.NormalizeBatch(iter(requests), timeout=60))
+            tokenwise = list(stub.NormalizeTokenwiseBatch(iter(requests), timeout=60))
+    finally:
+        server.stop(None)
+        servicer.batch_pool.shutdown()
+    expected = [normalizer.normalize(content, DOMAINS[index % 2][0]) for index, content in enumerate(contents)]
+    assert [list(response.normalized_sentence) for response in responses] == \
+        [[sentence[0] for sentence in result] for result in expected]
+    expected = [normalizer.normalize_tokenwise(content, DOMAINS[index % 2][0])
+                for index, content in enumerate(contents)]
+    assert [[[(token.original_token, token.normalized_token) for token in sentence.token_info]
+             for sentence in response.sentence] for response in tokenwise] == expected
@@ -0,0 +1,65 @@
+import json
+import os
+import sys
+from concurrent import futures
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import common  # noqa: E402
+
+
+def test_latency_summary():
+    summary = common.latency_summary([0.001 * value for value in range(100, 0, -1)])
+    assert summary['count'] == 100
+    assert summary['mean_ms'] == pytest.approx(50.5)
+    assert (summary['p50_ms'], summary['p99_ms'], summary['max_ms']) == pytest.approx((51, 99, 100))
+    assert common.latency_summary([]) == {'count': 0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0,
+                                          'p999_ms': 0.0, 'max_ms': 0.0}
+
+
+def test_corpus_and_results(tmp_path, capsys):
+    corpus = common.load_corpus()
+    assert corpus and all(paragraph == paragraph.strip() for paragraph in corpus)
+    output = str(tmp_path / 'results.json')
+    common.write_results('test', {'runs': [1]}, output)
+    with open(output, encoding='utf-8') as f:
+        document = json.load(f)
+    assert (document['benchmark'], document['results']) == ('test', {'runs': [1]})
+    assert json.loads(capsys.readouterr().out) == document
+
+
+@pytest.fixture
+def calls(normalizer):
+    grpc = pytest.importorskip('grpc')
+    import service_extensions
+    import tts_frontend_server
+    from generated.services import tts_frontend_service_pb2_grpc
+
+    servicer = tts_frontend_server.TTSFrontendServicer(normalizer, batch_processes=1)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    service_extensions.add_extensions_to_server(servicer, server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+    channel = grpc.insecure_channel('127.0.0.1:{}'.format(port))
+    yield [tts_frontend_service_pb2_grpc.TTSFrontendStub(channel).NormalizeTokenwise]
+    channel.close()
+    server.stop(None)
+
+
+def test_load_generator(calls):
+    load_test = pytest.importorskip('load_test')
+    from generated.messages import tts_frontend_message_pb2
+
+    requests = [tts_frontend_message_pb2.NormalizeRequest(content=paragraph) for paragraph in common.load_corpus()]
+    closed = load_test.closed_loop(calls, requests, 2, 0.3, {'timeout': 10})
+    assert closed['count'] > 0 and closed['errors'] == {}
+    assert closed['throughput_rps'] > 0
+    opened = load_test.open_loop(calls, requests, 50, 0.2, {'timeout': 10})
+    assert opened['count'] == 10 and opened['errors'] == {}
+    # failed requests are counted by status code
+    failed = load_test.open_loop(calls, requests, 50, 0.1, {'timeout': 10, 'metadata': [('x-domain', 'unknown')]})
+    assert (failed['count'], failed['errors']) == (0, {'INVALID_ARGUMENT': 5})
+    failed = load_test.closed_loop(calls, requests, 2, 0.1, {'timeout': 10, 'metadata': [('x-domain', 'unknown')]})
+    assert failed['count'] == 0 and list(failed['errors']) == ['INVALID_ARGUMENT']
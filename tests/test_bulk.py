@@ -0,0 +1,166 @@
+import glob
+import json
+import os
+
+import pytest
+
+import corpus_shards
+import tts_frontend_bulk
+from tts_frontend_bulk import BulkNormalizer, InputError, normalize_sharded, read_records
+
+LINES = ['Hann kom heim kl. 5 í gær.', 'Ég fór á fund nr. 3. Svo fór ég heim.', 'hún las bækur', '',
+         'Fundurinn hófst 12.5 km frá bænum, sjá bls. 3!', 'Þau komu 2021 og fóru aftur.']
+
+
+class Killed(BaseException):
+    """Stands in for the job being killed."""
+
+
+@pytest.fixture
+def bulk_normalizer(normalizer, monkeypatch):
+    monkeypatch.setattr(tts_frontend_bulk, 'load_normalizer', lambda snapshot_path, compiled_rules: normalizer)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    path = str(tmp_path / 'corpus.txt')
+    with open(path, 'w', encoding='utf-8') as f:
+        for index in range(60):
+            f.write(LINES[index % len(LINES)] + '\n')
+    return path
+
+
+def shard_output(directory):
+    output = []
+    for path in sorted(glob.glob(os.path.join(directory, 'shard-*.jsonl'))):
+        with open(path, encoding='utf-8') as f:
+            output.extend(json.loads(line) for line in f)
+    return output
+
+
+def count_shards(monkeypatch, kill_at=None):
+    calls = []
+    normalize_shard = tts_frontend_bulk._normalize_shard
+
+    def counted(*args):
+        nonlocal kill_at
+        calls.append(args[1]['index'])
+        if len(calls) == kill_at:
+            # once only, the next run resumes
+            kill_at = None
+            raise Killed()
+        return normalize_shard(*args)
+    monkeypatch.setattr(tts_frontend_bulk, '_normalize_shard', counted)
+    return calls
+
+
+def test_sharded_output(bulk_normalizer, normalizer, corpus, tmp_path):
+    manifest = normalize_sharded(corpus, str(tmp_path / 'out'), 200)
+    assert len(manifest.shards) > 5
+    assert all(shard['done'] for shard in manifest.shards)
+    output = shard_output(str(tmp_path / 'out'))
+    assert len(output) == 60
+    offset = 0
+    for index, record in enumerate(output):
+        line = LINES[index % len(LINES)]
+        assert record['offset'] == offset
+        assert record['sentences'] == [[list(pair) for pair in sentence]
+                                       for sentence in normalizer.normalize_tokenwise(line, '')]
+        offset += len(line.encode('utf-8')) + 1
+
+
+def test_resume_after_kill(bulk_normalizer, corpus, tmp_path, monkeypatch):
+    directory = str(tmp_path / 'out')
+    calls = count_shards(monkeypatch, kill_at=4)
+    with pytest.raises(Killed):
+        normalize_sharded(corpus, directory, 200)
+    # the shards finished before the kill are in the manifest on disk
+    manifest = corpus_shards.Manifest.load(directory)
+    assert [shard['index'] for shard in manifest.shards if shard['done']] == calls[:3]
+    assert not glob.glob(os.path.join(directory, 'shard-00003.jsonl'))
+
+    del calls[:]
+    manifest = normalize_sharded(corpus, directory, 200)
+    assert calls == list(range(3, len(manifest.shards)))
+    assert all(shard['done'] for shard in manifest.shards)
+    normalize_sharded(corpus, str(tmp_path / 'whole'), 200)
+    assert shard_output(directory) == shard_output(str(tmp_path / 'whole'))
+
+
+def test_bad_line_keeps_finished_shards(bulk_normalizer, corpus, tmp_path):
+    with open(corpus, 'ab') as f:
+        bad_offset = f.tell()
+        f.write(b'ein\xe1 l\xednan\n')
+        f.write('Hann kom heim.\n'.encode('utf-8'))
+    directory = str(tmp_path / 'out')
+    with pytest.raises(InputError, match='byte offset {}:'.format(bad_offset)):
+        normalize_sharded(corpus, directory, 200)
+    manifest = corpus_shards.Manifest.load(directory)
+    assert [shard['done'] for shard in manifest.shards] == [shard['end'] <= bad_offset for shard in manifest.shards]
+    assert manifest.pending() == [shard for shard in manifest.shards if shard['end'] > bad_offset]
+
+
+def test_missing_shard_output_is_redone(bulk_normalizer, corpus, tmp_path, monkeypatch):
+    directory = str(tmp_path / 'out')
+    normalize_sharded(corpus, directory, 200)
+    os.remove(os.path.join(directory, 'shard-00002.jsonl'))
+    calls = count_shards(monkeypatch)
+    normalize_sharded(corpus, directory, 200)
+    assert calls == [2]
+
+
+def test_manifest_of_another_job(bulk_normalizer, corpus, tmp_path):
+    directory = str(tmp_path / 'out')
+    normalize_sharded(corpus, directory, 200)
+    with pytest.raises(ValueError, match='another job'):
+        normalize_sharded(corpus, directory, 300)
+
+
+@pytest.mark.parametrize('line,error', [
+    ('[1, 2]', 'expected a JSON object, got list'),
+    ('{"text": 5}', "expected a string in 'text', got int"),
+    ('{"text": ["Hann kom."]}', "expected a string in 'text', got list"),
+    ('{"text": "Hann kom.", "domain": {"name": "sport"}}', "expected a string in 'domain', got dict"),
+    ('{"text": "Hann kom."', 'Expecting'),
+])
+def test_bad_jsonl_record(line, error):
+    lines = enumerate(['{"id": 1, "text": "Hann kom.", "domain": null}', '', line], 1)
+    records = read_records(((key, line.encode('utf-8')) for key, line in lines), 'jsonl', path='in.jsonl')
+    assert next(records) == (1, 1, 'Hann kom.', '')
+    with pytest.raises(InputError, match='^in.jsonl: line 3: ' + error):
+        next(records)
+
+
+def test_same_as_one_call_per_document(bulk_normalizer, normalizer, texts):
+    bulk = BulkNormalizer(batch_sentences=7)
+    records = [(index, None, text, 'sport' if index % 3 else '') for index, text in enumerate(texts[:300] + texts[:50])]
+    results = list(bulk.normalize(iter(records), batch_records=64))
+    assert [record for record, _ in results] == records
+    assert [normalized for _, normalized in results] == [normalizer.normalize_tokenwise(text, domain)
+                                                         for _, _, text, domain in records]
+    counts = bulk.counts
+    assert counts['sentences'] == counts['repeated'] + counts['plain'] + counts['cached'] + counts['normalized']
+    # the repeated documents of later batches come from the cache
+    assert counts['cached'] > 0 and counts['plain'] > 0 and counts['repeated'] > 0
+
+
+def test_main_jsonl(bulk_normalizer, normalizer, tmp_path, capsys):
+    source = tmp_path / 'in.jsonl'
+    documents = [{'id': 'a', 'body': LINES[0]}, {'id': 7, 'body': LINES[1], 'domain': 'sport'}, {'body': LINES[2]}]
+    source.write_text('\n'.join(json.dumps(document) for document in documents) + '\n\n', encoding='utf-8')
+    output = tmp_path / 'out.jsonl'
+    tts_frontend_bulk.main([str(source), str(output), '--format', 'jsonl', '--text-field', 'body'])
+    with open(str(output), encoding='utf-8') as f:
+        written = [json.loads(line) for line in f]
+    assert [(document.get('line'), document.get('id')) for document in written] == [(1, 'a'), (2, 7), (3, None)]
+    assert [document['sentences'] for document in written] == [
+        [[list(pair) for pair in sentence] for sentence in normalizer.normalize_tokenwise(document['body'],
+                                                                                         document.get('domain', ''))]
+        for document in documents]
+
+    with open(str(source), 'a', encoding='utf-8') as f:
+        f.write('{"body": 5}\n')
+    with pytest.raises(SystemExit) as error:
+        tts_frontend_bulk.main([str(source), str(output), '--format', 'jsonl', '--text-field', 'body'])
+    assert error.value.code == 1
+    assert "line 5: expected a string in 'body', got int" in capsys.readouterr().err
@@ -0,0 +1,141 @@
+import json
+import os
+import re
+
+import pytest
+
+from domain_packs import WORD, DomainNormalizer, DomainPackError, DomainRegistry, UnknownDomain
+
+PACKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'domain_packs')
+
+# text for each shipped pack with something for every one of its rules. No rule's word comes first in a
+# sentence or right before a number, where the normalizer may change it for reasons of its own
+EXAMPLES = {
+    'weather': 'Loftþrýstingur er 1012 hPa eða 1012 mb á Vestfj. og höfuðborgarsv. en hiti um frostm. á '
+               'Norðurl. og Suðausturl.',
+    'finance': 'Verð hlutabr. lækkaði um 25 bp. eða 3 pkt. á 2. ársfj. og EBITDA var 5 mö.kr. eða 2 þús.kr. á hlut.',
+    'legal': 'Sjá augl. um rgl. og reglug. skv. 3. málsgr. og 2. tölul. og 1. málsl. og a-lið 2. stafl. þar sem '
+             'lögm. og hæstv. ráðherra vísuðu til ákv. til brb. í Hrd. og héraðsd. og ræðu þm. í gær.',
+}
+
+
+def words(sentences):
+    return [word for sentence in sentences for word in WORD.findall(sentence)]
+
+
+def unmatched_rules(pack, words):
+    return [pattern for table in pack.tables for pattern in table.source
+            if not any(re.search(pattern, word) for word in words)]
+
+
+def write_json(directory, name, data):
+    with open(os.path.join(str(directory), name), 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+@pytest.fixture
+def registry():
+    return DomainRegistry(PACKS_DIR)
+
+
+def test_examples_cover_shipped_packs(registry):
+    assert sorted(EXAMPLES) == registry.names()
+
+
+@pytest.mark.parametrize('name', sorted(EXAMPLES))
+def test_shipped_pack_changes_normalizer_output(normalizer, registry, name):
+    base = registry.get(name).base
+    normalized = [sentence[0] for sentence in normalizer.normalize(EXAMPLES[name], base)]
+    rewritten = [sentence[0] for sentence in DomainNormalizer(normalizer, registry).normalize(EXAMPLES[name], name)]
+    assert rewritten != normalized
+    assert unmatched_rules(registry.get(name), words(normalized)) == []
+
+
+@pytest.mark.parametrize('name', sorted(EXAMPLES))
+def test_shipped_rules_survive_abbreviation_pass(splitter, replace_abbreviations, registry, name):
+    # rules for what the normalizer expands itself never match its output
+    pack = registry.get(name)
+    abbreviated = [replace_abbreviations(sentence, pack.base) for sentence in splitter.split(EXAMPLES[name])]
+    assert unmatched_rules(pack, words(abbreviated)) == []
+
+
+def test_builtin_and_unknown_domains(tmp_path):
+    write_json(tmp_path, 'weather.json', {'rules': {'^a$': 'b'}})
+    registry = DomainRegistry(str(tmp_path))
+    for name in ('', 'sport', 'other', 'snow', '../weather', 'Weather'):
+        with pytest.raises(UnknownDomain):
+            registry.get(name)
+    assert registry.get('weather').rewrite('a a c') == 'b b c'
+
+
+def test_reload(tmp_path):
+    write_json(tmp_path, 'weather.json', {'rules': {'^a$': 'b'}})
+    registry = DomainRegistry(str(tmp_path), reload_interval=0)
+    pack = registry.get('weather')
+    assert registry.get('weather') is pack
+    write_json(tmp_path, 'weather.json', {'rules': {'^a$': 'bb'}})
+    reloaded = registry.get('weather')
+    assert reloaded is not pack
+    assert reloaded.version != pack.version
+    assert reloaded.rewrite('a') == 'bb'
+    assert pack.rewrite('a') == 'b'
+    assert registry.stats()['loads'] == 1
+    assert registry.stats()['reloads'] == 1
+
+
+def test_reload_interval(tmp_path):
+    write_json(tmp_path, 'weather.json', {'rules': {'^a$': 'b'}})
+    registry = DomainRegistry(str(tmp_path), reload_interval=3600)
+    pack = registry.get('weather')
+    write_json(tmp_path, 'weather.json', {'rules': {'^a$': 'bb'}})
+    assert registry.get('weather') is pack
+    assert registry.stats()['reloads'] == 0
+
+
+def test_table_change_reloads_pack(tmp_path):
+    os.mkdir(str(tmp_path / 'tables'))
+    write_json(tmp_path, 'tables/units.json', {'^hPa$': 'hektópasköl'})
+    write_json(tmp_path, 'weather.json', {'tables': ['tables/units.json']})
+    write_json(tmp_path, 'sea.json', {'tables': ['tables/units.json']})
+    registry = DomainRegistry(str(tmp_path), reload_interval=0)
+    assert registry.get('weather').rewrite('hPa') == 'hektópasköl'
+    registry.get('sea')
+    assert registry.stats()['tables'] == 1
+    write_json(tmp_path, 'tables/units.json', {'^hPa$': 'hektópasköl', '^mb$': 'millibör'})
+    assert registry.get('weather').rewrite('mb') == 'millibör'
+    assert registry.stats()['reloads'] == 1
+
+
+def test_lru_eviction(tmp_path):
+    for name in ('one', 'two', 'three'):
+        write_json(tmp_path, name + '.json', {'rules': {'^a$': name}})
+    registry = DomainRegistry(str(tmp_path), max_domains=2)
+    one = registry.get('one')
+    registry.get('two')
+    assert registry.get('one') is one
+    registry.get('three')
+    assert registry.stats() == {'loaded': 2, 'loads': 3, 'reloads': 0, 'evictions': 1, 'tables': 0}
+    # 'two' was the least recently used
+    assert registry.get('one') is one
+    assert registry.get('two').rewrite('a') == 'two'
+    assert registry.stats()['loads'] == 4
+    assert registry.stats()['evictions'] == 2
+
+
+@pytest.mark.parametrize('broken', ['{"rules": {"^a$": ', '[]', '{"base": "weather"}', '{"rules": {"(": "b"}}',
+                                    '{"rules": {"^a$": 1}}', '{"tables": ["tables/missing.json"]}'])
+def test_broken_reload_keeps_old_pack(tmp_path, broken):
+    write_json(tmp_path, 'weather.json', {'rules': {'^a$': 'b'}})
+    registry = DomainRegistry(str(tmp_path), reload_interval=0)
+    pack = registry.get('weather')
+    with open(str(tmp_path / 'weather.json'), 'w', encoding='utf-8') as f:
+        f.write(broken)
+    assert registry.get('weather') is pack
+    assert pack.rewrite('a') == 'b'
+    assert registry.stats()['reloads'] == 0
+    # a new registry has no pack to fall back on
+    with pytest.raises(DomainPackError):
+        DomainRegistry(str(tmp_path)).get('weather')
+    write_json(tmp_path, 'weather.json', {'rules': {'^a$': 'bbb'}})
+    assert registry.get('weather').rewrite('a') == 'bbb'
+    assert registry.stats()['reloads'] == 1
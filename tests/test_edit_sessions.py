@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from conftest import WORDS, random_text
+from edit_sessions import EditError, EditSessions, UnknownSession
+
+
+def as_lists(normalized):
+    return [list(sentence) for sentence in normalized]
+
+
+def apply_splice(document, splice):
+    document[splice.start:splice.start + splice.removed] = as_lists(splice.sentences)
+    assert len(document) == splice.count
+
+
+def random_edit(rng, text):
+    offset = rng.randint(0, len(text))
+    delete = rng.randint(0, min(len(text) - offset, 12)) if rng.random() < 0.5 else 0
+    content = rng.choice(['', ' ', '.', '?', '!', ' ' + rng.choice(WORDS), rng.choice(WORDS) + ' ',
+                          random_text(rng, 4), rng.choice('aJ. "')])
+    return offset, delete, content
+
+
+def test_edits_like_full_normalization(normalizer, splitter):
+    rng = random.Random(0)
+    for session_number in range(300):
+        sessions = EditSessions(normalizer, splitter)
+        text = random_text(rng, 25)
+        document = []
+        apply_splice(document, sessions.edit('s', text, ''))
+        for _ in range(10):
+            offset, delete, content = random_edit(rng, text)
+            text = text[:offset] + content + text[offset + delete:]
+            apply_splice(document, sessions.edit('s', content, '', offset, delete))
+            assert document == as_lists(normalizer.normalize_tokenwise(text, '')), (session_number, text)
+
+
+def test_review_example(normalizer, splitter):
+    sessions = EditSessions(normalizer, splitter)
+    document = []
+    apply_splice(document, sessions.edit('s', 'nr. kom? Ég Jón…', ''))
+    apply_splice(document, sessions.edit('s', '! ', '', 9, 0))
+    assert document == as_lists(normalizer.normalize_tokenwise('nr. kom? ! Ég Jón…', ''))
+
+
+def test_only_changed_sentences_returned(normalizer, splitter):
+    sessions = EditSessions(normalizer, splitter)
+    text = 'Hann kom. Svo fór hann. Ég heiti Jón.'
+    sessions.edit('s', text, '')
+    splice = sessions.edit('s', 'ekki ', '', text.index('fór'), 0)
+    assert (splice.start, splice.removed, splice.count) == (1, 1, 3)
+    assert as_lists(splice.sentences) == as_lists(normalizer.normalize_tokenwise('Svo ekki fór hann.', ''))
+
+
+def test_errors(normalizer, splitter):
+    sessions = EditSessions(normalizer, splitter)
+    with pytest.raises(UnknownSession):
+        sessions.edit('s', 'x', '', 0, 0)
+    sessions.edit('s', 'Hann kom.', '')
+    with pytest.raises(EditError):
+        sessions.edit('s', 'x', '', 5, 10)
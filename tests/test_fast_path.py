@@ -0,0 +1,119 @@
+import importlib
+import os
+import random
+import re
+
+import pytest
+
+from fast_path import UNSAFE_WORDS, FastPathNormalizer
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'corpus.txt')
+DOMAINS = ('', 'sport', 'other')
+
+PLAIN_WORDS = ['hann', 'hún', 'það', 'fór', 'heim', 'í', 'dag', 'og', 'við', 'sáum', 'bílinn', 'á', 'morgun', 'er',
+               'gott', 'veður', 'úti', 'þau', 'eru', 'að', 'lesa', 'bækur', 'borðaði', 'fisk', 'með', 'kartöflum',
+               'skólinn', 'byrjar', 'eftir', 'viku', 'ég', 'ætla', 'til', 'sjórinn', 'var', 'kaldur', 'hestarnir',
+               'hlupu', 'yfir', 'túnið', 'kaffi', 'barnið', 'svaf', 'vel', 'klæddi', 'sig', 'marga', 'janúar',
+               'desember', 'kraftur', 'mánuði', 'stofan', 'fimm', 'eitt', 'sex', 'ísland']
+
+# words that look like plain words but that the normalizer may expand: units and abbreviations without
+# their period, names of months and weekdays, 'kl' run into a number word, and tokens without vowels
+NEAR_MISSES = ['km', 'kg', 'cm', 'mm', 'ml', 'dl', 'gr', 'kr', 'kl', 'klst', 'mín', 'sek', 'stk', 'ma', 'millj',
+               'þús', 'kw', 'osfrv', 'þeas', 'aths', 'ath', 'nr', 'bls', 'skv', 'sbr', 'etv', 'ofl', 'uppl',
+               'rvík', 'ísl', 'jan', 'feb', 'mar', 'okt', 'sept', 'ág', 'mán', 'þri', 'fös', 'kleitt', 'klsex',
+               'kltuttugu', 'st', 'hf', 'þ', 'kk', 'vs', 'nk', 'kvk', 'sms', 'pgr', 'xl',
+               # capitalized, and words of capitals, which the normalizer spells out
+               'Km', 'Kl', 'Jan', 'Bls', 'Þús', 'Osfrv', 'Rvík', 'KR', 'RÚV', 'FH', 'Í', 'ÍSLAND', 'HeIm']
+
+
+def as_lists(normalized):
+    return [list(sentence) for sentence in normalized]
+
+
+def sentences(rng, count, near_misses=0.2):
+    for _ in range(count):
+        words = [rng.choice(NEAR_MISSES if rng.random() < near_misses else PLAIN_WORDS)
+                 for _ in range(rng.randint(1, 12))]
+        # a single capital is spelled out, or an initial, and is not plain
+        words = [word.capitalize() if len(word) > 1 and rng.random() < 0.2 else word for word in words]
+        words[0] = words[0].capitalize() if len(words[0]) > 1 and rng.random() < 0.5 else words[0]
+        yield ' '.join(words) + rng.choice(['', '', '.', '?', '!', ' .'])
+
+
+def capitalized(words):
+    return [word.capitalize() for word in words]
+
+
+@pytest.fixture
+def fast_path(normalizer, splitter):
+    return FastPathNormalizer(normalizer, splitter)
+
+
+def test_plain_sentences(normalizer, fast_path):
+    for sentence in sentences(random.Random(0), 500, near_misses=0):
+        assert fast_path.is_plain(sentence), sentence
+        assert as_lists(fast_path.normalize_tokenwise(sentence, '')) == \
+            as_lists(normalizer.normalize_tokenwise(sentence, '')), sentence
+
+
+@pytest.mark.parametrize('word', NEAR_MISSES)
+def test_near_misses_not_plain(fast_path, word):
+    assert not fast_path.is_plain('hann sá {} þar'.format(word))
+    assert not fast_path.is_plain('{} sá hann.'.format(word))
+
+
+@pytest.mark.parametrize('sentence', ['.', '!', 'hann kom?!', 'hann kom..', 'hann, kom', 'hann. kom', 'hann kom …'])
+def test_punctuation_not_plain(fast_path, sentence):
+    assert not fast_path.is_plain(sentence)
+
+
+def test_tokens_are_the_tokenizers(splitter, fast_path):
+    for sentence in sentences(random.Random(2), 500, near_misses=0):
+        assert fast_path.plain_tokens(sentence) == splitter.tokenizer.detect_sentences(sentence)[0].split(), sentence
+
+
+def test_same_as_normalizer(normalizer, fast_path):
+    rng = random.Random(1)
+    for _ in range(500):
+        text = '. '.join(sentences(rng, rng.randint(1, 4)))
+        assert as_lists(fast_path.normalize_tokenwise(text, '')) == \
+            as_lists(normalizer.normalize_tokenwise(text, '')), text
+
+
+def rule_words(module):
+    """The words in the patterns of the rule tables of one of the normalizer's modules, as written and capitalized."""
+    words = set()
+    for name, table in vars(module).items():
+        if not name.startswith('_') and isinstance(table, dict) and table and all(isinstance(pattern, str) for pattern in table):
+            for pattern in table:
+                words.update(re.findall('[^\\W\\d_]+', pattern))
+    return sorted(words | {word.lower() for word in words} | {word.capitalize() for word in words})
+
+
+def test_plain_words_pass_the_normalizers_rules(splitter, replace_abbreviations):
+    fast_path = FastPathNormalizer(None, splitter)
+    abbr_functions = importlib.import_module('regina_normalizer.abbr_functions')
+    words = PLAIN_WORDS + NEAR_MISSES + sorted(UNSAFE_WORDS) + rule_words(abbr_functions)
+    words = [word for word in words + capitalized(words) if fast_path.is_plain_word(word)]
+    assert len(words) > 900
+    for domain in DOMAINS:
+        for end in ('.', '?', '!'):
+            sentence = ' '.join(words) + ' ' + end
+            changed = replace_abbreviations(sentence, domain).split()
+            assert [(word, new) for word, new in zip(sentence.split(), changed) if word != new] == []
+            assert len(changed) == len(words) + 1
+
+
+def test_punctuation_passes_the_symbol_rules(replace_abbreviations):
+    # the normalizer runs its symbol rules on every token that doesn't start with a letter
+    abbr_functions = importlib.import_module('regina_normalizer.abbr_functions')
+    symbols_dict = importlib.import_module('regina_normalizer.symbols_dict')
+    for end in ('.', '?', '!'):
+        assert abbr_functions.replace_all(end, symbols_dict.symb_dict, '[^A-ZÁÐÉÍÓÚÝÞÆÖa-záðéíóúýþæö]') == end
+
+
+def test_corpus_share(splitter):
+    fast_path = FastPathNormalizer(None, splitter)
+    with open(CORPUS, encoding='utf-8') as f:
+        sentences = [sentence for line in f if line.strip() for sentence in splitter.split(line.strip())]
+    assert sum(map(fast_path.is_plain, sentences)) / len(sentences) > 0.2
@@ -0,0 +1,81 @@
+import pytest
+
+import lexicon
+from lexicon import BinaryLexicon, TsvLexicon, build_lexicon, main, open_lexicon, read_tsv
+
+ENTRIES = [('hestur', 'h E s t Y r'), ('hús', 'h u: s'), ('a', 'a:'), ('aa', 'a: a'), ('abcdefgh', 'a p'),
+           ('abcdefghi', 'a p i'), ('abcdefgh\x00', 'n'), ('ö', 'œ:'), ('Ísland', 'i s l a n t'), ('hús', 'x')]
+MISSING = ['', 'hes', 'hestu', 'hesturinn', 'abcdefg', 'abcdefghij', 'b', 'zzz', 'ísland', 'öö']
+
+
+def tsv(path, entries):
+    path.write_text(''.join('{}\t{}\n'.format(word, transcription) for word, transcription in entries),
+                    encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def binary(tmp_path):
+    path = str(tmp_path / 'lexicon.bin')
+    assert build_lexicon(ENTRIES, path) == len(ENTRIES) - 1
+    lex = BinaryLexicon(path)
+    yield lex
+    lex.close()
+
+
+def test_binary_lookup(binary):
+    assert len(binary) == len(ENTRIES) - 1
+    # the first transcription of a word wins
+    assert binary.get('hús') == 'h u: s'
+    for word, transcription in ENTRIES[:-1]:
+        assert binary.get(word) == transcription
+    for word in MISSING:
+        assert binary.get(word) is None
+        assert word not in binary
+
+
+def test_tsv_lookup(tmp_path):
+    entries = sorted(ENTRIES[:-1], key=lambda entry: entry[0].encode('utf-8'))
+    lex = TsvLexicon(tsv(tmp_path / 'lexicon.tsv', entries))
+    for word, transcription in entries:
+        assert lex.get(word) == transcription
+    for word in MISSING:
+        assert lex.get(word) is None
+    lex.close()
+    empty = TsvLexicon(tsv(tmp_path / 'empty.tsv', []))
+    assert empty.get('hús') is None
+
+
+def test_open_lexicon(tmp_path, binary):
+    assert isinstance(open_lexicon(binary.path), BinaryLexicon)
+    assert isinstance(open_lexicon(tsv(tmp_path / 'lexicon.tsv', ENTRIES[:2])), TsvLexicon)
+    with pytest.raises(ValueError):
+        BinaryLexicon(tsv(tmp_path / 'other.tsv', ENTRIES[:2]))
+
+
+def test_main(tmp_path):
+    source = tsv(tmp_path / 'lexicon.tsv', ENTRIES + [('', 'x'), ('ekkert', '')])
+    with open(source, 'a', encoding='utf-8') as f:
+        f.write('án tabs\nbil\t  b I   l \n')
+    output = str(tmp_path / 'lexicon.bin')
+    main([source, output])
+    lex = open_lexicon(output)
+    assert lex.get('bil') == 'b I l'
+    assert lex.get('ekkert') == ''
+    assert lex.get('án tabs') is None
+    assert dict(read_tsv(source))['hestur'] == 'h E s t Y r'
+
+
+def test_too_long_entry(tmp_path):
+    path = tmp_path / 'lexicon.bin'
+    with pytest.raises(ValueError):
+        build_lexicon([('hús', 'x' * (lexicon.MAX_LENGTH + 1))], str(path))
+    assert not path.exists()
+
+
+def test_too_large_lexicon(tmp_path, monkeypatch):
+    monkeypatch.setattr(lexicon, 'MAX_OFFSET', 100)
+    path = tmp_path / 'lexicon.bin'
+    with pytest.raises(ValueError):
+        build_lexicon([('orð{}'.format(index), 'o r D') for index in range(10)], str(path))
+    assert not path.exists()
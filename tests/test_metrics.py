@@ -0,0 +1,262 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent import futures
+
+import pytest
+
+grpc = pytest.importorskip('grpc')
+
+import metrics  # noqa: E402
+import profiling  # noqa: E402
+import service_extensions  # noqa: E402
+import tts_frontend_server  # noqa: E402
+from admission import AdmissionController  # noqa: E402
+from generated.messages import tts_frontend_message_pb2  # noqa: E402
+from generated.services import tts_frontend_service_pb2_grpc  # noqa: E402
+
+
+def get(server, path):
+    host, port = server.server_address[:2]
+    try:
+        with urllib.request.urlopen('http://{}:{}{}'.format(host, port, path), timeout=10) as response:
+            return response.status, response.read().decode('utf-8')
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def sample(metric, name):
+    """The value of the sample `name`, e.g. 'test_total{method="Normalize"}', in the rendered metric, or 0."""
+    for line in metric.render():
+        if line.rsplit(' ', 1)[0] == name:
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+@pytest.fixture
+def http_server():
+    servers = []
+
+    def start(*args, **kwargs):
+        server = metrics.start_http_server(0, *args, **kwargs)
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_counters_from_many_threads():
+    counter = metrics.Counter('test_total', 'Test.', ('method',))
+
+    def count():
+        for _ in range(1000):
+            counter.labels('Normalize').inc()
+    threads = [threading.Thread(target=count) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.labels('Normalize').value() == 4000
+    assert counter.render()[2:] == ['test_total{method="Normalize"} 4000']
+
+
+def test_histogram():
+    histogram = metrics.Histogram('test_seconds', 'Test.', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{le="0.1"} 2', 'test_seconds_bucket{le="1.0"} 3', 'test_seconds_bucket{le="+Inf"} 4',
+        'test_seconds_sum 2.65', 'test_seconds_count 4']
+
+
+def test_http_server_binds_loopback(http_server):
+    registry = metrics.Registry()
+    registry.register(metrics.Counter('test_total', 'Test.')).inc(3)
+    server = http_server(registry)
+    assert server.server_address[0] == '127.0.0.1'
+    status, body = get(server, '/metrics')
+    assert status == 200
+    assert 'test_total 3\n' in body
+    assert get(server, '/debug/slow-requests') == (404, None)
+
+
+def test_http_server_routes(http_server):
+    def route(query):
+        if 'bad' in query:
+            raise ValueError('bad request')
+        return 'text/plain; charset=utf-8', 'seconds={}'.format(query.get('seconds'))
+    server = http_server(metrics.Registry(), {'/debug/test': route})
+    assert get(server, '/debug/test?seconds=2') == (200, 'seconds=2')
+    assert get(server, '/debug/test?bad=1') == (400, None)
+
+
+@pytest.mark.parametrize('argv,debug_routes', [
+    (['--metrics-port', '0'], False),
+    (['--metrics-port', '0', '--profiling'], False),
+    (['--metrics-port', '0', '--profiling', '--debug-http'], True),
+])
+def test_debug_routes_only_when_enabled(normalizer, monkeypatch, argv, debug_routes):
+    started = []
+    monkeypatch.setattr(metrics, 'start_http_server', lambda port, **kwargs: started.append((port, kwargs)))
+    options = tts_frontend_server.parse_args(argv)
+    servicer = tts_frontend_server.TTSFrontendServicer(normalizer, batch_processes=1)
+    tts_frontend_server.start_metrics(1, options, servicer)
+    [(port, kwargs)] = started
+    assert port == 1
+    assert kwargs['host'] == '127.0.0.1'
+    assert sorted(kwargs['routes']) == (['/debug/profile', '/debug/slow-requests'] if debug_routes else [])
+
+
+@pytest.mark.parametrize('argv', [['--debug-http'], ['--debug-http', '--profiling'],
+                                  ['--debug-http', '--metrics-port', '9100']])
+def test_debug_http_needs_profiling_and_metrics_port(argv):
+    with pytest.raises(SystemExit):
+        tts_frontend_server.parse_args(argv)
+
+
+def test_metrics_host():
+    assert tts_frontend_server.parse_args(['--metrics-host', '0.0.0.0']).metrics_host == '0.0.0.0'
+
+
+def test_slow_request_log():
+    log = profiling.SlowRequestLog(2, max_chars=4)
+    for seconds in (0.3, 0.1, 0.5, 0.2):
+        log.record(seconds, 'Normalize', '', 'Hann kom heim.', {'normalize': seconds})
+    entries = log.entries()
+    assert [entry['seconds'] for entry in entries] == [0.5, 0.3]
+    assert entries[0]['content'] == 'Hann'
+    assert entries[0]['content_chars'] == 14
+    assert log.threshold() == 0.3
+
+
+def test_slow_requests_of_the_server(normalizer):
+    class Servicer(tts_frontend_server.TTSFrontendServicer):
+        domain_lookups = 0
+
+        def request_domain(self, request, context):
+            Servicer.domain_lookups += 1
+            return super().request_domain(request, context)
+
+    servicer = Servicer(normalizer, batch_processes=1, slow_requests=profiling.SlowRequestLog(5))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    service_extensions.add_extensions_to_server(servicer, server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+    try:
+        with grpc.insecure_channel('127.0.0.1:{}'.format(port)) as channel:
+            tts_frontend_service_pb2_grpc.TTSFrontendStub(channel).NormalizeTokenwise(
+                tts_frontend_message_pb2.NormalizeRequest(content='Staðan er 2-1.',
+                                                          domain=tts_frontend_message_pb2.NORM_DOMAIN_SPORT),
+                timeout=10)
+    finally:
+        server.stop(None)
+    [entry] = servicer.slow_requests.entries()
+    assert (entry['method'], entry['domain'], entry['content']) == ('NormalizeTokenwise', 'sport', 'Staðan er 2-1.')
+    assert {'domain', 'normalizer', 'response'} <= set(entry['stages'])
+    assert Servicer.domain_lookups == 1
+
+
+def test_interceptor(normalizer):
+    servicer = tts_frontend_server.TTSFrontendServicer(normalizer, batch_processes=1,
+                                                       admission=AdmissionController(max_content_bytes=100))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2), interceptors=[metrics.MetricsInterceptor()])
+    service_extensions.add_extensions_to_server(servicer, server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+    names = {key: 'tts_frontend_requests_total{{method="{}",code="{}"}}'.format(*key)
+             for key in (('Normalize', 'OK'), ('Normalize', 'RESOURCE_EXHAUSTED'), ('NormalizeStream', 'OK'))}
+    before = {key: sample(metrics.REQUESTS, name) for key, name in names.items()}
+    stage = 'tts_frontend_stage_seconds_count{stage="normalizer"}'
+    stages = sample(metrics.STAGE_SECONDS, stage)
+    try:
+        with grpc.insecure_channel('127.0.0.1:{}'.format(port)) as channel:
+            stub = tts_frontend_service_pb2_grpc.TTSFrontendStub(channel)
+            request = tts_frontend_message_pb2.NormalizeRequest(content='Hann kom heim. Ég fór.')
+            stub.Normalize(request, timeout=10)
+            with pytest.raises(grpc.RpcError):
+                stub.Normalize(tts_frontend_message_pb2.NormalizeRequest(content='a' * 101), timeout=10)
+            assert len(list(service_extensions.TTSFrontendExtStub(channel).NormalizeStream(request, timeout=10))) == 2
+    finally:
+        server.stop(None)
+    assert {key: sample(metrics.REQUESTS, name) - before[key] for key, name in names.items()} == \
+        {key: 1 for key in names}
+    # Normalize, and NormalizeStream once per sentence
+    assert sample(metrics.STAGE_SECONDS, stage) - stages == 3
+    assert metrics.IN_FLIGHT.labels().value() == 0
+
+
+def test_instrument_normalizer(monkeypatch, texts):
+    tokenizer = pytest.importorskip('regina_normalizer.tokenizer')
+    detect_sentences = tokenizer.Tokenizer.detect_sentences
+    # start_metrics() in the tests above may have instrumented it already
+    monkeypatch.setattr(tokenizer.Tokenizer, 'detect_sentences', getattr(detect_sentences, '__wrapped__',
+                                                                         detect_sentences))
+    stages = [('tokenization', 'regina_normalizer.tokenizer', 'Tokenizer.detect_sentences'),
+              ('tagging', 'regina_normalizer.not_loaded', 'Tagger.tag_sent')]
+    assert metrics.instrument_normalizer(stages) == ['regina_normalizer.tokenizer.Tokenizer.detect_sentences']
+    # instrumented once only
+    assert metrics.instrument_normalizer(stages) == []
+    name = 'tts_frontend_stage_seconds_count{stage="tokenization"}'
+    before = sample(metrics.STAGE_SECONDS, name)
+    with metrics.trace() as traced:
+        sentences = tokenizer.Tokenizer().detect_sentences(texts[1])
+    assert sentences == list(tokenizer.Tokenizer().detect_sentences(texts[1]))
+    assert sample(metrics.STAGE_SECONDS, name) - before == 2
+    assert set(traced) == {'tokenization'}
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_sampling_profiler(tmp_path):
+    profiler = profiling.SamplingProfiler(0.001)
+    stop = threading.Event()
+    thread = threading.Thread(target=busy, args=(stop,), name='busy-thread')
+    thread.start()
+    try:
+        results = []
+        other = threading.Thread(target=lambda: results.append(profiler.sample(0.05)))
+        other.start()
+        # only one profile at a time
+        stacks = profiler.sample(0.2)
+        other.join()
+    finally:
+        stop.set()
+        thread.join()
+    assert [result is None for result in (stacks, results[0])].count(True) == 1
+    stacks = stacks or results[0]
+    assert any(stack.startswith('busy-thread;') and stack.endswith('test_metrics.py:busy') for stack in stacks)
+    path = str(tmp_path / 'profile.collapsed')
+    profiler.write_collapsed(stacks, path)
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert sum(int(line.rsplit(' ', 1)[1]) for line in lines) == sum(stacks.values())
+
+
+def test_signal_handlers(tmp_path):
+    log = profiling.SlowRequestLog(2)
+    log.record(0.5, 'Normalize', 'sport', 'Hann kom.', {'normalizer': 0.4})
+    handlers = profiling.signal_handlers(profiling.SamplingProfiler(), 0.01, str(tmp_path), 3, log)
+    handlers[profiling.SLOW_REQUESTS_SIGNAL]()
+    [path] = tmp_path.glob('slow-requests-3-*.jsonl')
+    assert [json.loads(line)['content'] for line in path.read_text(encoding='utf-8').splitlines()] == ['Hann kom.']
+    assert profiling.profile_to_file(profiling.SamplingProfiler(), 0.01, str(tmp_path), 3).endswith('.collapsed')
+
+
+def test_debug_routes(normalizer, http_server):
+    options = tts_frontend_server.parse_args(['--metrics-port', '0', '--profiling', '--debug-http'])
+    servicer = tts_frontend_server.TTSFrontendServicer(normalizer, batch_processes=1,
+                                                       slow_requests=profiling.SlowRequestLog(2))
+    servicer.slow_requests.record(0.5, 'Normalize', '', 'Hann kom.', {})
+    routes = tts_frontend_server._profiling_routes(options, servicer, profiling.SamplingProfiler(0.001))
+    server = http_server(metrics.Registry(), routes)
+    status, body = get(server, '/debug/profile?seconds=0.05')
+    assert status == 200 and body
+    assert get(server, '/debug/profile?seconds=1000') == (400, None)
+    status, body = get(server, '/debug/slow-requests')
+    assert [entry['content'] for entry in json.loads(body)] == ['Hann kom.']
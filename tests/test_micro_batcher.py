@@ -0,0 +1,130 @@
+import threading
+
+from micro_batcher import BatchTagger, MicroBatchingNormalizer
+
+TEXTS = ['Hann kom heim | Ég fór', 'Svo kom hann', 'Hann kom heim | Hún fór út', 'Ég fór']
+
+
+class Tagger:
+    """Tags every token with its length, and counts the calls the normalizer would make to the POS tagger."""
+
+    def __init__(self):
+        self.sent_calls = []
+        self.bulk_calls = []
+
+    @staticmethod
+    def _tag(sent):
+        return tuple(str(len(token)) for token in sent)
+
+    def tag_sent(self, sent):
+        self.sent_calls.append(tuple(sent))
+        return self._tag(sent)
+
+    def tag_bulk(self, dataset, batch_size=16):
+        self.bulk_calls.append(list(dataset))
+        return tuple(self._tag(sent) for sent in dataset)
+
+
+def prepare(text, domain):
+    return [tuple(sentence.split()) for sentence in text.split('|')]
+
+
+class TaggingNormalizer:
+    """Tags the sentences of a text one at a time, as the normalizer does."""
+
+    def __init__(self, tagger):
+        self.tagger = tagger
+
+    def normalize_tokenwise(self, text, domain):
+        return [[(token, '{}/{}'.format(token, tag)) for token, tag in zip(sent, self.tagger.tag_sent(sent))]
+                for sent in prepare(text, domain)]
+
+    def normalize(self, text, domain):
+        return [(' '.join(word for _, word in sentence),) for sentence in self.normalize_tokenwise(text, domain)]
+
+
+def concurrently(function, texts):
+    results = {}
+    barrier = threading.Barrier(len(texts))
+
+    def client(index, text):
+        barrier.wait()
+        results[index] = function(text, '')
+
+    threads = [threading.Thread(target=client, args=(index, text)) for index, text in enumerate(texts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [results[index] for index in range(len(texts))]
+
+
+def test_one_bulk_call_per_window():
+    tagger = Tagger()
+    batch_tagger = BatchTagger(tagger, prepare)
+    normalizer = TaggingNormalizer(batch_tagger)
+    batcher = MicroBatchingNormalizer(normalizer, None, window=0.5, max_sentences=len(TEXTS) + 2, tagger=batch_tagger)
+    for method in ('normalize', 'normalize_tokenwise'):
+        del tagger.bulk_calls[:]
+        results = concurrently(getattr(batcher, method), TEXTS)
+        assert results == [getattr(TaggingNormalizer(Tagger()), method)(text, '') for text in TEXTS]
+        # the two sentences in more than one text are tagged once
+        assert len(tagger.bulk_calls) == 1
+        assert sorted(tagger.bulk_calls[0]) == sorted({sent for text in TEXTS for sent in prepare(text, '')})
+    assert tagger.sent_calls == []
+    assert batch_tagger.hits == 2 * 6
+    assert batcher.batched_calls == 2 * len(TEXTS)
+    # nothing is kept after the calls
+    assert batch_tagger._tags == {}
+
+
+def test_max_sentences():
+    tagger = Tagger()
+    batch_tagger = BatchTagger(tagger, prepare)
+    batcher = MicroBatchingNormalizer(TaggingNormalizer(batch_tagger), None, window=5, max_sentences=1,
+                                      tagger=batch_tagger)
+    assert batcher.normalize('Hann kom | Ég fór', '') == TaggingNormalizer(Tagger()).normalize('Hann kom | Ég fór', '')
+    assert tagger.bulk_calls == [[('Hann', 'kom'), ('Ég', 'fór')]]
+
+
+def test_sentences_not_prefetched():
+    tagger = Tagger()
+    batch_tagger = BatchTagger(tagger, prepare)
+    batch_tagger.prefetch([[('Hann', 'kom')]])
+    assert batch_tagger.tag_sent(['Hann', 'kom']) == ('4', '3')
+    assert batch_tagger.tag_sent(['Ég', 'fór']) == ('2', '3')
+    assert tagger.sent_calls == [('Ég', 'fór')]
+    assert (batch_tagger.hits, batch_tagger.misses) == (1, 1)
+
+
+def test_tags_kept_while_needed():
+    batch_tagger = BatchTagger(Tagger(), prepare)
+    first = [('Hann', 'kom'), ('Ég', 'fór')]
+    second = [('Ég', 'fór')]
+    batch_tagger.prefetch([first])
+    batch_tagger.prefetch([second])
+    batch_tagger.forget(first)
+    assert list(batch_tagger._tags) == [('Ég', 'fór')]
+    batch_tagger.forget(second)
+    assert batch_tagger._tags == {}
+
+
+def test_failed_bulk_call():
+    class FailingTagger(Tagger):
+        def tag_bulk(self, dataset, batch_size=16):
+            raise RuntimeError('out of memory')
+
+    tagger = FailingTagger()
+    batch_tagger = BatchTagger(tagger, prepare)
+    batcher = MicroBatchingNormalizer(TaggingNormalizer(batch_tagger), None, tagger=batch_tagger)
+    assert batcher.normalize(TEXTS[0], '') == TaggingNormalizer(Tagger()).normalize(TEXTS[0], '')
+    assert tagger.sent_calls == prepare(TEXTS[0], '')
+    assert batcher.batches == 0
+
+
+def test_without_tagger(normalizer, splitter, texts):
+    # regina's tagger isn't loaded with the reference normalizer, so calls go straight to the normalizer
+    batcher = MicroBatchingNormalizer(normalizer, splitter)
+    for text in texts[:50]:
+        assert batcher.normalize_tokenwise(text, '') == normalizer.normalize_tokenwise(text, '')
+    assert batcher.tagger is None or isinstance(batcher.tagger, BatchTagger)
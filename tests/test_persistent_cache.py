@@ -0,0 +1,103 @@
+from concurrent import futures
+
+import pytest
+
+grpc = pytest.importorskip('grpc')
+
+import service_extensions  # noqa: E402
+import tts_frontend_server  # noqa: E402
+from generated.messages import tts_frontend_message_pb2  # noqa: E402
+from generated.services import tts_frontend_service_pb2_grpc  # noqa: E402
+from persistent_cache import PersistentCache, TieredCache, cache_key  # noqa: E402
+from result_cache import ENTRY_OVERHEAD, ResultCache  # noqa: E402
+
+
+class CountingNormalizer:
+    def __init__(self, normalizer):
+        self.normalizer = normalizer
+        self.calls = 0
+
+    def normalize(self, text, domain):
+        self.calls += 1
+        return self.normalizer.normalize(text, domain)
+
+    def normalize_tokenwise(self, text, domain):
+        self.calls += 1
+        return self.normalizer.normalize_tokenwise(text, domain)
+
+
+def normalize(servicer, content):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    service_extensions.add_extensions_to_server(servicer, server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+    try:
+        with grpc.insecure_channel('127.0.0.1:{}'.format(port)) as channel:
+            return tts_frontend_service_pb2_grpc.TTSFrontendStub(channel).Normalize(
+                tts_frontend_message_pb2.NormalizeRequest(content=content), timeout=10)
+    finally:
+        server.stop(None)
+
+
+def test_shared_by_servers_of_the_same_version(normalizer, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    counting = CountingNormalizer(normalizer)
+    servicers = []
+    for version in ('1.0', '1.0', '2.0'):
+        servicer = tts_frontend_server.TTSFrontendServicer(counting, batch_processes=1,
+                                                           result_cache=PersistentCache(path, 1 << 20))
+        servicer.normalizer_version = version
+        servicers.append(servicer)
+    content = 'Hann kom heim kl. 5 í gær.'
+    first = normalize(servicers[0], content)
+    assert counting.calls == 1
+    # another process of the same version finds the response
+    assert normalize(servicers[1], content) == first
+    assert counting.calls == 1
+    # a server of another version does not
+    assert normalize(servicers[2], content) == first
+    assert counting.calls == 2
+    assert servicers[2].result_cache.stats() == {'hits': 0, 'misses': 1, 'evictions': 0}
+
+
+def test_eviction(tmp_path):
+    cache = PersistentCache(str(tmp_path / 'cache.db'), 1000)
+    for index in range(30):
+        cache.put(cache_key('Normalize', index), bytes(100))
+    cache.evict()
+    assert cache.get(cache_key('Normalize', 0)) is None
+    assert cache.get(cache_key('Normalize', 29)) == bytes(100)
+    assert cache.stats()['evictions'] >= 20
+    # values over the budget are not stored at all
+    cache.put(cache_key('Normalize', 'big'), bytes(2000))
+    assert cache.get(cache_key('Normalize', 'big')) is None
+
+
+def test_warm_up(tmp_path):
+    persistent = PersistentCache(str(tmp_path / 'cache.db'), 1 << 20)
+    keys = [cache_key('Normalize', index) for index in range(10)]
+    for index, key in enumerate(keys):
+        persistent.put(key, bytes([index]))
+    for index, key in enumerate(keys):
+        for _ in range(index):
+            persistent.get(key)
+    persistent._flush_hits(persistent._pending_hits)
+    memory = ResultCache(1 << 20)
+    TieredCache(memory, persistent).warm_up(3)
+    assert [memory.get(key) for key in keys[7:]] == [bytes([7]), bytes([8]), bytes([9])]
+    assert memory.get(keys[6]) is None
+
+
+def test_byte_keys_count_toward_the_budget():
+    cache = ResultCache(1 << 20)
+    key = cache_key('Normalize', 'Hann kom.')
+    cache.put(key, b'value')
+    assert cache.size == ENTRY_OVERHEAD + len(key) + len(b'value')
+
+
+@pytest.mark.parametrize('argv', [['--cache-warmup', '10'],
+                                  ['--cache-warmup', '10', '--persistent-cache', 'cache.db', '--cache-bytes', '0']])
+def test_cache_warmup_needs_both_tiers(argv):
+    with pytest.raises(SystemExit):
+        tts_frontend_server.parse_args(argv)
+    assert tts_frontend_server.parse_args(['--cache-warmup', '10', '--persistent-cache', 'cache.db']).cache_warmup == 10
@@ -0,0 +1,90 @@
+from concurrent import futures
+
+import pytest
+
+from g2p import G2P, G2PUnavailable, format_pronunciation, syllabify
+from result_cache import ResultCache
+
+LEXICON = {'hann': 'h a n', 'kom': 'k_h O: m', 'heim': 'h ei: m', 'ég': 'j E: G', 'fór': 'f ou: r',
+           'hestur': 'h E s t Y r'}
+
+
+class Lexicon(dict):
+    pass
+
+
+def test_syllabify():
+    assert syllabify(()) == []
+    assert syllabify(('h', 'a', 'n')) == [['h', 'a', 'n']]
+    # as much of the cluster as is a valid onset starts the next syllable
+    assert syllabify('h E s t Y r'.split()) == [['h', 'E'], ['s', 't', 'Y', 'r']]
+    assert syllabify('a: l a'.split()) == [['a:'], ['l', 'a']]
+    assert syllabify('a u'.split()) == [['a'], ['u']]
+
+
+def test_format_pronunciation():
+    phones = tuple('h E s t Y r'.split())
+    assert format_pronunciation(phones) == 'h E s t Y r'
+    assert format_pronunciation(phones, syllabified=True) == 'h E . s t Y r'
+    assert format_pronunciation(phones, stress_labels=True) == '"h E s t Y r'
+    assert format_pronunciation(phones, cmu=True, stress_labels=True) == 'h E1 s t Y0 r'
+    assert format_pronunciation(phones, alphabet='ipa', syllabified=True, stress_labels=True) == 'ˈh ɛ . s t ʏ r'
+    assert format_pronunciation(('k_h', 'O:', 'm'), alphabet='ipa') == 'kʰ ɔː m'
+
+
+def test_g2p_lexicon_and_cache():
+    cache = ResultCache(1 << 20, sizeof=lambda phones: sum(map(len, phones)))
+    cache.put('kýr', ('c_h', 'i:', 'r'))
+    g2p = G2P(Lexicon(LEXICON), cache, use_model=False)
+    assert g2p.transcribe('Hann') == ('h', 'a', 'n')
+    assert g2p.transcribe('kýr') == ('c_h', 'i:', 'r')
+    with pytest.raises(G2PUnavailable):
+        g2p.transcribe('hestar')
+    assert g2p.stats() == {'lexicon_hits': 1, 'model_calls': 0}
+
+
+def test_preprocess(normalizer, splitter):
+    # preprocess records its stages with metrics, which needs grpc
+    preprocess = pytest.importorskip('preprocess')
+    with futures.ThreadPoolExecutor(max_workers=2) as executor:
+        g2p = G2P(Lexicon(LEXICON), use_model=False)
+        preprocessor = preprocess.TTSPreprocessor(normalizer, splitter, g2p, executor)
+        assert preprocessor.preprocess('') == ''
+        assert preprocessor.preprocess('Hann kom heim. Ég fór!') == \
+            '{h a n} {k_h O: m} {h ei: m} . {j E: G} {f ou: r} !'
+        assert preprocessor.preprocess('Hestur kom heim.', syllabified=True, stress_labels=True) == \
+            '{"h E . s t Y r} {"k_h O: m} {"h ei: m} .'
+        with pytest.raises(G2PUnavailable):
+            preprocessor.preprocess('Hann kom heim. Hún fór!')
+
+
+def test_preprocess_rpc(normalizer):
+    grpc = pytest.importorskip('grpc')
+    import tts_frontend_server
+    from generated.messages import tts_frontend_message_pb2
+    from generated.services import tts_frontend_service_pb2_grpc
+
+    servicer = tts_frontend_server.TTSFrontendServicer(normalizer, batch_processes=1,
+                                                       g2p=G2P(Lexicon(LEXICON), use_model=False))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    tts_frontend_service_pb2_grpc.add_TTSFrontendServicer_to_server(servicer, server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+    try:
+        with grpc.insecure_channel('127.0.0.1:{}'.format(port)) as channel:
+            stub = tts_frontend_service_pb2_grpc.TTSFrontendStub(channel)
+            response = stub.TTSPreprocess(tts_frontend_message_pb2.PreprocessRequest(content='Hann kom heim.'),
+                                          timeout=10)
+            ipa = stub.TTSPreprocess(tts_frontend_message_pb2.PreprocessRequest(
+                content='Hann kom heim.', description=tts_frontend_message_pb2.PhonemeDescription(
+                    alphabet=tts_frontend_message_pb2.PHONETIC_ALPHABET_IPA,
+                    format=tts_frontend_message_pb2.PHONEME_CMU, stress_labels=True)), timeout=10)
+            with pytest.raises(grpc.RpcError) as error:
+                stub.TTSPreprocess(tts_frontend_message_pb2.PreprocessRequest(content='Hún kom heim.'), timeout=10)
+    finally:
+        server.stop(None)
+    assert response.processed_content == '{h a n} {k_h O: m} {h ei: m} .'
+    assert response.description.SerializeToString() == \
+        tts_frontend_server.DEFAULT_PHONEME_DESCRIPTION.SerializeToString()
+    assert ipa.processed_content == '{h a1 n} {kʰ ɔː1 m} {h eiː1 m} .'
+    assert error.value.code() == grpc.StatusCode.FAILED_PRECONDITION
@@ -0,0 +1,135 @@
+import gc
+import multiprocessing
+import os
+import signal
+import time
+
+import pytest
+
+import process_supervisor
+from process_supervisor import ProcessSupervisor
+
+
+def wait_for(condition, timeout=20):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.02)
+
+
+def starts(directory, index):
+    path = os.path.join(directory, 'worker-{}'.format(index))
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # a zombie that its parent hasn't reaped yet
+    try:
+        with open('/proc/{}/stat'.format(pid)) as f:
+            return f.read().split(') ')[-1][0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+def crashing_worker(index, directory):
+    """Records its pid; the first start of worker 0 crashes, the others run until terminated."""
+    crash = index == 0 and not starts(directory, index)
+    with open(os.path.join(directory, 'worker-{}'.format(index)), 'a') as f:
+        f.write('{}\n'.format(os.getpid()))
+    if crash:
+        os._exit(3)
+    while True:
+        time.sleep(1)
+
+
+def preloaded_worker(index, options, normalizer):
+    """Records what it was given by the supervisor, then runs until terminated."""
+    with open(os.path.join(options.directory, 'worker-{}'.format(index)), 'w') as f:
+        f.write('{} {} {} {}\n'.format(os.getpid(), type(normalizer).__name__, id(normalizer), gc.get_freeze_count()))
+    while True:
+        time.sleep(1)
+
+
+def supervise(target, num_workers, args):
+    process = multiprocessing.get_context('fork').Process(target=ProcessSupervisor(target, num_workers, args).run)
+    process.start()
+    return process
+
+
+def test_restarts_workers_and_stops_them(tmp_path):
+    directory = str(tmp_path)
+    supervisor = supervise(crashing_worker, 2, (directory,))
+    try:
+        wait_for(lambda: len(starts(directory, 0)) == 2 and len(starts(directory, 1)) == 1)
+        pids = starts(directory, 0) + starts(directory, 1)
+        assert len(set(pids)) == 3
+        assert not alive(pids[0])
+        assert alive(pids[1]) and alive(pids[2])
+    finally:
+        os.kill(supervisor.pid, signal.SIGTERM)
+        supervisor.join(process_supervisor.SHUTDOWN_TIMEOUT + 5)
+    assert supervisor.exitcode == 0
+    wait_for(lambda: not any(alive(pid) for pid in pids))
+    # no worker was started after the first restart
+    assert len(starts(directory, 0)) == 2 and len(starts(directory, 1)) == 1
+
+
+def test_restart_delay():
+    supervisor = ProcessSupervisor(None, 1)
+    delays = [supervisor._next_restart_delay(0, 0.1) for _ in range(8)]
+    assert delays == [0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 30.0, 30.0]
+    # a worker that ran for a while is restarted right away, and starts backing off anew
+    assert supervisor._next_restart_delay(0, process_supervisor.MIN_WORKER_UPTIME) == 0.0
+    assert supervisor._next_restart_delay(0, 0.1) == 0.5
+
+
+def test_needs_a_worker():
+    with pytest.raises(ValueError):
+        ProcessSupervisor(None, 0)
+
+
+def test_serve_in_one_process():
+    tts_frontend_server = pytest.importorskip('tts_frontend_server')
+    runs = []
+    options = tts_frontend_server.parse_args(['--workers', '1'])
+    tts_frontend_server.serve(options, run=lambda *args: runs.append(args))
+    assert runs == [(0, options)]
+
+
+def test_preload(normalizer, tmp_path):
+    tts_frontend_server = pytest.importorskip('tts_frontend_server')
+    import normalizer_loader
+    snapshot = str(tmp_path / 'normalizer.pickle')
+    normalizer_loader.write_snapshot(normalizer, snapshot)
+    options = tts_frontend_server.parse_args(['--workers', '2', '--preload', '--normalizer-snapshot', snapshot])
+    options.directory = str(tmp_path)
+    supervisor = multiprocessing.get_context('fork').Process(target=tts_frontend_server.serve,
+                                                             args=(options, preloaded_worker))
+    supervisor.start()
+    paths = [os.path.join(str(tmp_path), 'worker-{}'.format(index)) for index in range(2)]
+    try:
+        wait_for(lambda: all(os.path.exists(path) and os.path.getsize(path) for path in paths))
+    finally:
+        os.kill(supervisor.pid, signal.SIGTERM)
+        supervisor.join(process_supervisor.SHUTDOWN_TIMEOUT + 5)
+    workers = []
+    for path in paths:
+        with open(path) as f:
+            workers.append(f.read().split())
+    # both workers got the one normalizer the supervisor loaded, in frozen pages
+    assert [worker[1:3] for worker in workers] == [[type(normalizer).__name__, workers[0][2]]] * 2
+    assert all(int(worker[3]) > 0 for worker in workers)
+
+
+def test_preload_and_lazy_load():
+    tts_frontend_server = pytest.importorskip('tts_frontend_server')
+    with pytest.raises(SystemExit):
+        tts_frontend_server.parse_args(['--preload', '--lazy-load'])
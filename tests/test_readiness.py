@@ -0,0 +1,97 @@
+import threading
+import time
+from concurrent import futures
+
+import pytest
+
+grpc = pytest.importorskip('grpc')
+pytest.importorskip('grpc_health')
+
+import normalizer_loader  # noqa: E402
+import service_extensions  # noqa: E402
+import tts_frontend_server  # noqa: E402
+from generated.messages import tts_frontend_message_pb2  # noqa: E402
+from generated.services import tts_frontend_service_pb2_grpc  # noqa: E402
+from google.protobuf import empty_pb2  # noqa: E402
+from grpc_health.v1 import health_pb2, health_pb2_grpc  # noqa: E402
+from normalizer_loader import LazyNormalizer  # noqa: E402
+from readiness import ReadinessInterceptor, add_health_to_server  # noqa: E402
+
+
+@pytest.fixture
+def loading_server(normalizer):
+    """A server whose normalizer finishes loading when the returned event is set."""
+    loaded = threading.Event()
+
+    def load():
+        loaded.wait()
+        return normalizer
+    lazy = LazyNormalizer(load)
+    servicer = tts_frontend_server.TTSFrontendServicer(lazy, batch_processes=1)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4), interceptors=[ReadinessInterceptor(servicer.ready)])
+    add_health_to_server(server, servicer.ready)
+    service_extensions.add_extensions_to_server(servicer, server)
+    tts_frontend_service_pb2_grpc.add_TTSFrontendServicer_to_server(servicer, server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+    lazy.start()
+    channel = grpc.insecure_channel('127.0.0.1:{}'.format(port))
+    yield channel, loaded
+    loaded.set()
+    channel.close()
+    server.stop(None)
+
+
+def health_status(channel, service=''):
+    return health_pb2_grpc.HealthStub(channel).Check(health_pb2.HealthCheckRequest(service=service), timeout=10).status
+
+
+def test_unavailable_until_loaded(loading_server, normalizer):
+    channel, loaded = loading_server
+    stub = tts_frontend_service_pb2_grpc.TTSFrontendStub(channel)
+    request = tts_frontend_message_pb2.NormalizeRequest(content='Hann kom heim kl. 5.')
+    for call in (lambda: stub.Normalize(request, timeout=10),
+                 lambda: list(service_extensions.TTSFrontendExtStub(channel).NormalizeStream(request, timeout=10)),
+                 lambda: list(service_extensions.TTSFrontendExtStub(channel).NormalizeBatch(iter([request]),
+                                                                                            timeout=10))):
+        with pytest.raises(grpc.RpcError) as error:
+            call()
+        assert error.value.code() == grpc.StatusCode.UNAVAILABLE
+    # health checks and the version are served while loading
+    assert stub.GetVersion(empty_pb2.Empty(), timeout=10).version == \
+        tts_frontend_message_pb2.ABI_VERSION.ABI_VERSION_CURRENT
+    for service in ('', service_extensions.SERVICE_NAME):
+        assert health_status(channel, service) == health_pb2.HealthCheckResponse.NOT_SERVING
+
+    loaded.set()
+    for _ in range(1000):
+        if health_status(channel) == health_pb2.HealthCheckResponse.SERVING:
+            break
+        time.sleep(0.005)
+    assert health_status(channel, service_extensions.SERVICE_NAME) == health_pb2.HealthCheckResponse.SERVING
+    assert list(stub.Normalize(request, timeout=10).normalized_sentence) == \
+        [sentence[0] for sentence in normalizer.normalize(request.content, '')]
+
+
+def test_ready_without_lazy_loading(normalizer):
+    assert tts_frontend_server.TTSFrontendServicer(normalizer, batch_processes=1).ready.is_set()
+
+
+def test_snapshot(tmp_path):
+    path = str(tmp_path / 'normalizer.pickle')
+    normalizer_loader.write_snapshot({'rules': [1, 2, 3]}, path)
+    assert normalizer_loader._read_snapshot(path) == {'rules': [1, 2, 3]}
+    assert [p.name for p in tmp_path.iterdir()] == ['normalizer.pickle']
+
+
+def test_snapshot_of_another_version(tmp_path, monkeypatch):
+    path = str(tmp_path / 'normalizer.pickle')
+    normalizer_loader.write_snapshot({'rules': [1, 2, 3]}, path)
+    monkeypatch.setattr(normalizer_loader, 'SNAPSHOT_FORMAT', normalizer_loader.SNAPSHOT_FORMAT + 1)
+    assert normalizer_loader._read_snapshot(path) is None
+
+
+def test_failed_snapshot_leaves_no_file(tmp_path):
+    with pytest.raises(Exception):
+        normalizer_loader.write_snapshot(lambda: None, str(tmp_path / 'normalizer.pickle'))
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,65 @@
+import pytest
+
+pytest.importorskip('google.protobuf')
+
+from generated.messages import tts_frontend_message_pb2  # noqa: E402
+from response_encoding import encode_normalize_response, encode_tokenbased_response, encode_varint  # noqa: E402
+from token_columns import TokenColumns  # noqa: E402
+
+# tokens the encoding must get right: empty fields, unchanged ones, multi-byte characters, whitespace
+# str.strip() strips but bytes.strip() doesn't, and fields too long for the precomputed varints
+RESULTS = [
+    [],
+    [[]],
+    [[('Hann', 'hann'), ('kom', 'kom'), ('.', '.')], [('5', 'fimm'), ('km', 'kílómetrar')]],
+    [[('', ''), ('', 'og'), ('-', ''), ('„Já“', '„já“')]],
+    [[(' ', ' '), ('a', 'a'), ('\x1c', '\x1c')], [('b', '　b ')], [(' ', ' ')]],
+    [[('orð', 'orð ' * 5000), ('ø' * 20000, 'ö')]],
+    [[('orð{}'.format(index), 'orð') for index in range(300)]],
+]
+
+
+def normalize_response(normalized_arr):
+    response = tts_frontend_message_pb2.NormalizeResponse()
+    response.normalized_sentence.extend([sentence[0] for sentence in normalized_arr])
+    return response.SerializeToString()
+
+
+def tokenbased_response(normalized_arr):
+    response = tts_frontend_message_pb2.TokenBasedNormalizedResponse()
+    for sentence in normalized_arr:
+        sentence_response = response.sentence.add()
+        for index, (original, normalized) in enumerate(sentence):
+            sentence_response.token_info.add(original_token=original, normalized_token=normalized,
+                                             original_index=index, has_changed=original != normalized)
+        sentence_response.normalized_sentence = ' '.join([normalized for _, normalized in sentence]).strip()
+    return response.SerializeToString()
+
+
+def test_varints():
+    for value in (1, 127, 128, 300, (1 << 14) - 1, 1 << 14, (1 << 31) - 1):
+        message = tts_frontend_message_pb2.RawNormalizedTokenInfo(original_index=value)
+        assert b'\x18' + encode_varint(value) == message.SerializeToString()
+
+
+def test_normalize_response(normalizer, texts):
+    results = [normalizer.normalize(text, '') for text in texts] + \
+        [[(' '.join(normalized for _, normalized in sentence),) for sentence in result] for result in RESULTS]
+    for normalized_arr in results:
+        assert encode_normalize_response(normalized_arr) == normalize_response(normalized_arr)
+
+
+@pytest.mark.parametrize('normalized_arr', RESULTS)
+def test_tokenbased_response(normalized_arr):
+    expected = tokenbased_response(normalized_arr)
+    assert encode_tokenbased_response(normalized_arr) == expected
+    assert encode_tokenbased_response(TokenColumns.from_tokenwise(normalized_arr)) == expected
+
+
+def test_tokenbased_response_of_the_normalizer(normalizer, texts):
+    for text in texts:
+        normalized_arr = normalizer.normalize_tokenwise(text, 'sport')
+        expected = tokenbased_response(normalized_arr)
+        assert encode_tokenbased_response(normalized_arr) == expected
+        assert encode_tokenbased_response(TokenColumns.from_tokenwise(normalized_arr)) == expected
+
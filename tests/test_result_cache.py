@@ -0,0 +1,104 @@
+from concurrent import futures
+
+import pytest
+
+import result_cache
+from result_cache import ENTRY_OVERHEAD, ResultCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction():
+    cache = ResultCache(3 * (ENTRY_OVERHEAD + 2))
+    for key in ('a', 'b', 'c'):
+        cache.put(key, b'v')
+    assert cache.get('a') == b'v'
+    cache.put('d', b'v')
+    # b was the least recently used
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in ('a', 'c', 'd')] == [b'v', b'v', b'v']
+    assert cache.stats() == {'entries': 3, 'bytes': 3 * (ENTRY_OVERHEAD + 2), 'hits': 4, 'misses': 1,
+                             'evictions': 1}
+
+
+def test_replaced_and_oversized_values():
+    cache = ResultCache(1000)
+    cache.put(('Normalize', 'sport', 1), b'x' * 10)
+    cache.put(('Normalize', 'sport', 1), b'x' * 20)
+    assert len(cache) == 1
+    assert cache.size == ENTRY_OVERHEAD + len('Normalize') + len('sport') + 20
+    cache.put('big', b'x' * 1000)
+    assert cache.get('big') is None
+    assert cache.get(('Normalize', 'sport', 1)) == b'x' * 20
+    cache.clear()
+    assert (len(cache), cache.size) == (0, 0)
+
+
+def test_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, 'monotonic', clock)
+    cache = ResultCache(1 << 20, ttl=10)
+    cache.put('a', b'v')
+    clock.now += 10
+    assert cache.get('a') == b'v'
+    clock.now += 0.5
+    assert cache.get('a') is None
+    assert (len(cache), cache.size) == (0, 0)
+    assert cache.stats()['misses'] == 1
+
+
+def test_sizeof():
+    cache = ResultCache(ENTRY_OVERHEAD + 100, sizeof=lambda value: 10 * len(value))
+    cache.put('', [1] * 10)
+    cache.put('', [1] * 11)
+    assert cache.get('') == [1] * 10
+
+
+def test_responses_of_the_servicer(normalizer):
+    grpc = pytest.importorskip('grpc')
+    import service_extensions
+    import tts_frontend_server
+    from generated.messages import tts_frontend_message_pb2
+    from generated.services import tts_frontend_service_pb2_grpc
+
+    calls = []
+
+    class CountingNormalizer:
+        def normalize(self, text, domain):
+            calls.append(('normalize', domain))
+            return normalizer.normalize(text, domain)
+
+        def normalize_tokenwise(self, text, domain):
+            calls.append(('normalize_tokenwise', domain))
+            return normalizer.normalize_tokenwise(text, domain)
+
+    servicer = tts_frontend_server.TTSFrontendServicer(CountingNormalizer(), batch_processes=1,
+                                                       result_cache=ResultCache(1 << 20))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    service_extensions.add_extensions_to_server(servicer, server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+    content = 'Hann kom heim kl. 5 í gær.'
+    sport = tts_frontend_message_pb2.NORM_DOMAIN_SPORT
+    try:
+        with grpc.insecure_channel('127.0.0.1:{}'.format(port)) as channel:
+            stub = tts_frontend_service_pb2_grpc.TTSFrontendStub(channel)
+            responses = [stub.Normalize(tts_frontend_message_pb2.NormalizeRequest(content=content), timeout=10)
+                         for _ in range(2)]
+            tokenwise = stub.NormalizeTokenwise(tts_frontend_message_pb2.NormalizeRequest(content=content),
+                                                timeout=10)
+            stub.Normalize(tts_frontend_message_pb2.NormalizeRequest(content=content, domain=sport), timeout=10)
+            stub.Normalize(tts_frontend_message_pb2.NormalizeRequest(content=content, domain=sport), timeout=10)
+    finally:
+        server.stop(None)
+    assert responses[0] == responses[1]
+    assert len(tokenwise.sentence) == len(responses[0].normalized_sentence)
+    # responses are cached per method and domain
+    assert calls == [('normalize', ''), ('normalize_tokenwise', ''), ('normalize', 'sport')]
+    assert servicer.result_cache.stats()['hits'] == 2
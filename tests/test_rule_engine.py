@@ -0,0 +1,97 @@
+import ast
+import importlib
+import importlib.util
+import os
+import re
+
+import pytest
+
+import rule_engine
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'corpus.txt')
+DOMAINS = ('', 'sport', 'other')
+# number_functions definitions that don't need the POS tagger, see number_findall()
+NUMBER_FUNCTIONS = ('make_dict', 'fill_dict', 'digit_fun', 'digit_ord_fun', 'number_findall')
+# tags of the word after a number: nouns of every gender and case, in both numbers or not, and a few others
+TAGS = ['n{}{}{}'.format(gender, number, case) for gender, number in ('ke', 'vf', 'he') for case in 'noþe'] + \
+    ['nkfn', 'lvfosf', 'ta', 'aa', 'sfg3en', '']
+NUMBERS = ['1', '2', '4', '21', '100', '101', '1.250', '2009', '3.', '21.', '1000000', '12:30', '9,9', '2-1', '1/2',
+           '½', '07.', '123.456.789']
+
+
+@pytest.fixture(scope='module')
+def corpus(splitter):
+    with open(CORPUS, encoding='utf-8') as f:
+        paragraphs = [line.strip() for line in f if line.strip()]
+    return [sentence for paragraph in paragraphs for sentence in splitter.split(paragraph)]
+
+
+@pytest.fixture(scope='module')
+def number_functions():
+    """The tagger-free part of regina_normalizer.number_functions, with its original fill_dict.
+
+    The module itself loads the POS tagger on import, so its definitions are taken from its source.
+    """
+    spec = importlib.util.find_spec('regina_normalizer')
+    if spec is None:
+        pytest.skip('regina_normalizer is not installed')
+    path = os.path.join(os.path.dirname(spec.origin), 'number_functions.py')
+    with open(path, encoding='utf-8') as f:
+        module = ast.parse(f.read(), path)
+    namespace = {'re': re}
+    for node in module.body:
+        if isinstance(node, ast.ImportFrom) and node.level == 1:
+            for alias in node.names:
+                namespace[alias.asname or alias.name] = importlib.import_module(
+                    'regina_normalizer.{}'.format(alias.name))
+        elif isinstance(node, ast.Assign) and node.targets[0].id.endswith('_tuples') or \
+                isinstance(node, ast.FunctionDef) and node.name in NUMBER_FUNCTIONS:
+            exec(compile(ast.Module([node], []), path, 'exec'), namespace)
+    try:
+        namespace['number_findall']('21', 'nkfn', '')
+    except re.error:
+        pytest.skip("the normalizer's rules don't compile on this Python version")
+    return namespace
+
+
+def test_abbreviations(replace_abbreviations, corpus):
+    inputs = [(sentence, domain) for domain in DOMAINS for sentence in corpus]
+    expected = [replace_abbreviations(sentence, domain) for sentence, domain in inputs]
+    abbr_functions = importlib.import_module('regina_normalizer.abbr_functions')
+    assert rule_engine.install() == ['regina_normalizer.abbr_functions.replace_all']
+    try:
+        assert abbr_functions.replace_all is rule_engine.replace_all
+        actual = [replace_abbreviations(sentence, domain) for sentence, domain in inputs]
+    finally:
+        rule_engine.uninstall()
+    assert abbr_functions.replace_all is not rule_engine.replace_all
+    assert [(inputs[index], actual[index]) for index in range(len(inputs)) if actual[index] != expected[index]] == []
+    # the corpus does exercise the rules
+    assert sum(a != sentence for a, (sentence, _) in zip(actual, inputs)) > len(corpus)
+
+
+def expand(number_findall, arguments):
+    try:
+        return number_findall(*arguments)
+    except UnboundLocalError:
+        # number_findall has no expansion for some words, e.g. fractions outside the 'other' and 'sport' domains
+        return None
+
+
+def test_numbers(number_functions, corpus):
+    words = set(NUMBERS)
+    for sentence in corpus:
+        words.update(word for word in sentence.split() if re.match('[\\d½⅓¼⅔¾\\-\\–]', word))
+    # the domain only matters for fractions
+    inputs = [(word, tag, domain) for word in sorted(words) for tag in TAGS
+              for domain in (DOMAINS if '/' in word else ('',))]
+    number_findall = number_functions['number_findall']
+    original = number_functions['fill_dict']
+    expected = [expand(number_findall, arguments) for arguments in inputs]
+    number_functions['fill_dict'] = rule_engine.fill_dict
+    try:
+        actual = [expand(number_findall, arguments) for arguments in inputs]
+    finally:
+        number_functions['fill_dict'] = original
+    assert [(inputs[index], actual[index]) for index in range(len(inputs)) if actual[index] != expected[index]] == []
+    assert len(set(expected)) > len(words)
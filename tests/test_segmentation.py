@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from segmentation import SentenceBuffer
+
+# (text, the normalizer's sentences)
+EXAMPLES = [
+    ('Hún sagði „Já.“ Hann fór.', ['Hún sagði „Já.“ Hann fór.']),
+    ('Hann sagði „Já!“ Svo fór hann.', ['Hann sagði „Já!“ Svo fór hann.']),
+    ('Ég heiti Jón. J. K. Rowling skrifaði bækur.', ['Ég heiti Jón.', 'J. K. Rowling skrifaði bækur.']),
+    ('A. Jónsson kom. B. fór.', ['A. Jónsson kom.', 'B. fór.']),
+    ('Hann kom? !', ['Hann kom? !']),
+    ('Hann kom? ! Ég fór.', ['Hann kom?', '! Ég fór.']),
+    ('nr. kom? ! Ég Jón…', ['nr. kom?', '! Ég Jón…']),
+    ('Hann kom? .', ['Hann kom?', '.']),
+    ('Hann fór. "', ['Hann fór. "']),
+    ('', []),
+]
+
+
+@pytest.mark.parametrize('text, sentences', EXAMPLES)
+def test_split(splitter, text, sentences):
+    assert splitter.split(text) == sentences
+
+
+def test_split_like_normalizer(splitter, texts):
+    detect_sentences = splitter.tokenizer.detect_sentences
+    for text in texts:
+        sentences = splitter.split(text)
+        assert [detected for sentence in sentences for detected in detect_sentences(sentence)] == \
+            detect_sentences(text), text
+        if len(sentences) > 1:
+            assert all(len(detect_sentences(sentence)) == 1 for sentence in sentences), text
+
+
+def test_buffer_like_split(splitter, texts):
+    rng = random.Random(0)
+    for text in texts:
+        buffer = SentenceBuffer(splitter)
+        sentences = []
+        start = 0
+        for end in sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, 4))) + [len(text)]:
+            sentences.extend(buffer.feed(text[start:end]))
+            start = end
+        sentences.extend(buffer.flush())
+        assert sentences == splitter.split(text), text
+
+
+def test_buffer_waits_for_sentence_end(splitter):
+    buffer = SentenceBuffer(splitter)
+    assert list(buffer.feed('Hann kom? ')) == []
+    # a last sentence of punctuation would still be appended to 'Hann kom?'
+    assert list(buffer.feed('! ')) == []
+    assert list(buffer.feed('Ég ')) == ['Hann kom?']
+    assert list(buffer.flush()) == ['! Ég']
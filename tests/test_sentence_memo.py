@@ -0,0 +1,62 @@
+import pytest
+
+from result_cache import ResultCache
+from sentence_memo import SentenceMemoNormalizer, estimate_size, normalize_sentences
+
+METHODS = ['normalize', 'normalize_tokenwise']
+
+REVIEW_TEXTS = [
+    'Hún sagði „Já.“ Hann fór.',
+    'Hann sagði „Já!“ Svo fór hann.',
+    'Ég heiti Jón. J. K. Rowling skrifaði bækur.',
+    'A. Jónsson kom. B. fór.',
+    'Hann kom? !',
+    'Hann kom? ! Ég fór.',
+]
+
+
+def as_lists(normalized):
+    return [list(sentence) for sentence in normalized]
+
+
+def memo(normalizer, splitter):
+    return SentenceMemoNormalizer(normalizer, splitter, ResultCache(1024 * 1024, sizeof=estimate_size))
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_cold_and_warm(normalizer, splitter, texts, method):
+    for text in REVIEW_TEXTS + texts:
+        expected = as_lists(getattr(normalizer, method)(text, ''))
+        memoized = memo(normalizer, splitter)
+        assert as_lists(getattr(memoized, method)(text, '')) == expected, text
+        assert as_lists(getattr(memoized, method)(text, '')) == expected, text
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_shared_cache(normalizer, splitter, texts, method):
+    memoized = memo(normalizer, splitter)
+    for text in REVIEW_TEXTS + texts + REVIEW_TEXTS:
+        assert as_lists(getattr(memoized, method)(text, '')) == as_lists(getattr(normalizer, method)(text, '')), text
+
+
+def test_cached_sentence_in_longer_text(normalizer, splitter):
+    memoized = memo(normalizer, splitter)
+    memoized.normalize('Hann kom? !', '')
+    assert memoized.normalize('Hann kom? ! Ég fór.', '') == normalizer.normalize('Hann kom? ! Ég fór.', '')
+
+
+def test_domains_cached_apart(normalizer, splitter):
+    memoized = memo(normalizer, splitter)
+    text = 'Hann kom kl. 5. Svo fór hann.'
+    assert memoized.normalize(text, '') == normalizer.normalize(text, '')
+    assert memoized.normalize(text, 'sport') == normalizer.normalize(text, 'sport')
+
+
+@pytest.mark.parametrize('sentences', [
+    ['Hann kom? !', 'Ég fór.'],
+    ['Ég heiti Jón.', 'nr. 5 kom.', 'Hann kom?', '!'],
+    ['Hann fór.', 'Svo kom hann.'],
+])
+def test_normalize_sentences(normalizer, splitter, sentences):
+    grouped = normalize_sentences(normalizer, 'normalize', splitter, sentences, '')
+    assert [list(group) for group in grouped] == [normalizer.normalize(sentence, '') for sentence in sentences]
@@ -0,0 +1,56 @@
+import pickle
+
+import pytest
+
+from token_columns import TokenColumns
+
+RESULT = [[('Hann', 'hann'), ('kom', 'kom'), ('.', '.')], [], [('5', 'fimm'), ('km', 'kílómetrar')],
+          [('„Já“', '„já“'), ('', 'og')]]
+
+
+def test_sequence_of_sentences():
+    columns = TokenColumns.from_tokenwise(RESULT)
+    assert len(columns) == len(RESULT)
+    assert list(columns) == RESULT
+    assert [columns[index] for index in range(-len(RESULT), len(RESULT))] == RESULT + RESULT
+    with pytest.raises(IndexError):
+        columns[len(RESULT)]
+    assert columns.field(1) == 'hann'
+    assert TokenColumns.from_tokenwise(columns) is columns
+    assert repr(TokenColumns.from_tokenwise(RESULT[:1])) == 'TokenColumns({!r})'.format(RESULT[:1])
+
+
+@pytest.mark.parametrize('index', [slice(None), slice(1, 3), slice(2, None), slice(3, 1), slice(None, None, 2),
+                                   slice(None, None, -1), slice(-2, None)])
+def test_slices(index):
+    columns = TokenColumns.from_tokenwise(RESULT)[index]
+    assert isinstance(columns, TokenColumns)
+    assert list(columns) == RESULT[index]
+    assert columns == TokenColumns.from_tokenwise(RESULT[index])
+
+
+def test_concat():
+    parts = [TokenColumns.from_tokenwise(RESULT[:1]), TokenColumns(), TokenColumns.from_tokenwise(RESULT[1:])]
+    assert TokenColumns.concat(parts) == TokenColumns.from_tokenwise(RESULT)
+    assert TokenColumns.concat(parts[:2]) is parts[0]
+    assert list(TokenColumns.concat([])) == []
+
+
+def test_pickle():
+    columns = TokenColumns.from_tokenwise(RESULT)
+    assert pickle.loads(pickle.dumps(columns)) == columns
+    assert columns != RESULT
+
+
+def test_large_offsets():
+    columns = TokenColumns(b'ab', [1, 2, 1 << 33], [3])
+    assert columns.ends.typecode == 'Q'
+    assert TokenColumns.from_tokenwise(RESULT).ends.typecode == 'I'
+
+
+def test_normalizer_results(normalizer, texts):
+    for text in texts:
+        normalized_arr = normalizer.normalize_tokenwise(text, '')
+        columns = TokenColumns.from_tokenwise(normalized_arr)
+        assert list(columns) == normalized_arr
+        assert TokenColumns.concat([columns[:1], columns[1:]]) == columns
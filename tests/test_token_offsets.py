@@ -0,0 +1,81 @@
+from concurrent import futures
+
+import pytest
+
+pytest.importorskip('google.protobuf')
+
+import token_offsets  # noqa: E402
+from generated.messages import tts_frontend_message_pb2  # noqa: E402
+from response_encoding import encode_tokenbased_response  # noqa: E402
+from token_columns import TokenColumns  # noqa: E402
+
+
+def check_spans(content, normalized_arr):
+    offsets = list(token_offsets.align(content, normalized_arr))
+    tokens = [(index, original) for index, sentence in enumerate(normalized_arr) for original, _ in sentence]
+    assert len(offsets) == len(tokens)
+    end = 0
+    for (sentence_index, original), (offset_sentence, start, token_end) in zip(tokens, offsets):
+        assert offset_sentence == sentence_index
+        assert content[start:token_end] == original
+        assert end <= start and not content[end:start].strip()
+        end = token_end
+    # text of nothing but symbols has no sentences
+    if normalized_arr:
+        assert not content[end:].strip()
+    return offsets
+
+
+def test_normalizer_tokens(normalizer, texts):
+    for text in texts:
+        check_spans(text, normalizer.normalize_tokenwise(text, ''))
+
+
+def test_added_tokens():
+    content = 'Hann kom heim Ég fór. Svo'
+    normalized = [[('Hann', 'hann'), ('kom', 'kom'), ('heim', 'heim'), ('.', '.')],
+                  [('Ég', 'ég'), ('fór', 'fór'), ('.', '.')], [('Svo', 'svo'), ('.', '.')]]
+    assert list(token_offsets.align(content, normalized)) == [
+        (0, 0, 4), (0, 5, 8), (0, 9, 13), (0, 13, 13),
+        (1, 14, 16), (1, 17, 20), (1, 20, 21), (2, 22, 25), (2, 25, 25)]
+
+
+def test_expanded_tokens():
+    content = 'Hann kom kl. 5 í gær, sjá bls. 3.'
+    normalized = [[('Hann', 'hann'), ('kom', 'kom'), ('kl.', 'klukkan'), ('5', 'fimm'), ('', 'og'), ('í', 'í'),
+                   ('gær', 'gær'), (',', ','), ('sjá', 'sjá'), ('bls.', 'blaðsíðu'), ('3', 'þrjú'), ('.', '.')]]
+    assert [content[start:end] for _, start, end in token_offsets.align(content, normalized)] == \
+        ['Hann', 'kom', 'kl.', '5', '', 'í', 'gær', ',', 'sjá', 'bls.', '3', '.']
+    assert list(token_offsets.align(content, normalized))[4] == (0, 14, 14)
+
+
+def test_response(normalizer, texts):
+    for text in texts[:200]:
+        normalized = normalizer.normalize_tokenwise(text, '')
+        for result in (normalized, TokenColumns.from_tokenwise(normalized)):
+            response, offsets = token_offsets.parse_response(token_offsets.encode_response(text, result))
+            response.DiscardUnknownFields()
+            assert response == tts_frontend_message_pb2.TokenBasedNormalizedResponse.FromString(
+                encode_tokenbased_response(normalized))
+            assert offsets == list(token_offsets.align(text, normalized))
+
+
+def test_large_document(normalizer):
+    grpc = pytest.importorskip('grpc')
+    import service_extensions
+    import tts_frontend_server
+
+    content = ' '.join(['Hann kom heim kl. 5 í gær og fór út aftur.'] * 1200)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    service_extensions.add_extensions_to_server(tts_frontend_server.TTSFrontendServicer(normalizer), server)
+    port = server.add_insecure_port('127.0.0.1:0')
+    server.start()
+    try:
+        with grpc.insecure_channel('127.0.0.1:{}'.format(port)) as channel:
+            response, offsets = service_extensions.TTSFrontendExtStub(channel).NormalizeTokenwiseOffsets(
+                tts_frontend_message_pb2.NormalizeRequest(content=content), timeout=30)
+    finally:
+        server.stop(None)
+    tokens = [token for sentence in response.sentence for token in sentence.token_info]
+    assert len(tokens) >= 12000
+    assert offsets == check_spans(content, normalizer.normalize_tokenwise(content, ''))